@@ -0,0 +1,134 @@
+# =============================================================================
+# Harara Alert State Store
+# - Tracks one heat episode per town (SQLite, survives restarts)
+# - An alert is sent when an episode starts, when it escalates
+#   (none -> Moderate -> High), or when the cooldown since the last send
+#   has elapsed; every other alerting run is suppressed and counted
+# - A non-alerting run closes the episode
+# =============================================================================
+
+import os
+import threading
+import datetime as dt
+from typing import Dict, List, Optional
+
+from sqlmodel import SQLModel, Field, Session, select
+
+ALERT_COOLDOWN_HOURS = float(os.getenv("ALERT_COOLDOWN_HOURS", "72"))
+
+SEVERITY_RANK = {"None": 0, "Moderate": 1, "High": 2}
+
+def _utcnow() -> dt.datetime:
+    return dt.datetime.utcnow()
+
+class AlertState(SQLModel, table=True):
+    __tablename__ = "alert_state"
+
+    town: str = Field(primary_key=True)
+    active: bool = False
+    severity: str = "None"               # current severity
+    peak_severity: str = "None"          # highest severity already alerted this episode
+    episode_started_at: Optional[dt.datetime] = None
+    last_sent_at: Optional[dt.datetime] = None
+    last_probability: Optional[float] = None
+    sends: int = 0
+    suppressed: int = 0                  # suppressed runs in the current episode
+    updated_at: dt.datetime = Field(default_factory=_utcnow)
+
+class AlertStateStore:
+    def __init__(self, engine, cooldown_hours: float = ALERT_COOLDOWN_HOURS):
+        self.engine = engine
+        self.cooldown = dt.timedelta(hours=cooldown_hours)
+        self._lock = threading.Lock()
+        self.suppressed_total = 0
+
+    def observe(self, town: str, alerting: bool, severity: str, probability: float,
+                now: Optional[dt.datetime] = None) -> Dict:
+        """Fold one prediction into the town's episode and decide whether to send"""
+        now = now or _utcnow()
+        with self._lock, Session(self.engine) as sess:
+            state = sess.get(AlertState, town) or AlertState(town=town)
+            state.last_probability = probability
+            state.updated_at = now
+
+            if not alerting:
+                ended = state.active
+                state.active = False
+                state.severity = state.peak_severity = "None"
+                state.episode_started_at = None
+                state.suppressed = 0
+                sess.add(state)
+                sess.commit()
+                return {"town": town, "send": False, "reason": "episode_ended" if ended else "no_alert"}
+
+            rank = SEVERITY_RANK.get(severity, 0)
+            if not state.active:
+                reason = "episode_started"
+                state.active = True
+                state.episode_started_at = now
+                state.suppressed = 0
+            elif rank > SEVERITY_RANK.get(state.peak_severity, 0):
+                reason = "escalated"
+            elif state.last_sent_at is None or now - state.last_sent_at >= self.cooldown:
+                reason = "cooldown_elapsed"
+            else:
+                reason = None
+            state.severity = severity
+
+            if reason:
+                state.last_sent_at = now
+                state.sends += 1
+                if rank > SEVERITY_RANK.get(state.peak_severity, 0):
+                    state.peak_severity = severity
+            else:
+                state.suppressed += 1
+                self.suppressed_total += 1
+
+            decision = {"town": town, "send": bool(reason), "reason": reason or "suppressed",
+                        "severity": severity, "suppressed": state.suppressed}
+            sess.add(state)
+            sess.commit()
+            return decision
+
+    def reset(self, town: str) -> bool:
+        """Forget a town's episode so the next alerting run sends"""
+        with self._lock, Session(self.engine) as sess:
+            state = sess.get(AlertState, town)
+            if state is None:
+                return False
+            sess.delete(state)
+            sess.commit()
+            return True
+
+    def snapshot(self) -> Dict:
+        with Session(self.engine) as sess:
+            rows: List[AlertState] = sess.exec(select(AlertState)).all()
+        return {
+            "cooldown_hours": self.cooldown.total_seconds() / 3600,
+            "suppressed_total": self.suppressed_total,
+            "towns": {
+                s.town: {
+                    "active": s.active,
+                    "severity": s.severity,
+                    "peak_severity": s.peak_severity,
+                    "episode_started_at": s.episode_started_at.isoformat() if s.episode_started_at else None,
+                    "last_sent_at": s.last_sent_at.isoformat() if s.last_sent_at else None,
+                    "last_probability": s.last_probability,
+                    "sends": s.sends,
+                    "suppressed": s.suppressed,
+                } for s in rows
+            },
+        }
+
+# Global alert state store
+alert_state_store: Optional[AlertStateStore] = None
+
+def init_alert_state(engine) -> AlertStateStore:
+    """Initialize the global alert state store (call after the tables exist)"""
+    global alert_state_store
+    alert_state_store = AlertStateStore(engine)
+    return alert_state_store
+
+def get_alert_state() -> Optional[AlertStateStore]:
+    """Get the global alert state store"""
+    return alert_state_store
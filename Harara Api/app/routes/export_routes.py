@@ -1,18 +1,19 @@
 import io
+import csv
+import json
+import zlib
 import datetime as dt
-from typing import Optional
-import pandas as pd
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import inch
+from typing import Optional, List
+from email.utils import formatdate
 
 from fastapi import APIRouter, HTTPException, Header, Response
-import firebase_admin
-from firebase_admin import auth, firestore
+from fastapi.responses import StreamingResponse, FileResponse
+from startup_service import lazy_module
+
+firestore = lazy_module("firebase_admin.firestore")  # imported on first query
+
+import archive_service
+import report_service
 
 router = APIRouter()
 
@@ -26,204 +27,307 @@ def set_firestore_db(firestore_db):
 
 # Removed admin verification - endpoints are now public
 
+# =============================================================================
+# STREAMING EXPORTS
+# Pages through Firestore with cursors and writes rows as they arrive, so
+# memory stays flat no matter how much history is exported.
+# =============================================================================
+
+EXPORT_PAGE_SIZE = 500
+
+# Default CSV columns per collection (NDJSON keeps every field unless projected)
+PREDICTION_COLUMNS = ["id", "date", "town", "probability", "alert", "severity", "message", "timestamp",
+                      "model_version", "served_by"]
+LOG_COLUMNS = ["id", "timestamp", "level", "category", "message", "endpoint",
+               "duration_ms", "user_id", "details"]
+
+def _parse_columns(columns: Optional[str]) -> Optional[List[str]]:
+    if not columns:
+        return None
+    cols = [c.strip() for c in columns.split(",") if c.strip()]
+    return cols or None
+
+def _parse_date(value: Optional[str], name: str) -> Optional[dt.date]:
+    if not value:
+        return None
+    try:
+        return dt.date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} date, expected YYYY-MM-DD")
+
+def _cell(value):
+    if isinstance(value, (dt.datetime, dt.date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return value
+
+def _iter_pages(query, projection: Optional[List[str]], order_field: str):
+    """Yield pages of (id, dict) rows using start_after cursors.
+
+    A start_after snapshot cursor reads the order_by field from the document,
+    so a projection always selects it too (the encoders drop it again).
+    """
+    if projection:
+        fields = [c for c in projection if c != "id"]
+        if order_field not in fields:
+            fields.append(order_field)
+        query = query.select(fields)
+    last = None
+    while True:
+        page_query = query.limit(EXPORT_PAGE_SIZE)
+        if last is not None:
+            page_query = page_query.start_after(last)
+        docs = list(page_query.stream())
+        if not docs:
+            return
+        yield [(doc.id, doc.to_dict() or {}) for doc in docs]
+        if len(docs) < EXPORT_PAGE_SIZE:
+            return
+        last = docs[-1]
+
+def _encode_page(rows, fmt: str, columns: Optional[List[str]]) -> str:
+    if fmt == "ndjson":
+        lines = []
+        for doc_id, data in rows:
+            data["id"] = doc_id
+            if columns:
+                data = {c: data.get(c) for c in columns}
+            lines.append(json.dumps({k: _cell(v) for k, v in data.items()}, default=str))
+        return "\n".join(lines) + "\n"
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for doc_id, data in rows:
+        data["id"] = doc_id
+        writer.writerow([_cell(data.get(c)) for c in columns])
+    return buf.getvalue()
+
+def _stream_export(query, name: str, order_field: str, fmt: str, columns: Optional[List[str]],
+                   default_columns: List[str], gzip: bool):
+    """Build a StreamingResponse for a Firestore query (404 when it is empty)"""
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'ndjson'")
+
+    pages = _iter_pages(query, columns, order_field)
+    first_page = next(pages, None)
+    if not first_page:
+        raise HTTPException(status_code=404, detail=f"No {name} found")
+
+    csv_columns = columns or default_columns
+
+    def generate():
+        compressor = zlib.compressobj(wbits=31) if gzip else None  # wbits=31 -> gzip container
+
+        def emit(text: str):
+            data = text.encode("utf-8")
+            return compressor.compress(data) if compressor else data
+
+        if fmt == "csv":
+            header = io.StringIO()
+            csv.writer(header).writerow(csv_columns)
+            yield emit(header.getvalue())
+        yield emit(_encode_page(first_page, fmt, csv_columns if fmt == "csv" else columns))
+        for page in pages:
+            chunk = emit(_encode_page(page, fmt, csv_columns if fmt == "csv" else columns))
+            if chunk:
+                yield chunk
+        if compressor:
+            yield compressor.flush()
+
+    ext = "csv" if fmt == "csv" else "ndjson"
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    if gzip:
+        ext += ".gz"
+        media_type = "application/gzip"
+    filename = f"{name}_export_{dt.datetime.now().strftime('%Y%m%d_%H%M%S')}.{ext}"
+
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
 @router.get("/export/predictions")
-def export_predictions():
-    """Export all predictions as CSV"""
-    
+def export_predictions(start: Optional[str] = None, end: Optional[str] = None,
+                       town: Optional[str] = None, level: Optional[str] = None,
+                       columns: Optional[str] = None, format: str = "csv", gzip: bool = False):
+    """Stream predictions as CSV or NDJSON.
+
+    Filters: start/end (YYYY-MM-DD, inclusive), town, level (severity).
+    `columns` is a comma-separated projection; `gzip=true` compresses the stream.
+    """
     if not db:
         raise HTTPException(status_code=500, detail="Firestore not initialized")
-    
+
     try:
-        # Fetch all predictions
-        docs = db.collection('predictions').stream()
-        data = []
-        for doc in docs:
-            doc_data = doc.to_dict()
-            doc_data['id'] = doc.id
-            data.append(doc_data)
-        
-        if not data:
-            raise HTTPException(status_code=404, detail="No predictions found")
-        
-        # Convert to DataFrame and CSV
-        df = pd.DataFrame(data)
-        csv_buffer = io.StringIO()
-        df.to_csv(csv_buffer, index=False)
-        csv_content = csv_buffer.getvalue()
-        
-        filename = f"predictions_export_{dt.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        
-        return Response(
-            content=csv_content,
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
-    
+        start_date = _parse_date(start, "start")
+        end_date = _parse_date(end, "end")
+
+        query = db.collection('predictions')
+        if town:
+            query = query.where(filter=firestore.FieldFilter('town', '==', town))
+        if level:
+            query = query.where(filter=firestore.FieldFilter('severity', '==', level))
+        if start_date:
+            query = query.where(filter=firestore.FieldFilter('date', '>=', str(start_date)))
+        if end_date:
+            query = query.where(filter=firestore.FieldFilter('date', '<=', str(end_date)))
+        query = query.order_by('date')
+
+        return _stream_export(query, "predictions", "date", format, _parse_columns(columns),
+                              PREDICTION_COLUMNS, gzip)
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/export/logs")
-def export_logs():
-    """Export all system logs as CSV"""
-    
+def export_logs(start: Optional[str] = None, end: Optional[str] = None,
+                town: Optional[str] = None, level: Optional[str] = None,
+                columns: Optional[str] = None, format: str = "csv", gzip: bool = False):
+    """Stream system logs as CSV or NDJSON.
+
+    Filters: start/end (YYYY-MM-DD, inclusive, on timestamp), town (details.town), level.
+    `columns` is a comma-separated projection; `gzip=true` compresses the stream.
+    """
     if not db:
         raise HTTPException(status_code=500, detail="Firestore not initialized")
-    
+
     try:
-        # Fetch all system logs
-        docs = db.collection('system_logs').stream()
-        data = []
-        for doc in docs:
-            doc_data = doc.to_dict()
-            doc_data['id'] = doc.id
-            data.append(doc_data)
-        
-        if not data:
-            raise HTTPException(status_code=404, detail="No logs found")
-        
-        # Convert to DataFrame and CSV
-        df = pd.DataFrame(data)
-        csv_buffer = io.StringIO()
-        df.to_csv(csv_buffer, index=False)
-        csv_content = csv_buffer.getvalue()
-        
-        filename = f"logs_export_{dt.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        
-        return Response(
-            content=csv_content,
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        start_date = _parse_date(start, "start")
+        end_date = _parse_date(end, "end")
+
+        query = db.collection('system_logs')
+        if level:
+            query = query.where(filter=firestore.FieldFilter('level', '==', level))
+        if town:
+            query = query.where(filter=firestore.FieldFilter('details.town', '==', town))
+        if start_date:
+            start_ts = dt.datetime.combine(start_date, dt.time.min)
+            query = query.where(filter=firestore.FieldFilter('timestamp', '>=', start_ts))
+        if end_date:
+            end_ts = dt.datetime.combine(end_date + dt.timedelta(days=1), dt.time.min)
+            query = query.where(filter=firestore.FieldFilter('timestamp', '<', end_ts))
+        query = query.order_by('timestamp')
+
+        return _stream_export(query, "logs", "timestamp", format, _parse_columns(columns), LOG_COLUMNS, gzip)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# =============================================================================
+# COLUMNAR ARCHIVE EXPORTS
+# =============================================================================
+
+ARROW_FILE_MEDIA_TYPE = "application/vnd.apache.arrow.file"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+def _month_range(start: str, end: str) -> List[str]:
+    try:
+        y, m = map(int, start.split("-"))
+        end_y, end_m = map(int, end.split("-"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Months must be YYYY-MM")
+    months = []
+    while (y, m) <= (end_y, end_m):
+        months.append(f"{y:04d}-{m:02d}")
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return months
+
+@router.get("/export/archive/{dataset}")
+def export_archive(dataset: str, month: str, end_month: Optional[str] = None,
+                   format: str = "parquet"):
+    """Serve archived predictions/features/logs as Parquet or Arrow IPC.
+
+    A single compacted month is sent straight from disk. `end_month` (Arrow only)
+    streams a range of months as one Arrow IPC stream.
+    """
+    if not archive_service.ARCHIVE_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Archive unavailable — pyarrow not installed")
+    if dataset not in archive_service.DATASETS:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset '{dataset}'")
+    if format not in ("parquet", "arrow"):
+        raise HTTPException(status_code=400, detail="format must be 'parquet' or 'arrow'")
+
+    months = _month_range(month, end_month or month)
+    if len(months) > 1 and format != "arrow":
+        raise HTTPException(status_code=400, detail="Month ranges are only available as format=arrow")
+
+    try:
+        stem = f"harara_{dataset}_{months[0]}" + (f"_{months[-1]}" if len(months) > 1 else "")
+
+        if len(months) == 1:
+            path = archive_service.compacted_file(dataset, months[0], format)
+            if path:
+                media_type = ARROW_FILE_MEDIA_TYPE if format == "arrow" else "application/vnd.apache.parquet"
+                return FileResponse(path, media_type=media_type,
+                                    filename=f"{stem}.{'arrow' if format == 'arrow' else 'parquet'}")
+
+        if format == "parquet":
+            table = archive_service.read_month(dataset, months[0])
+            if table is None:
+                raise HTTPException(status_code=404, detail=f"No archived {dataset} for {months[0]}")
+            buf = archive_service.pa.BufferOutputStream()
+            archive_service.pq.write_table(table, buf, compression=archive_service.COMPRESSION)
+            return Response(
+                content=buf.getvalue().to_pybytes(),
+                media_type="application/vnd.apache.parquet",
+                headers={"Content-Disposition": f"attachment; filename={stem}.parquet"}
+            )
+
+        if not any(m in archive_service.list_months(dataset) for m in months):
+            raise HTTPException(status_code=404, detail=f"No archived {dataset} for {month}")
+        return StreamingResponse(
+            archive_service.iter_arrow_stream(dataset, months),
+            media_type=ARROW_STREAM_MEDIA_TYPE,
+            headers={"Content-Disposition": f"attachment; filename={stem}.arrows"}
         )
-    
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/export/report")
-def export_report():
-    """Generate enhanced monthly PDF report with town risk comparison and weekly trends"""
+def export_report(rebuild: bool = False, month: Optional[str] = None):
+    """Serve the precomputed monthly PDF report.
+
+    Reports are rebuilt in the background after each scheduled run; `rebuild=true`
+    re-seeds the month from Firestore and renders a new version immediately.
+    """
     
+    if month is not None:
+        try:
+            month = dt.datetime.strptime(month, "%Y-%m").strftime("%Y-%m")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="month must be YYYY-MM")
+
     if not db:
         raise HTTPException(status_code=500, detail="Firestore not initialized")
     
     try:
-        now = dt.datetime.now()
-        start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        week_ago = now - dt.timedelta(days=7)
-        
-        # Fetch current month predictions
-        predictions_query = db.collection('predictions').where('timestamp', '>=', start_of_month).stream()
-        predictions_data = [doc.to_dict() for doc in predictions_query]
-        
-        # Fetch last 7 days for trend analysis
-        weekly_query = db.collection('predictions').where('timestamp', '>=', week_ago).stream()
-        weekly_data = [doc.to_dict() for doc in weekly_query]
-        
-        if not predictions_data:
-            raise HTTPException(status_code=404, detail="No data for current month")
-        
-        # Calculate statistics
-        total_predictions = len(predictions_data)
-        heatwave_events = sum(1 for p in predictions_data if p.get('alert', False))
-        
-        df = pd.DataFrame(predictions_data)
-        weekly_df = pd.DataFrame(weekly_data) if weekly_data else pd.DataFrame()
-        
-        # Create charts
-        fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(14, 10))
-        
-        # Chart 1: Town Risk Comparison (Feature 1)
-        if 'town' in df.columns and 'probability' in df.columns:
-            latest_by_town = df.groupby('town')['probability'].last().sort_values(ascending=True)
-            colors = ['red' if p >= 0.7 else 'orange' if p >= 0.4 else 'green' for p in latest_by_town.values]
-            latest_by_town.plot(kind='barh', ax=ax1, color=colors)
-            ax1.set_title('Current Town Risk Levels', fontweight='bold')
-            ax1.set_xlabel('Heatwave Probability')
-            ax1.axvline(x=0.7, color='red', linestyle='--', alpha=0.7, label='High Risk')
-            ax1.axvline(x=0.4, color='orange', linestyle='--', alpha=0.7, label='Moderate Risk')
-            ax1.legend()
-        
-        # Chart 2: Weekly Trend Analysis (Feature 2)
-        if not weekly_df.empty and 'date' in weekly_df.columns:
-            weekly_df['date'] = pd.to_datetime(weekly_df['date'])
-            daily_avg = weekly_df.groupby(weekly_df['date'].dt.date)['probability'].mean()
-            daily_alerts = weekly_df.groupby(weekly_df['date'].dt.date)['alert'].sum()
-            
-            ax2_twin = ax2.twinx()
-            daily_avg.plot(ax=ax2, color='blue', marker='o', label='Avg Probability')
-            daily_alerts.plot(ax=ax2_twin, color='red', marker='s', label='Alert Count')
-            ax2.set_title('7-Day Prediction Trends', fontweight='bold')
-            ax2.set_ylabel('Average Probability', color='blue')
-            ax2_twin.set_ylabel('Alert Count', color='red')
-            ax2.tick_params(axis='x', rotation=45)
-        
-        # Chart 3: Daily Activity (existing)
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'])
-            daily_counts = df.groupby(df['date'].dt.date).size()
-            daily_counts.plot(kind='bar', ax=ax3, color='skyblue')
-            ax3.set_title('Daily Prediction Activity')
-            ax3.set_ylabel('Predictions Count')
-            ax3.tick_params(axis='x', rotation=45)
-        
-        # Chart 4: Risk Distribution
-        if 'probability' in df.columns:
-            risk_bins = pd.cut(df['probability'], bins=[0, 0.3, 0.6, 1.0], labels=['Low', 'Moderate', 'High'])
-            risk_counts = risk_bins.value_counts()
-            colors_pie = ['green', 'orange', 'red']
-            risk_counts.plot(kind='pie', ax=ax4, colors=colors_pie, autopct='%1.1f%%')
-            ax4.set_title('Risk Level Distribution')
-            ax4.set_ylabel('')
-        
-        plt.tight_layout()
-        
-        # Save charts to buffer
-        chart_buffer = io.BytesIO()
-        plt.savefig(chart_buffer, format='png', dpi=300, bbox_inches='tight')
-        chart_buffer.seek(0)
-        plt.close()
-        
-        # Create PDF
-        pdf_buffer = io.BytesIO()
-        doc = SimpleDocTemplate(pdf_buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
-        story = []
-        
-        # Title
-        title = Paragraph(f"Harara Heatwave Enhanced Report - {now.strftime('%B %Y')}", styles['Title'])
-        story.append(title)
-        story.append(Spacer(1, 12))
-        
-        # Enhanced Statistics
-        high_risk_towns = len([p for p in predictions_data if p.get('probability', 0) >= 0.7])
-        avg_weekly_prob = weekly_df['probability'].mean() if not weekly_df.empty else 0
-        
-        stats_text = f"""
-        <b>Monthly Statistics:</b><br/>
-        • Total Predictions: {total_predictions}<br/>
-        • Heatwave Events Detected: {heatwave_events}<br/>
-        • Detection Rate: {(heatwave_events/total_predictions*100):.1f}%<br/>
-        • High Risk Towns: {high_risk_towns}<br/>
-        • Weekly Average Risk: {avg_weekly_prob:.2f}<br/>
-        • Report Generated: {now.strftime('%Y-%m-%d %H:%M:%S')}
-        """
-        stats = Paragraph(stats_text, styles['Normal'])
-        story.append(stats)
-        story.append(Spacer(1, 20))
-        
-        # Charts
-        chart_image = Image(chart_buffer, width=7*inch, height=5*inch)
-        story.append(chart_image)
-        
-        doc.build(story)
-        pdf_content = pdf_buffer.getvalue()
-        
-        filename = f"harara_enhanced_report_{now.strftime('%Y%m')}.pdf"
+        cached = None if rebuild else report_service.get_report(month)
+        if cached is None:
+            cached = report_service.build_report(month, db, reseed=rebuild)
+        pdf_content, built_at, version = cached
+
+        filename = f"harara_enhanced_report_{built_at.strftime('%Y%m')}_v{version}.pdf"
         
         return Response(
             content=pdf_content,
             media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+            headers={
+                "Content-Disposition": f"attachment; filename={filename}",
+                "Last-Modified": formatdate(built_at.timestamp(), usegmt=True),
+                "X-Report-Version": str(version),
+            }
         )
     
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,81 @@
+# =============================================================================
+# Profiling Routes for Harara Admins
+# Arm the on-demand profiler and download the captured profiles
+# =============================================================================
+
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from pydantic import BaseModel
+
+from auth import require_auth
+from middleware import match_route_template
+from profiling_service import get_profiler, route_target, RUN_PREDICTIONS_TARGET, MAX_CAPTURES
+
+router = APIRouter()
+
+class ProfileRequest(BaseModel):
+    target: str = "route"          # "route" or "run_predictions"
+    path: Optional[str] = None     # required when target == "route", e.g. "/hindcast/{run_id}" or "/hindcast/abc"
+    count: int = 1
+    format: str = "speedscope"     # "speedscope" or "collapsed"
+    mode: str = "sampling"         # "sampling", or "cprofile" for run_predictions only
+    interval_ms: float = 10.0
+
+@router.post("/profile", tags=["Profiling"])
+def arm_profile(request: ProfileRequest, http_request: Request, current_user=Depends(require_auth)):
+    """Profile the next N requests to a route or the next N run_predictions calls"""
+    if request.target == "route":
+        if not request.path or not request.path.startswith("/"):
+            raise HTTPException(status_code=400, detail="A route path such as /predict/run is required")
+        template = match_route_template(http_request.app.router.routes, request.path.split("?", 1)[0])
+        if template is None:
+            raise HTTPException(status_code=404, detail=f"No route matches {request.path}")
+        target = route_target(template)
+    elif request.target == RUN_PREDICTIONS_TARGET:
+        target = RUN_PREDICTIONS_TARGET
+    else:
+        raise HTTPException(status_code=400, detail="target must be 'route' or 'run_predictions'")
+
+    if not 1 <= request.count <= MAX_CAPTURES:
+        raise HTTPException(status_code=400, detail=f"count must be between 1 and {MAX_CAPTURES}")
+
+    try:
+        session = get_profiler().arm(target, request.count, request.format,
+                                     request.mode, request.interval_ms)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return session.info()
+
+@router.get("/profile", tags=["Profiling"])
+def list_profiles(current_user=Depends(require_auth)):
+    """List recent profile sessions"""
+    return {"sessions": get_profiler().list()}
+
+@router.get("/profile/{session_id}", tags=["Profiling"])
+def get_profile(session_id: str, download: bool = False, current_user=Depends(require_auth)):
+    """Session status, or the profile file itself with ?download=true"""
+    session = get_profiler().get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Profile session not found")
+    if not download:
+        return session.info()
+    if not session.stacks:
+        raise HTTPException(status_code=409, detail=f"No samples captured yet (status: {session.status})")
+
+    if session.format == "collapsed":
+        media_type, ext = "text/plain", "collapsed.txt"
+    else:
+        media_type, ext = "application/json", "speedscope.json"
+    filename = f"harara_profile_{session.id}.{ext}"
+    return Response(
+        content=session.render(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+@router.delete("/profile/{session_id}", tags=["Profiling"])
+def cancel_profile(session_id: str, current_user=Depends(require_auth)):
+    """Disarm and discard a profile session"""
+    if not get_profiler().cancel(session_id):
+        raise HTTPException(status_code=404, detail="Profile session not found")
+    return {"status": "cancelled", "id": session_id}
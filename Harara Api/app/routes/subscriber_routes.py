@@ -0,0 +1,57 @@
+# =============================================================================
+# Subscriber Import Routes for Harara Admins
+# Upload CSV / NDJSON subscriber lists and follow the background import
+# =============================================================================
+
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Request
+
+from auth import require_auth
+from subscriber_import import get_import_registry
+
+router = APIRouter()
+
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+
+# Set from main.py at startup
+db = None
+towns: List[str] = []
+
+def configure(firestore_db, town_names: List[str]):
+    """Set the Firestore client and town registry from main.py"""
+    global db, towns
+    db = firestore_db
+    towns = list(town_names)
+
+@router.post("/subscribers/import", tags=["Subscribers"], status_code=202)
+async def import_subscribers(request: Request, format: str = "csv", filename: Optional[str] = None,
+                             current_user=Depends(require_auth)):
+    """Start a bulk import. Send the file as the raw request body (text/csv or application/x-ndjson).
+
+    Columns: phone_number (or phone / msisdn), town, and optionally name and fcm_token.
+    """
+    if db is None:
+        raise HTTPException(status_code=503, detail="Firestore not initialized")
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'ndjson'")
+    body = await request.body()
+    if not body:
+        raise HTTPException(status_code=400, detail="Empty upload")
+    if len(body) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Upload larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+
+    job = get_import_registry().start(db, body, format, towns, filename)
+    return job.info()
+
+@router.get("/subscribers/import", tags=["Subscribers"])
+def list_imports(current_user=Depends(require_auth)):
+    """Recent import jobs"""
+    return {"jobs": get_import_registry().list()}
+
+@router.get("/subscribers/import/{job_id}", tags=["Subscribers"])
+def get_import(job_id: str, errors: bool = False, current_user=Depends(require_auth)):
+    """Import progress, with the per-row error report when ?errors=true"""
+    job = get_import_registry().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job.info(include_errors=errors)
@@ -0,0 +1,256 @@
+# =============================================================================
+# Harara Columnar Archive
+# - Appends each run's predictions, input feature windows and daily log
+#   summaries to month-partitioned, zstd-compressed Parquet files
+# - Compacts closed months into one Parquet + one Arrow IPC file so exports
+#   can be served straight from memory-mapped files
+# =============================================================================
+
+import os
+import glob
+import importlib.util
+import datetime as dt
+from typing import Dict, List, Optional, Iterator
+
+from startup_service import lazy_module
+
+# The archive is optional (the API runs without pyarrow) and pyarrow is only
+# imported by the first archive read or write, not at app import
+ARCHIVE_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+pa = lazy_module("pyarrow")
+pq = lazy_module("pyarrow.parquet")
+
+ARCHIVE_DIR = os.getenv("HARARA_ARCHIVE_DIR", os.path.join(os.path.dirname(__file__), "harara_archive"))
+DATASETS = ("predictions", "features", "logs")
+COMPRESSION = "zstd"
+COMPACT_PARQUET = "data.parquet"
+COMPACT_ARROW = "data.arrow"
+
+def _month_dir(dataset: str, month: str) -> str:
+    return os.path.join(ARCHIVE_DIR, dataset, f"month={month}")
+
+def _month_of(ts: dt.datetime) -> str:
+    return ts.strftime("%Y-%m")
+
+def _write_part(dataset: str, table, run_ts: dt.datetime) -> str:
+    month_dir = _month_dir(dataset, _month_of(run_ts))
+    os.makedirs(month_dir, exist_ok=True)
+    path = os.path.join(month_dir, f"part-{run_ts.strftime('%Y%m%dT%H%M%S')}.parquet")
+    tmp = path + ".tmp"
+    pq.write_table(table, tmp, compression=COMPRESSION)
+    os.replace(tmp, path)  # readers never see half-written parts
+    return path
+
+def _predictions_table(result: Dict, run_ts: dt.datetime):
+    preds = result.get("predictions", [])
+    return pa.table({
+        "run_ts": pa.array([run_ts] * len(preds), pa.timestamp("us", tz="UTC")),
+        "start_date": pa.array([dt.date.fromisoformat(result["start_date"])] * len(preds), pa.date32()),
+        "end_date": pa.array([dt.date.fromisoformat(result["end_date"])] * len(preds), pa.date32()),
+        "town": pa.array([p["town"] for p in preds], pa.string()),
+        "probability": pa.array([float(p["probability"]) for p in preds], pa.float32()),
+        "alert": pa.array([int(p["alert"]) for p in preds], pa.int8()),
+        # Added after the first parts were written; older parts read back as null
+        "model_version": pa.array([result.get("model_version")] * len(preds), pa.string()),
+        "served_by": pa.array([p.get("served_by") for p in preds], pa.string()),
+    })
+
+def _features_table(windows: Dict, feature_cols: List[str], date_col: str, run_ts: dt.datetime):
+    towns, dates = [], []
+    columns = {c: [] for c in feature_cols}
+    for town, df in windows.items():
+        if df is None or df.empty:
+            continue
+        n = len(df)
+        towns.extend([town] * n)
+        if date_col in df.columns:
+            dates.extend(d.date() if hasattr(d, "date") else d for d in df[date_col])
+        else:
+            dates.extend([None] * n)  # spatially blended windows carry no dates
+        for c in feature_cols:
+            columns[c].extend(df[c].tolist() if c in df.columns else [None] * n)
+
+    data = {
+        "run_ts": pa.array([run_ts] * len(towns), pa.timestamp("us", tz="UTC")),
+        "town": pa.array(towns, pa.string()),
+        "date": pa.array(dates, pa.date32()),
+    }
+    for c in feature_cols:
+        data[c] = pa.array(columns[c], pa.float32())
+    return pa.table(data)
+
+def _logs_table(summary: Dict, day: dt.date):
+    """Flatten the 24h rolling-aggregate window into one row per endpoint/category/level"""
+    window = summary.get("windows", {}).get("24h", {})
+    rows = []
+    for name, ep in window.get("endpoints", {}).items():
+        rows.append(("endpoint", name, ep["count"], ep["p50_ms"], ep["p95_ms"], ep["error_rate"]))
+    for name, count in window.get("categories", {}).items():
+        rows.append(("category", name, count, None, None, None))
+    for name, count in window.get("levels", {}).items():
+        rows.append(("level", name, count, None, None, None))
+
+    return pa.table({
+        "date": pa.array([day] * len(rows), pa.date32()),
+        "kind": pa.array([r[0] for r in rows], pa.string()),
+        "name": pa.array([r[1] for r in rows], pa.string()),
+        "count": pa.array([r[2] for r in rows], pa.int64()),
+        "p50_ms": pa.array([r[3] for r in rows], pa.float32()),
+        "p95_ms": pa.array([r[4] for r in rows], pa.float32()),
+        "error_rate": pa.array([r[5] for r in rows], pa.float32()),
+    })
+
+def archive_run(result: Dict, windows: Dict, feature_cols: List[str], date_col: str,
+                log_summary: Optional[Dict] = None) -> Dict[str, str]:
+    """Append one prediction run to the archive. Returns the written part paths."""
+    if not ARCHIVE_AVAILABLE:
+        print(" Archive skipped — pyarrow not installed")
+        return {}
+
+    run_ts = dt.datetime.fromisoformat(result["run_ts"]).astimezone(dt.timezone.utc)
+    written = {
+        "predictions": _write_part("predictions", _predictions_table(result, run_ts), run_ts),
+        "features": _write_part("features", _features_table(windows, feature_cols, date_col, run_ts), run_ts),
+    }
+    if log_summary:
+        written["logs"] = _write_part("logs", _logs_table(log_summary, run_ts.date()), run_ts)
+    return written
+
+def _read_parts(paths: List[str]):
+    tables = [pq.read_table(p, memory_map=True) for p in paths]
+    try:
+        return pa.concat_tables(tables, promote_options="default")
+    except TypeError:  # pyarrow < 14
+        return pa.concat_tables(tables, promote=True)
+
+def list_months(dataset: str) -> List[str]:
+    pattern = os.path.join(ARCHIVE_DIR, dataset, "month=*")
+    return sorted(os.path.basename(p).split("=", 1)[1] for p in glob.glob(pattern))
+
+def compact_month(dataset: str, month: str) -> Optional[str]:
+    """Merge a month's run parts into data.parquet + data.arrow (Arrow IPC file)"""
+    if not ARCHIVE_AVAILABLE:
+        return None
+    month_dir = _month_dir(dataset, month)
+    parts = sorted(glob.glob(os.path.join(month_dir, "part-*.parquet")))
+    if not parts:
+        return None
+
+    compacted = os.path.join(month_dir, COMPACT_PARQUET)
+    sources = ([compacted] if os.path.exists(compacted) else []) + parts
+    table = _read_parts(sources)
+
+    tmp = compacted + ".tmp"
+    pq.write_table(table, tmp, compression=COMPRESSION)
+    os.replace(tmp, compacted)
+
+    arrow_path = os.path.join(month_dir, COMPACT_ARROW)
+    with pa.OSFile(arrow_path + ".tmp", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(arrow_path + ".tmp", arrow_path)
+
+    for p in parts:
+        os.remove(p)
+    return compacted
+
+def compact_closed_months(now: Optional[dt.datetime] = None) -> List[str]:
+    """Compact every month before the current one (run from the scheduler)"""
+    current = _month_of(now or dt.datetime.utcnow())
+    done = []
+    for dataset in DATASETS:
+        for month in list_months(dataset):
+            if month < current:
+                path = compact_month(dataset, month)
+                if path:
+                    done.append(path)
+    return done
+
+def compacted_file(dataset: str, month: str, fmt: str) -> Optional[str]:
+    """Path of a compacted month file with no pending parts, else None"""
+    month_dir = _month_dir(dataset, month)
+    path = os.path.join(month_dir, COMPACT_ARROW if fmt == "arrow" else COMPACT_PARQUET)
+    if os.path.exists(path) and not glob.glob(os.path.join(month_dir, "part-*.parquet")):
+        return path
+    return None
+
+def read_month(dataset: str, month: str):
+    """Memory-map every file for a month into one Arrow table"""
+    arrow_path = compacted_file(dataset, month, "arrow")
+    if arrow_path:
+        # Zero-copy: record batches point straight into the mapped file
+        return pa.ipc.open_file(pa.memory_map(arrow_path)).read_all()
+
+    paths = _parquet_paths(dataset, month)
+    if not paths:
+        return None
+    return _read_parts(paths)
+
+def _parquet_paths(dataset: str, month: str) -> List[str]:
+    month_dir = _month_dir(dataset, month)
+    compacted = os.path.join(month_dir, COMPACT_PARQUET)
+    return ([compacted] if os.path.exists(compacted) else []) + \
+        sorted(glob.glob(os.path.join(month_dir, "part-*.parquet")))
+
+def _stream_schema(dataset: str, months: List[str]):
+    """Union of the months' schemas, read from file footers without loading any data"""
+    schemas = []
+    for month in months:
+        arrow_path = compacted_file(dataset, month, "arrow")
+        if arrow_path:
+            schemas.append(pa.ipc.open_file(pa.memory_map(arrow_path)).schema)
+        else:
+            schemas.extend(pq.read_schema(p) for p in _parquet_paths(dataset, month))
+    return pa.unify_schemas(schemas) if schemas else None
+
+class _Drain:
+    """Minimal writable sink whose buffered bytes can be drained between batches"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+def _align(table, schema):
+    """Conform a month's table to the stream schema (older months may lack newer columns)"""
+    columns = [
+        table.column(f.name).cast(f.type, safe=False) if f.name in table.column_names
+        else pa.nulls(table.num_rows, f.type)
+        for f in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+def iter_arrow_stream(dataset: str, months: List[str]) -> Iterator[bytes]:
+    """Arrow IPC stream over a range of months, one memory-mapped month at a time"""
+    sink = _Drain()
+    writer = None
+    schema = _stream_schema(dataset, months)  # a range may start before a column was added
+    for month in months:
+        table = read_month(dataset, month)
+        if table is None:
+            continue
+        if writer is None:
+            writer = pa.ipc.new_stream(sink, schema)
+        for batch in _align(table, schema).to_batches():
+            writer.write_batch(batch)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    if writer is not None:
+        writer.close()
+        tail = sink.drain()
+        if tail:
+            yield tail
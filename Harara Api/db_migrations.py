@@ -0,0 +1,32 @@
+# =============================================================================
+# Harara SQLite Column Migrations
+# create_all() never alters existing tables, so columns and indexes added
+# to a model after its table was created are added here.
+# =============================================================================
+
+from sqlalchemy import inspect, text
+
+def migrate_table(engine, model) -> list:
+    """Add model columns (nullable or defaulted) and indexes missing from the live table"""
+    table = model.__table__
+    inspector = inspect(engine)
+    if not inspector.has_table(table.name):
+        return []
+    existing = {c["name"] for c in inspector.get_columns(table.name)}
+    added = []
+    with engine.begin() as conn:
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            col_type = column.type.compile(dialect=engine.dialect)
+            default = ""
+            if column.default is not None and getattr(column.default, "is_scalar", False):
+                value = column.default.arg
+                default = f" DEFAULT {int(value) if isinstance(value, bool) else repr(value)}"
+            conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {col_type}{default}'))
+            added.append(column.name)
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+    if added:
+        print(f" Migrated {table.name}: added {', '.join(added)}")
+    return added
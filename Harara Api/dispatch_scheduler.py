@@ -0,0 +1,74 @@
+# =============================================================================
+# Harara Alert Dispatch Scheduler
+# - Maps alert severity to an outbox priority (High before Moderate before rest)
+# - Holds one token bucket per provider channel, sized to the contracted
+#   messages per second
+# - Reports queue depth and ETA per channel and priority
+# =============================================================================
+
+import os
+from typing import Callable, Dict, List, Optional
+
+from sms_dispatcher import TokenBucket
+
+SMS_MESSAGES_PER_SECOND = float(os.getenv("SMS_MESSAGES_PER_SECOND", "20"))
+FCM_MESSAGES_PER_SECOND = float(os.getenv("FCM_MESSAGES_PER_SECOND", "500"))
+
+PRIORITY_BY_SEVERITY = {"High": 3, "Moderate": 2}
+DEFAULT_PRIORITY = 1
+
+def severity_priority(severity: Optional[str]) -> int:
+    return PRIORITY_BY_SEVERITY.get(severity or "", DEFAULT_PRIORITY)
+
+class DispatchChannel:
+    def __init__(self, name: str, send: Callable[[str, List[str]], Dict[str, Dict]],
+                 messages_per_second: float, batch_size: int):
+        self.name = name
+        self.send_fn = send
+        self.rate = messages_per_second
+        self.batch_size = batch_size
+        self.bucket = TokenBucket(messages_per_second, capacity=max(1.0, messages_per_second))
+
+    def send(self, message: str, recipients: List[str]) -> Dict[str, Dict]:
+        # Acquire one token per message, in slices no larger than the bucket
+        remaining = len(recipients)
+        while remaining > 0:
+            take = min(remaining, self.bucket.capacity)
+            self.bucket.acquire(take)
+            remaining -= take
+        return self.send_fn(message, recipients)
+
+class DispatchScheduler:
+    """Registry of rate-limited provider channels used by the outbox workers"""
+
+    def __init__(self):
+        self.channels: Dict[str, DispatchChannel] = {}
+
+    def register(self, name: str, send: Callable[[str, List[str]], Dict[str, Dict]],
+                 messages_per_second: float, batch_size: int = 100) -> DispatchChannel:
+        """`send(message, recipients)` must return recipient -> {"status": "sent"|"failed", ...}"""
+        channel = DispatchChannel(name, send, messages_per_second, batch_size)
+        self.channels[name] = channel
+        return channel
+
+    def get(self, name: str) -> Optional[DispatchChannel]:
+        return self.channels.get(name)
+
+    def eta(self, channel: str, pending_by_priority: Dict[int, int]) -> Dict:
+        """Queue depth and drain ETA; each priority waits for everything above it"""
+        ch = self.channels.get(channel)
+        rate = ch.rate if ch else None
+        ahead = 0
+        by_priority = {}
+        for priority in sorted(pending_by_priority, reverse=True):
+            ahead += pending_by_priority[priority]
+            by_priority[priority] = {
+                "pending": pending_by_priority[priority],
+                "eta_seconds": round(ahead / rate, 1) if rate else None,
+            }
+        return {
+            "messages_per_second": rate,
+            "queue_depth": ahead,
+            "eta_seconds": round(ahead / rate, 1) if rate else None,
+            "by_priority": by_priority,
+        }
@@ -0,0 +1,194 @@
+# =============================================================================
+# Harara Fallback Model
+# - L2-regularized logistic regression on per-feature window summaries
+#   (mean, std, min, max, last day, last-week minus first-week trend)
+# - Stored as fallback.json next to the LSTM bundle and evaluated with
+#   NumPy only: served when TensorFlow or model.keras cannot be loaded,
+#   or when the LSTM forward pass fails (FALLBACK_POLICY)
+# - `python fallback_model.py train data.csv fallback.json --scaler scaler.json`
+#   trains it on the notebook's dataset with the notebook's labels
+# =============================================================================
+
+import os
+import json
+import datetime as dt
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+FALLBACK_FILE = "fallback.json"
+FALLBACK_POLICY = os.getenv("FALLBACK_POLICY", "auto").lower()   # auto | always | never
+SUMMARIES = ("mean", "std", "min", "max", "last", "trend")
+TREND_DAYS = 7
+
+def summary_features(X: np.ndarray) -> np.ndarray:
+    """(N, days, features) scaled windows -> (N, len(SUMMARIES) * features)"""
+    trend = X[:, -TREND_DAYS:].mean(axis=1) - X[:, :TREND_DAYS].mean(axis=1)
+    return np.concatenate([X.mean(axis=1), X.std(axis=1), X.min(axis=1), X.max(axis=1),
+                           X[:, -1], trend], axis=1)
+
+def summary_feature_names(feature_cols: List[str]) -> List[str]:
+    return [f"{f}_{s}" for s in SUMMARIES for f in feature_cols]
+
+class FallbackModel:
+    """Logistic regression with the feature standardization folded into coef / intercept"""
+
+    def __init__(self, coef, intercept: float, window: Tuple[int, int], threshold: float,
+                 metrics: Optional[Dict] = None, trained_at: Optional[str] = None):
+        self.coef = np.asarray(coef, dtype=np.float32)
+        self.intercept = np.float32(intercept)
+        self.window = tuple(window)
+        self.threshold = float(threshold)
+        self.metrics = metrics or {}
+        self.trained_at = trained_at
+        if len(self.coef) != len(SUMMARIES) * self.window[1]:
+            raise ValueError(f"fallback coef has {len(self.coef)} entries, expected "
+                             f"{len(SUMMARIES) * self.window[1]}")
+
+    def predict(self, X: np.ndarray, batch_size: Optional[int] = None, verbose: int = 0) -> np.ndarray:
+        """Same call shape as keras Model.predict: scaled windows -> (N, 1) probabilities"""
+        if tuple(X.shape[1:]) != self.window:
+            raise ValueError(f"fallback expects windows of shape {self.window}, got {tuple(X.shape[1:])}")
+        z = summary_features(X) @ self.coef + self.intercept
+        return (1.0 / (1.0 + np.exp(-z))).reshape(-1, 1)
+
+    def info(self) -> Dict:
+        return {"type": "logistic", "threshold": self.threshold, "trained_at": self.trained_at,
+                "metrics": self.metrics}
+
+def load_fallback(path: str) -> FallbackModel:
+    with open(path) as f:
+        data = json.load(f)
+    return FallbackModel(data["coef"], data["intercept"], data["window"], data["threshold"],
+                         data.get("metrics"), data.get("trained_at"))
+
+# =============================================================================
+# TRAINING + EXPORT
+# =============================================================================
+
+def fit_logistic(Z: np.ndarray, y: np.ndarray, l2: float = 1.0, max_iter: int = 50) -> Tuple[np.ndarray, float]:
+    """Class-balanced, L2-regularized logistic regression by Newton steps on standardized Z"""
+    n, d = Z.shape
+    A = np.hstack([Z, np.ones((n, 1))])
+    pos = max(y.mean(), 1e-6)
+    sample_w = np.where(y == 1, 0.5 / pos, 0.5 / max(1 - pos, 1e-6))
+    reg = np.full(d + 1, l2)
+    reg[-1] = 0.0  # intercept is not penalized
+    w = np.zeros(d + 1)
+    for _ in range(max_iter):
+        p = 1.0 / (1.0 + np.exp(-(A @ w)))
+        grad = A.T @ (sample_w * (p - y)) + reg * w
+        hess = (A * (sample_w * p * (1 - p))[:, None]).T @ A + np.diag(reg)
+        step = np.linalg.solve(hess, grad)
+        w -= step
+        if np.abs(step).max() < 1e-6:
+            break
+    return w[:-1], float(w[-1])
+
+def roc_auc(y: np.ndarray, p: np.ndarray) -> float:
+    """Mann-Whitney AUC (ties share their average rank)"""
+    order = np.argsort(p)
+    ranks = np.empty(len(p))
+    ranks[order] = np.arange(1, len(p) + 1)
+    _, inverse, counts = np.unique(p, return_inverse=True, return_counts=True)
+    sums = np.bincount(inverse, weights=ranks)
+    ranks = (sums / counts)[inverse]
+    n_pos, n_neg = int(y.sum()), int(len(y) - y.sum())
+    if n_pos == 0 or n_neg == 0:
+        return float("nan")
+    return float((ranks[y == 1].sum() - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg))
+
+def choose_threshold(y: np.ndarray, p: np.ndarray, beta: float = 2.0, min_precision: float = 0.40) -> Dict:
+    """The notebook's rule: best F-beta, else best recall with precision >= min_precision"""
+    order = np.argsort(-p)
+    tp = np.cumsum(y[order])
+    precision = tp / np.arange(1, len(p) + 1)
+    recall = tp / max(y.sum(), 1)
+    b2 = beta ** 2
+    fbeta = (1 + b2) * precision * recall / (b2 * precision + recall + 1e-12)
+    i = int(np.argmax(fbeta))
+    if precision[i] < min_precision and np.any(precision >= min_precision):
+        ok = np.where(precision >= min_precision)[0]
+        i = int(ok[np.argmax(recall[ok])])
+    return {"threshold": float(p[order][i]), "precision": float(precision[i]), "recall": float(recall[i])}
+
+def build_training_windows(df, feature_cols: List[str], lookback: int, horizon: int,
+                           date_col: str = "date", town_col: str = "town", target_col: str = "heatwave"):
+    """Windows + next-horizon labels exactly as the notebook builds them"""
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    df = df.sort_values([town_col, date_col]).reset_index(drop=True)
+    numeric = df[feature_cols].apply(lambda s: s.fillna(s.median())).to_numpy(dtype=np.float32)
+    y_next = (df.groupby(town_col)[target_col]
+                .transform(lambda s: s.shift(-1).rolling(horizon, min_periods=1).max())
+                .fillna(0).astype(int).to_numpy())
+    X, y, end_dates = [], [], []
+    for _, idx in df.groupby(town_col).indices.items():
+        if len(idx) <= lookback:
+            continue
+        feats = numeric[idx]
+        windows = sliding_window_view(feats, lookback, axis=0)[:-1].transpose(0, 2, 1)
+        X.append(windows)
+        y.append(y_next[idx][lookback:])
+        end_dates.append(df[date_col].to_numpy()[idx][lookback:])
+    return np.concatenate(X), np.concatenate(y), np.concatenate(end_dates)
+
+def train_fallback(csv_path: str, out_path: str, scaler_path: str, feature_cols: List[str],
+                   lookback: int = 21, horizon: int = 7, val_fraction: float = 0.2, l2: float = 1.0) -> Dict:
+    import pandas as pd
+    from scaler_artifact import load_scaler, scale_windows_inplace
+
+    df = pd.read_csv(csv_path, parse_dates=["date"])
+    X, y, end_dates = build_training_windows(df, feature_cols, lookback, horizon)
+    X = scale_windows_inplace(np.ascontiguousarray(X, dtype=np.float32), load_scaler(scaler_path))
+    Z = summary_features(X).astype(np.float64)
+
+    # Chronological split: the most recent val_fraction of window end dates validates
+    cutoff = np.quantile(end_dates.astype("datetime64[D]").astype(np.int64), 1 - val_fraction)
+    is_val = end_dates.astype("datetime64[D]").astype(np.int64) > cutoff
+    mu, sigma = Z[~is_val].mean(axis=0), Z[~is_val].std(axis=0) + 1e-9
+    coef, intercept = fit_logistic((Z[~is_val] - mu) / sigma, y[~is_val], l2=l2)
+    # Fold the standardization into the weights: one dot product at serving time
+    coef_folded = coef / sigma
+    intercept_folded = intercept - float(np.dot(coef, mu / sigma))
+
+    p_val = 1.0 / (1.0 + np.exp(-(Z[is_val] @ coef_folded + intercept_folded)))
+    chosen = choose_threshold(y[is_val], p_val)
+    metrics = {"val_auc": round(roc_auc(y[is_val], p_val), 4), "val_precision": round(chosen["precision"], 4),
+               "val_recall": round(chosen["recall"], 4), "train_windows": int((~is_val).sum()),
+               "val_windows": int(is_val.sum()), "positive_rate": round(float(y.mean()), 4)}
+    export = {
+        "type": "logistic",
+        "window": [lookback, len(feature_cols)],
+        "feature_names": summary_feature_names(feature_cols),
+        "coef": [float(c) for c in coef_folded],
+        "intercept": intercept_folded,
+        "threshold": chosen["threshold"],
+        "metrics": metrics,
+        "trained_at": dt.datetime.utcnow().isoformat() + "Z",
+    }
+    with open(out_path, "w") as f:
+        json.dump(export, f, indent=2)
+    return metrics
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train and export the NumPy fallback model")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train")
+    train.add_argument("csv_path", help="daily per-town dataset (date, town, heatwave + feature columns)")
+    train.add_argument("out_path", nargs="?", default=FALLBACK_FILE)
+    train.add_argument("--scaler", default=os.path.join(os.path.dirname(__file__), "harara_artifacts", "scaler.json"))
+    train.add_argument("--l2", type=float, default=1.0)
+    train.add_argument("--val-fraction", type=float, default=0.2)
+    args = parser.parse_args()
+
+    FEATURE_COLS = [
+        "LST_Day_1km", "LST_Night_1km", "air_temp_2m", "ndvi",
+        "net_solar_radiation", "precipitation", "relative_humidity",
+        "soil_moisture", "wind_speed", "longitude", "latitude",
+    ]
+    result = train_fallback(args.csv_path, args.out_path, args.scaler, FEATURE_COLS,
+                            val_fraction=args.val_fraction, l2=args.l2)
+    print(f" Wrote {args.out_path}: {result}")
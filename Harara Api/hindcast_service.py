@@ -0,0 +1,207 @@
+# =============================================================================
+# Harara Hindcast
+# - Rebuilds what the model would have predicted for each town on every day
+#   of a date range, from the stored daily feature history (the columnar
+#   archive's features dataset, or a CSV in the training data layout)
+# - All 21-day windows of a town come from one strided sliding_window_view
+#   over its daily feature matrix; they are copied once into the batch, then
+#   scaled in place and scored in large batches
+# - Results are bulk-inserted into the hindcast table under one run id
+# =============================================================================
+
+import uuid
+import datetime as dt
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlmodel import SQLModel, Field, Session, select
+from sqlalchemy import Index
+
+import archive_service
+
+HINDCAST_BATCH = 4096        # windows per forward pass
+MIN_COVERAGE = 0.5           # observed (not filled) share of a window's days
+MAX_HINDCAST_DAYS = 3 * 366
+
+class Hindcast(SQLModel, table=True):
+    __tablename__ = "hindcast"
+    __table_args__ = (Index("ix_hindcast_run_town_date", "run_id", "town", "date"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    run_id: str
+    town: str
+    date: dt.date                         # last day of the window = day the forecast was issued
+    probability: float
+    alert: int
+    threshold: float
+    coverage: float                       # observed share of the 21 window days
+    model_version: Optional[str] = None
+    served_by: Optional[str] = None
+    created_at: dt.datetime = Field(default_factory=dt.datetime.utcnow)
+
+# =============================================================================
+# FEATURE HISTORY
+# =============================================================================
+
+def _months(start: dt.date, end: dt.date) -> List[str]:
+    return [p.strftime("%Y-%m") for p in pd.period_range(start, end, freq="M")]
+
+def history_from_archive(towns: Iterable[str], start: dt.date, end: dt.date,
+                         feature_cols: List[str]) -> pd.DataFrame:
+    """Daily features from archived run windows; the latest run wins for each (town, date)"""
+    if not archive_service.ARCHIVE_AVAILABLE:
+        raise RuntimeError("Hindcast from the archive needs pyarrow")
+    frames = []
+    for month in _months(start, end):
+        table = archive_service.read_month("features", month)
+        if table is not None:
+            frames.append(table.select(["run_ts", "town", "date", *feature_cols]).to_pandas())
+    if not frames:
+        return pd.DataFrame(columns=["town", "date", *feature_cols])
+    df = pd.concat(frames, ignore_index=True).dropna(subset=["date"])
+    df = df[df["town"].isin(list(towns))]
+    df = df.sort_values("run_ts").drop_duplicates(["town", "date"], keep="last")
+    return df.drop(columns="run_ts")
+
+def history_from_csv(path: str, towns: Iterable[str], feature_cols: List[str]) -> pd.DataFrame:
+    df = pd.read_csv(path, usecols=["date", "town", *feature_cols], parse_dates=["date"])
+    df["date"] = df["date"].dt.date
+    return df[df["town"].isin(list(towns))].drop_duplicates(["town", "date"], keep="last")
+
+# =============================================================================
+# WINDOWS + SCORING
+# =============================================================================
+
+def build_windows(history: pd.DataFrame, towns: Iterable[str], start: dt.date, end: dt.date,
+                  feature_cols: List[str], lookback: int, max_gap: int,
+                  noise: Optional[Callable[[str], np.ndarray]] = None) -> Dict:
+    """Every window ending on a day in [start, end], stacked into one float32 batch.
+
+    Gaps are forward-filled up to max_gap days, then filled with the column
+    median; windows with fewer than MIN_COVERAGE observed days are skipped.
+    """
+    first = start - dt.timedelta(days=lookback - 1)
+    calendar = pd.date_range(first, end, freq="D").date
+    medians = history[feature_cols].median(numeric_only=True).fillna(0.0)
+    per_town = []
+    for town in towns:
+        daily = (history[history["town"] == town].set_index("date")[feature_cols]
+                 .reindex(calendar))
+        observed = daily.notna().any(axis=1).to_numpy(dtype=np.float32)
+        values = daily.ffill(limit=max_gap).fillna(medians).to_numpy(dtype=np.float32)
+        # (n_windows, features, lookback) strided view; nothing is copied yet
+        windows = sliding_window_view(values, lookback, axis=0)
+        coverage = sliding_window_view(observed, lookback).mean(axis=1)
+        keep = coverage >= MIN_COVERAGE
+        per_town.append((town, windows, coverage, keep))
+
+    total = sum(int(keep.sum()) for *_, keep in per_town)
+    X = np.empty((total, lookback, len(feature_cols)), dtype=np.float32)
+    towns_out, dates_out, coverage_out = [], [], []
+    i = 0
+    for town, windows, coverage, keep in per_town:
+        n = int(keep.sum())
+        if not n:
+            continue
+        # The one copy: kept windows of the strided view go straight into the batch rows
+        np.take(windows, np.flatnonzero(keep), axis=0, out=X[i:i + n].transpose(0, 2, 1), mode="clip")
+        if noise is not None:
+            X[i:i + n] += noise(town)
+        towns_out.extend([town] * n)
+        dates_out.extend(calendar[lookback - 1:][keep])
+        coverage_out.append(coverage[keep])
+        i += n
+    return {
+        "X": X,
+        "towns": towns_out,
+        "dates": dates_out,
+        "coverage": np.concatenate(coverage_out) if coverage_out else np.empty(0, np.float32),
+    }
+
+def run_hindcast(engine, history: pd.DataFrame, towns: List[str], start: dt.date, end: dt.date,
+                 predict: Callable[[np.ndarray], tuple], feature_cols: List[str], lookback: int,
+                 max_gap: int, noise: Optional[Callable[[str], np.ndarray]] = None) -> Dict:
+    """Score every (town, day) in the range and store it; returns a per-town summary"""
+    if end < start:
+        raise ValueError("end must not be before start")
+    if (end - start).days + 1 > MAX_HINDCAST_DAYS:
+        raise ValueError(f"hindcast ranges are limited to {MAX_HINDCAST_DAYS} days")
+    t0 = dt.datetime.utcnow()
+    batch = build_windows(history, towns, start, end, feature_cols, lookback, max_gap, noise)
+    X = batch["X"]
+    probs = np.empty(len(X), dtype=np.float32)
+    thresholds = np.empty(len(X), dtype=np.float32)
+    meta: Dict = {}
+    for i in range(0, len(X), HINDCAST_BATCH):
+        chunk = X[i:i + HINDCAST_BATCH]     # contiguous rows; predict scales them in place
+        p, meta = predict(chunk)
+        probs[i:i + len(chunk)] = p
+        thresholds[i:i + len(chunk)] = meta["threshold"]
+    probs = np.nan_to_num(probs, nan=0.0)
+    alerts = (probs >= thresholds).astype(int)
+    scored_at = dt.datetime.utcnow()
+
+    run_id = uuid.uuid4().hex[:12]
+    rows = [
+        {"run_id": run_id, "town": town, "date": day, "probability": float(p), "alert": int(a),
+         "threshold": float(th), "coverage": round(float(c), 3), "model_version": meta.get("model_version"),
+         "served_by": meta.get("served_by"), "created_at": scored_at}
+        for town, day, p, a, th, c in zip(batch["towns"], batch["dates"], probs, alerts, thresholds,
+                                          batch["coverage"])
+    ]
+    if rows:
+        with Session(engine) as sess:
+            sess.execute(Hindcast.__table__.insert(), rows)
+            sess.commit()
+
+    frame = pd.DataFrame({"town": batch["towns"], "probability": probs, "alert": alerts})
+    summary = {
+        town: {"days": int(len(g)), "alert_days": int(g["alert"].sum()),
+               "mean_probability": round(float(g["probability"].mean()), 4),
+               "max_probability": round(float(g["probability"].max()), 4)}
+        for town, g in frame.groupby("town")
+    } if rows else {}
+    return {
+        "run_id": run_id,
+        "start": str(start),
+        "end": str(end),
+        "towns": towns,
+        "windows": len(X),
+        "skipped_towns": [t for t in towns if t not in summary],
+        "model_version": meta.get("model_version"),
+        "served_by": meta.get("served_by"),
+        "duration_ms": round((dt.datetime.utcnow() - t0).total_seconds() * 1000, 1),
+        "summary": summary,
+    }
+
+def hindcast_rows(engine, run_id: str, town: Optional[str] = None) -> List[Dict]:
+    with Session(engine) as sess:
+        query = select(Hindcast).where(Hindcast.run_id == run_id)
+        if town:
+            query = query.where(Hindcast.town == town)
+        rows = sess.exec(query.order_by(Hindcast.town, Hindcast.date)).all()
+    return [{"town": r.town, "date": str(r.date), "probability": r.probability, "alert": r.alert,
+             "coverage": r.coverage} for r in rows]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Hindcast daily predictions from stored features")
+    parser.add_argument("--start", required=True, type=dt.date.fromisoformat)
+    parser.add_argument("--end", required=True, type=dt.date.fromisoformat)
+    parser.add_argument("--towns", default="", help="comma-separated (default: all towns)")
+    parser.add_argument("--csv", help="feature history CSV instead of the archive")
+    args = parser.parse_args()
+
+    import main  # loads the active model bundle in this process
+    SQLModel.metadata.create_all(main.engine)
+    if main.INFERENCE_MODE != "shared":
+        main.load_artifacts()
+    towns = [t.strip() for t in args.towns.split(",") if t.strip()] or main.TOWN_NAMES
+    result = main.hindcast(towns, args.start, args.end, csv_path=args.csv)
+    for town, stats in result["summary"].items():
+        print(f" {town:<8} {stats['days']:>4} days  {stats['alert_days']:>4} alert days  "
+              f"mean p={stats['mean_probability']:.3f}  max p={stats['max_probability']:.3f}")
+    print(f" Hindcast {result['run_id']}: {result['windows']} windows in {result['duration_ms']:.0f} ms")
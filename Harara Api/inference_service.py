@@ -0,0 +1,274 @@
+# =============================================================================
+# Harara Inference Service
+# - INFERENCE_MODE=shared: one inference process owns the model and the
+#   TensorFlow runtime; uvicorn workers stay light and send it windows
+# - Windows travel through a shared-memory block (inputs, then one float32
+#   output per window); the socket only carries a small control message
+# - Requests arriving within MICROBATCH_WAIT_MS are merged into one forward
+#   pass, up to MICROBATCH_MAX_WINDOWS windows (only requests with the same
+#   options, e.g. MC dropout samples, share a pass)
+# - Run the server with `python inference_service.py`; the connection
+#   unpickles messages, so server and workers must share an INFERENCE_AUTHKEY
+#   (at least 32 characters, e.g. `python -c "import secrets; print(secrets.token_hex(32))"`)
+#   and TCP addresses are refused unless they are loopback (or
+#   INFERENCE_ALLOW_REMOTE=1)
+# =============================================================================
+
+import os
+import time
+import queue
+import threading
+from multiprocessing import shared_memory, resource_tracker
+from multiprocessing.connection import Listener, Client
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "local").lower()      # local | shared
+INFERENCE_ADDRESS = os.getenv("INFERENCE_ADDRESS", "/tmp/harara-inference.sock")
+INFERENCE_AUTHKEY = os.getenv("INFERENCE_AUTHKEY", "").encode()                 # no default, see above
+INFERENCE_ALLOW_REMOTE = os.getenv("INFERENCE_ALLOW_REMOTE", "0") == "1"
+MIN_AUTHKEY_LENGTH = 32
+LOOPBACK_HOSTS = ("127.0.0.1", "::1", "localhost")
+MICROBATCH_WAIT_MS = float(os.getenv("MICROBATCH_WAIT_MS", "5"))
+MICROBATCH_MAX_WINDOWS = int(os.getenv("MICROBATCH_MAX_WINDOWS", "256"))
+CALL_TIMEOUT = 120.0
+
+def _address(address: str):
+    """'host:port' -> TCP tuple, anything else is a Unix socket path"""
+    host, sep, port = address.rpartition(":")
+    return (host, int(port)) if sep and port.isdigit() else address
+
+class InferenceError(RuntimeError):
+    pass
+
+def _check_authkey(authkey: bytes):
+    if len(authkey) < MIN_AUTHKEY_LENGTH:
+        raise InferenceError(f"INFERENCE_AUTHKEY must be set to at least {MIN_AUTHKEY_LENGTH} characters "
+                             "(shared by the inference server and the API workers)")
+
+# =============================================================================
+# SERVER (inference process)
+# =============================================================================
+
+class _Request:
+    __slots__ = ("x", "out", "options", "done", "meta", "error")
+
+    def __init__(self, x: np.ndarray, out: np.ndarray, options: Dict):
+        self.x, self.out, self.options = x, out, options
+        self.done = threading.Event()
+        self.meta: Dict = {}
+        self.error: Optional[str] = None
+
+class InferenceServer:
+    def __init__(self, predict: Callable[..., Tuple[np.ndarray, Dict]],
+                 handlers: Optional[Dict[str, Callable[..., Dict]]] = None,
+                 address: str = INFERENCE_ADDRESS, authkey: bytes = INFERENCE_AUTHKEY,
+                 wait_ms: float = MICROBATCH_WAIT_MS, max_windows: int = MICROBATCH_MAX_WINDOWS):
+        self.predict = predict
+        self.handlers = dict(handlers or {})
+        self.handlers.setdefault("status", lambda: {})
+        self.address = _address(address)
+        self.authkey = authkey
+        self.wait = wait_ms / 1000.0
+        self.max_windows = max_windows
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self.stats = {"requests": 0, "windows": 0, "batches": 0, "max_batch": 0, "last_batch_ms": None}
+
+    def serve_forever(self):
+        _check_authkey(self.authkey)
+        if isinstance(self.address, tuple) and self.address[0] not in LOOPBACK_HOSTS and not INFERENCE_ALLOW_REMOTE:
+            raise InferenceError(f"refusing to listen on {self.address[0]}: the inference server accepts pickled "
+                                 "messages; use a Unix socket or loopback address (or INFERENCE_ALLOW_REMOTE=1)")
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)  # stale socket from a previous run
+        threading.Thread(target=self._batch_loop, name="inference-batcher", daemon=True).start()
+        with Listener(self.address, authkey=self.authkey) as listener:
+            if isinstance(self.address, str):
+                os.chmod(self.address, 0o600)  # only the service user may connect
+            print(f" Inference server listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:  # failed handshake from a stray client
+                    print(f" Inference server: rejected connection: {e}")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,),
+                                 name="inference-conn", daemon=True).start()
+
+    def _serve_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    msg = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = self._predict(msg) if msg["op"] == "predict" else self._call(msg)
+                except Exception as e:
+                    reply = {"ok": False, "kind": type(e).__name__, "error": str(e)}
+                conn.send(reply)
+
+    def _call(self, msg: Dict) -> Dict:
+        handler = self.handlers.get(msg["op"])
+        if handler is None:
+            raise ValueError(f"unknown op {msg['op']!r}")
+        result = handler(**msg.get("args", {}))
+        if msg["op"] == "status":
+            result = {**result, "server": self.stats}
+        return {"ok": True, "result": result}
+
+    def _predict(self, msg: Dict) -> Dict:
+        shm = shared_memory.SharedMemory(name=msg["shm"])
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")  # the client owns and unlinks it
+        except Exception:
+            pass
+        try:
+            shape = tuple(msg["shape"])
+            x = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+            out = np.ndarray((shape[0],), dtype=np.float32, buffer=shm.buf, offset=x.nbytes)
+            request = _Request(x, out, msg.get("options") or {})
+            self._queue.put(request)
+            request.done.wait()
+            del x, out, request.x, request.out  # release buffer views before close()
+            if request.error:
+                return {"ok": False, "kind": "InferenceError", "error": request.error}
+            return {"ok": True, "meta": request.meta}
+        finally:
+            shm.close()
+
+    def _batch_loop(self):
+        while True:
+            batch: List[_Request] = [self._queue.get()]
+            windows = len(batch[0].x)
+            deadline = time.perf_counter() + self.wait
+            while windows < self.max_windows:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                windows += len(request.x)
+            groups: Dict[tuple, List[_Request]] = {}
+            for request in batch:
+                groups.setdefault(tuple(sorted(request.options.items())), []).append(request)
+            for group in groups.values():
+                self._run_batch(group)
+
+    def _run_batch(self, batch: List[_Request]):
+        t0 = time.perf_counter()
+        try:
+            X = batch[0].x if len(batch) == 1 else np.concatenate([r.x for r in batch])
+            probs, meta = self.predict(X, **batch[0].options)
+            probs = np.asarray(probs, dtype=np.float32).ravel()
+            i = 0
+            for r in batch:
+                n = len(r.x)
+                r.out[:] = probs[i:i + n]
+                # Per-window arrays in meta (e.g. uncertainty) are split like the probabilities
+                r.meta = {k: v[i:i + n] if isinstance(v, np.ndarray) and len(v) == len(X) else v
+                          for k, v in meta.items()}
+                r.meta.update(batch_windows=len(X), batch_requests=len(batch))
+                i += n
+        except Exception as e:
+            for r in batch:
+                r.error = str(e)
+        finally:
+            self.stats["requests"] += len(batch)
+            self.stats["windows"] += sum(len(r.x) for r in batch)
+            self.stats["batches"] += 1
+            self.stats["max_batch"] = max(self.stats["max_batch"], sum(len(r.x) for r in batch))
+            self.stats["last_batch_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+            for r in batch:
+                r.done.set()
+
+# =============================================================================
+# CLIENT (API workers)
+# =============================================================================
+
+class InferenceClient:
+    """One connection per calling thread, so concurrent callers can share a micro-batch"""
+
+    def __init__(self, address: str = INFERENCE_ADDRESS, authkey: bytes = INFERENCE_AUTHKEY):
+        self.address = _address(address)
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            _check_authkey(self.authkey)
+            conn = self._local.conn = Client(self.address, authkey=self.authkey)
+        return conn
+
+    def _request(self, msg: Dict) -> Dict:
+        conn = self._conn()
+        try:
+            conn.send(msg)
+            if not conn.poll(CALL_TIMEOUT):
+                raise InferenceError(f"inference server did not answer within {CALL_TIMEOUT:.0f}s")
+            reply = conn.recv()
+        except (EOFError, OSError, InferenceError):
+            self._local.conn = None  # reconnect on the next call
+            conn.close()
+            raise
+        if not reply["ok"]:
+            raise (KeyError if reply.get("kind") == "KeyError" else InferenceError)(reply["error"])
+        return reply
+
+    def predict(self, X: np.ndarray, **options) -> Tuple[np.ndarray, Dict]:
+        """Score a (N, days, features) float32 batch; returns (probabilities, model meta)"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        shm = shared_memory.SharedMemory(create=True, size=X.nbytes + 4 * len(X))
+        try:
+            np.ndarray(X.shape, dtype=np.float32, buffer=shm.buf)[:] = X
+            reply = self._request({"op": "predict", "shm": shm.name, "shape": X.shape, "options": options})
+            probs = np.ndarray((len(X),), dtype=np.float32, buffer=shm.buf, offset=X.nbytes).copy()
+            return probs, reply["meta"]
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def call(self, op: str, **args) -> Dict:
+        return self._request({"op": op, "args": args})["result"]
+
+    def wait_ready(self, timeout: float) -> Dict:
+        """Poll the server's status until it answers (it may still be loading the model)"""
+        _check_authkey(self.authkey)  # a missing key is not worth waiting for
+        deadline = time.time() + timeout
+        while True:
+            try:
+                return self.call("status")
+            except (OSError, EOFError, InferenceError):
+                if time.time() >= deadline:
+                    raise
+                time.sleep(1.0)
+
+# Global inference client
+inference_client: Optional[InferenceClient] = None
+
+def get_inference_client() -> InferenceClient:
+    """Get the global inference client (created on first use)"""
+    global inference_client
+    if inference_client is None:
+        inference_client = InferenceClient()
+    return inference_client
+
+if __name__ == "__main__":
+    # The inference process reuses the API's model code but loads the model itself
+    os.environ["INFERENCE_MODE"] = "local"
+    import main
+    from model_registry import get_model_registry
+
+    main.load_artifacts()
+    registry = get_model_registry()
+    InferenceServer(main.predict_local, handlers={
+        "status": main.model_status,
+        "models": registry.status,
+        "activate": lambda version: registry.activate(version),
+        "rollback": registry.rollback,
+    }).serve_forever()
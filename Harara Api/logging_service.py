@@ -4,9 +4,11 @@
 # =============================================================================
 
 import json
+import math
 import datetime as dt
 from typing import Optional, Dict, Any
 from enum import Enum
+import threading
 import traceback
 import time
 
@@ -24,15 +26,172 @@ class LogCategory(str, Enum):
     SYSTEM = "system"
     EXPORT = "export"
 
+# =============================================================================
+# ROLLING AGGREGATES
+# Constant-memory sliding-window stats so the dashboard does not have to
+# scan system_logs. Each window is a ring of fixed-width time buckets.
+# =============================================================================
+
+# window name -> (span in seconds, number of buckets)
+AGGREGATE_WINDOWS = {
+    "5m": (300, 30),
+    "1h": (3600, 60),
+    "24h": (86400, 96),
+}
+MAX_TRACKED_ENDPOINTS = 64
+OTHER_ENDPOINT = "__other__"
+
+class LatencySketch:
+    """Log-bucketed latency histogram (HDR-style, ~2.5% relative error)."""
+    MIN_MS = 0.1
+    GROWTH = 1.05
+    MAX_INDEX = 400  # 0.1ms * 1.05^400 is far beyond any request timeout
+
+    def __init__(self):
+        self.bins: Dict[int, int] = {}
+        self.count = 0
+
+    def add(self, value_ms: float):
+        if value_ms <= self.MIN_MS:
+            idx = 0
+        else:
+            idx = min(self.MAX_INDEX, int(math.ceil(math.log(value_ms / self.MIN_MS, self.GROWTH))))
+        self.bins[idx] = self.bins.get(idx, 0) + 1
+        self.count += 1
+
+    def merge(self, other: "LatencySketch"):
+        for idx, n in other.bins.items():
+            self.bins[idx] = self.bins.get(idx, 0) + n
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for idx in sorted(self.bins):
+            seen += self.bins[idx]
+            if seen >= rank:
+                return round(self.MIN_MS * self.GROWTH ** idx, 2)
+        return round(self.MIN_MS * self.GROWTH ** max(self.bins), 2)
+
+class _AggregateBucket:
+    def __init__(self):
+        self.reset(-1)
+
+    def reset(self, start: int):
+        self.start = start
+        self.endpoints: Dict[str, Dict[str, Any]] = {}
+        self.categories: Dict[str, int] = {}
+        self.levels: Dict[str, int] = {}
+
+class RollingAggregates:
+    """Per-endpoint latency quantiles, error rates and event counts over sliding windows."""
+
+    def __init__(self, windows: Dict[str, tuple] = AGGREGATE_WINDOWS):
+        self._lock = threading.Lock()
+        self._rings = {
+            name: (span, span // n, [_AggregateBucket() for _ in range(n)])
+            for name, (span, n) in windows.items()
+        }
+        self._endpoints = set()
+
+    def _buckets_at(self, now: float):
+        for span, width, ring in self._rings.values():
+            start = int(now // width) * width
+            bucket = ring[(start // width) % len(ring)]
+            if bucket.start != start:
+                bucket.reset(start)
+            yield bucket
+
+    def record_event(self, category: str, level: str, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            for bucket in self._buckets_at(now):
+                bucket.categories[category] = bucket.categories.get(category, 0) + 1
+                bucket.levels[level] = bucket.levels.get(level, 0) + 1
+
+    def record_request(self, endpoint: str, status_code: int, duration_ms: float,
+                       now: Optional[float] = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            # Cap endpoint cardinality so memory stays bounded
+            if endpoint not in self._endpoints:
+                if len(self._endpoints) >= MAX_TRACKED_ENDPOINTS:
+                    endpoint = OTHER_ENDPOINT
+                self._endpoints.add(endpoint)
+            for bucket in self._buckets_at(now):
+                stats = bucket.endpoints.get(endpoint)
+                if stats is None:
+                    stats = bucket.endpoints[endpoint] = {
+                        "sketch": LatencySketch(), "client_errors": 0, "server_errors": 0
+                    }
+                stats["sketch"].add(duration_ms)
+                if status_code >= 500:
+                    stats["server_errors"] += 1
+                elif status_code >= 400:
+                    stats["client_errors"] += 1
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Merge live buckets of every window into a compact JSON-able summary"""
+        now = time.time() if now is None else now
+        out = {}
+        with self._lock:
+            for name, (span, width, ring) in self._rings.items():
+                oldest = int(now // width) * width - span + width
+                endpoints: Dict[str, Dict[str, Any]] = {}
+                categories: Dict[str, int] = {}
+                levels: Dict[str, int] = {}
+                for bucket in ring:
+                    if bucket.start < oldest:
+                        continue
+                    for ep, stats in bucket.endpoints.items():
+                        agg = endpoints.setdefault(ep, {
+                            "sketch": LatencySketch(), "client_errors": 0, "server_errors": 0
+                        })
+                        agg["sketch"].merge(stats["sketch"])
+                        agg["client_errors"] += stats["client_errors"]
+                        agg["server_errors"] += stats["server_errors"]
+                    for k, v in bucket.categories.items():
+                        categories[k] = categories.get(k, 0) + v
+                    for k, v in bucket.levels.items():
+                        levels[k] = levels.get(k, 0) + v
+
+                total_requests = sum(a["sketch"].count for a in endpoints.values())
+                total_errors = sum(a["server_errors"] for a in endpoints.values())
+                out[name] = {
+                    "requests": total_requests,
+                    "error_rate": round(total_errors / total_requests, 4) if total_requests else 0.0,
+                    "endpoints": {
+                        ep: {
+                            "count": a["sketch"].count,
+                            "p50_ms": a["sketch"].quantile(0.50),
+                            "p95_ms": a["sketch"].quantile(0.95),
+                            "p99_ms": a["sketch"].quantile(0.99),
+                            "error_rate": round(a["server_errors"] / a["sketch"].count, 4),
+                            "client_error_rate": round(a["client_errors"] / a["sketch"].count, 4),
+                        }
+                        for ep, a in sorted(endpoints.items())
+                    },
+                    "categories": categories,
+                    "levels": levels,
+                }
+        return {"generated_at": dt.datetime.utcnow().isoformat() + "Z", "windows": out}
+
+# Process-wide aggregates, shared by every SystemLogger instance
+rolling_aggregates = RollingAggregates()
+
 class SystemLogger:
     def __init__(self, firestore_db=None):
         self.firestore_db = firestore_db
+        self.aggregates = rolling_aggregates
         
     def log(self, level: LogLevel, category: LogCategory, message: str, 
             details: Optional[Dict[str, Any]] = None, user_id: Optional[str] = None,
             endpoint: Optional[str] = None, duration_ms: Optional[float] = None):
         """Log system event to Firestore"""
         try:
+            self.aggregates.record_event(category.value, level.value)
             log_entry = {
                 "timestamp": dt.datetime.utcnow(),
                 "level": level.value,
@@ -68,6 +227,10 @@ class SystemLogger:
         if error_details:
             details["error"] = error_details
             
+        try:
+            self.aggregates.record_request(endpoint, status_code, duration_ms)
+        except Exception as e:
+            print(f"Aggregate error: {e}")
         self.log(level, LogCategory.API, message, details, user_id, endpoint, duration_ms)
     
     def log_prediction(self, success: bool, town_count: int, duration_ms: float,
@@ -6,79 +6,155 @@
 # - Stores results in SQLite + Firestore 
 # - Exposes HTTP endpoints (manual run, latest results, quick viz, mock)
 
-import os, io, json, datetime as dt
+import os, io, json, threading, datetime as dt
 from zoneinfo import ZoneInfo
 from typing import List, Optional, Dict
-import numpy as np, pandas as pd
 
-from fastapi import FastAPI, HTTPException, Response
-from fastapi.middleware.cors import CORSMiddleware
-from starlette.responses import RedirectResponse
-from pydantic import BaseModel
-from sqlmodel import SQLModel, Field, create_engine, Session
+# Every heavy import below is timed (wall + RSS) by the startup profiler
+from startup_service import lazy_module, get_startup, get_startup_profiler, READY
+startup_profiler = get_startup_profiler()
 
-import tensorflow as tf
-import joblib
-import ee
+with startup_profiler.measure("numpy + pandas", "import"):
+    import numpy as np, pandas as pd
+
+with startup_profiler.measure("fastapi + sqlmodel", "import"):
+    from fastapi import FastAPI, HTTPException, Response
+    from fastapi.middleware.cors import CORSMiddleware
+    from starlette.responses import RedirectResponse
+    from pydantic import BaseModel
+    from sqlmodel import SQLModel, Field, create_engine, Session, select
+
+# Heavy SDKs are imported on first use (see startup_service)
+tf = lazy_module("tensorflow")
+ee = lazy_module("ee")
 from dotenv import load_dotenv
 load_dotenv()
 
 # Import export routes and logging service
-from app.routes import export_routes, auth_routes
-from logging_service import init_logger, get_logger, LogLevel, LogCategory, log_api_call
-from middleware import RequestLoggingMiddleware
-from auth import require_auth
+with startup_profiler.measure("app routes + services", "import"):
+    from app.routes import export_routes, auth_routes, profiling_routes, subscriber_routes
+    from logging_service import init_logger, get_logger, LogLevel, LogCategory, log_api_call, rolling_aggregates
+    from middleware import RequestLoggingMiddleware
+    from profiling_service import profiled, RUN_PREDICTIONS_TARGET
+    from archive_service import archive_run, compact_closed_months, compacted_file
+    import report_service
+    from auth import require_auth
+    from model_registry import ModelBundle, get_model_registry
+    from inference_service import INFERENCE_MODE, InferenceError, get_inference_client
+    from scaler_artifact import (SCALER_FILE, LEGACY_SCALER_FILE, load_scaler, convert_pickled_scaler,
+                                 scale_windows_inplace)
+    from fallback_model import FALLBACK_FILE, FALLBACK_POLICY, load_fallback
+    import hindcast_service
+    import scenario_service
 from fastapi import Depends
 import time
 
-# AFRICA'S TALKING SMS SETUP
+# SMS PROVIDERS (Africa's Talking -> Twilio failover, or the local stub)
 # =============================================================================
-import africastalking
-
-AT_USERNAME = os.getenv("AT_USERNAME", "Sandbox")
-AT_API_KEY = os.getenv("AT_API_KEY")
+with startup_profiler.measure("notification services", "import"):
+    from sms_dispatcher import SMSDispatcher, normalize_phone
+    from sms_providers import build_provider
+    from notification_outbox import init_outbox, get_outbox, OutboxJob
+    from alert_state import init_alert_state, get_alert_state
+    from subscriber_index import get_subscriber_index, public_user
+    from dispatch_scheduler import DispatchScheduler, severity_priority, SMS_MESSAGES_PER_SECOND, FCM_MESSAGES_PER_SECOND
+    from notifications_service import (send_fcm_batch, send_topic_notification, town_topic,
+                                       subscribe_to_town, unsubscribe_from_town)
+    from db_migrations import migrate_table
+
+sms_provider = build_provider()
+sms_dispatcher = SMSDispatcher(sms_provider)
+
+def log_sms_dispatch(town: str, dispatch: Dict):
+    """Summarize a fan-out in one log entry (plus the first few failures)"""
+    level = LogLevel.SUCCESS if not dispatch["failed"] else LogLevel.WARNING
+    get_logger().log(level, LogCategory.SMS, f"SMS fan-out for {town}: {dispatch['sent']}/{dispatch['unique']} sent", {
+        k: dispatch[k] for k in ("provider", "requested", "unique", "invalid", "chunks", "sent", "failed", "duration_ms")
+    })
+    failures = [(n, r) for n, r in dispatch["results"].items() if r["status"] != "sent"]
+    for phone, r in failures[:10]:
+        get_logger().log_sms(phone, False, dispatch["provider"], r.get("error") or r.get("provider_status"))
+
+FCM_ALERT_TITLE = "Harara Heat Alert"
+FCM_BATCH_SIZE = 500  # FCM multicast limit
+FCM_USE_TOPICS = os.getenv("FCM_USE_TOPICS", "true").lower() == "true"
+
+def prune_fcm_tokens(tokens: List[str]) -> int:
+    """Drop tokens FCM reports as unregistered from the users collection"""
+    if not tokens or FIRESTORE_DB is None:
+        return 0
+    pruned = 0
+    for i in range(0, len(tokens), 30):  # Firestore 'in' limit
+        docs = FIRESTORE_DB.collection("users").where(
+            filter=firestore.FieldFilter("fcm_token", "in", tokens[i:i + 30])).stream()
+        for doc in docs:
+            doc.reference.update({"fcm_token": firestore.DELETE_FIELD})
+            pruned += 1
+    get_logger().log(LogLevel.INFO, LogCategory.SMS, f"Pruned {pruned} unregistered FCM tokens")
+    return pruned
+
+def send_fcm_tokens(message: str, tokens: List[str]) -> Dict[str, Dict]:
+    results = send_fcm_batch(tokens, FCM_ALERT_TITLE, message)
+    dead = [t for t, r in results.items() if r.get("unregistered")]
+    if dead:
+        try:
+            prune_fcm_tokens(dead)
+        except Exception as e:
+            print(f" FCM token pruning failed: {e}")
+    return results
 
-try:
-    africastalking.initialize(AT_USERNAME, AT_API_KEY)
-    sms = africastalking.SMS
-    print("Africa's Talking initialized successfully")
-except Exception as e:
-    print(f" Africa's Talking init error: {e}")
+def send_fcm_topics(message: str, topics: List[str]) -> Dict[str, Dict]:
+    results = {}
+    for topic in topics:
+        try:
+            results[topic] = {"status": "sent", "provider_status": send_topic_notification(topic, FCM_ALERT_TITLE, message)}
+        except Exception as e:
+            results[topic] = {"status": "failed", "error": str(e)}
+    return results
 
-def send_sms_africa(phone_number: str, message: str):
-    """Send SMS with fallback options"""
-    # Method 1: Try Africa's Talking (if working)
+def update_town_topics(old_token: Optional[str], old_town: Optional[str],
+                       new_token: Optional[str], new_town: str):
+    """Keep a device's town topic subscription in step with its registration"""
     try:
-        response = sms.send(message, [phone_number])
-        print(f" Africa's Talking Response: {response}")
-        
-        # Check if SMS was actually sent successfully
-        if 'SMSMessageData' in response and 'Recipients' in response['SMSMessageData']:
-            recipients = response['SMSMessageData']['Recipients']
-            if recipients and len(recipients) > 0:
-                status = recipients[0].get('status', 'Unknown')
-                cost = recipients[0].get('cost', 'Unknown')
-                print(f" SMS Status: {status}, Cost: {cost}")
-                if 'Success' in status:
-                    print(f" SMS sent successfully to {phone_number}")
-                    return {"status": "sent", "provider": "africastalking", "response": response}
-                else:
-                    print(f" SMS failed with status: {status}")
-            else:
-                print(f" No recipients in response")
-        else:
-            print(f" Invalid response format: {response}")
-            
+        if old_token and old_town and (old_token != new_token or old_town != new_town):
+            unsubscribe_from_town([old_token], old_town)
+        if new_token:
+            result = subscribe_to_town([new_token], new_town)
+            if result["unregistered"]:
+                prune_fcm_tokens(result["unregistered"])
     except Exception as e:
-        print(f" Africa's Talking failed: {e}")
-    
-    # Method 2: Simulation mode (for testing)
-    print(f" SMS SIMULATION: Would send to {phone_number}: {message[:50]}...")
-    return {"status": "simulated", "provider": "simulation", "message": "SMS simulated successfully"}
+        print(f" FCM topic subscription failed: {e}")
+
+# Rate-limited provider channels drained by the outbox workers
+dispatch_scheduler = DispatchScheduler()
+dispatch_scheduler.register(
+    "sms", lambda message, numbers: sms_dispatcher.dispatch(message, numbers)["results"],
+    SMS_MESSAGES_PER_SECOND, batch_size=sms_dispatcher.chunk_size,
+)
+dispatch_scheduler.register(
+    "fcm", send_fcm_tokens, FCM_MESSAGES_PER_SECOND, batch_size=FCM_BATCH_SIZE,
+)
+dispatch_scheduler.register("fcm_topic", send_fcm_topics, FCM_MESSAGES_PER_SECOND, batch_size=10)
+
+def enqueue_sms_alert(alert_id: str, message: str, recipients: List[str], town: str,
+                      severity: Optional[str] = None) -> Dict:
+    """Queue an alert fan-out in the durable outbox (direct dispatch if it is not running)"""
+    outbox = get_outbox()
+    if outbox is None:
+        dispatch = sms_dispatcher.dispatch(message, recipients)
+        log_sms_dispatch(town, dispatch)
+        return {"alert_id": alert_id, "queued": dispatch["unique"], "duplicates": 0, "invalid": dispatch["invalid"]}
+    queued = outbox.enqueue(alert_id, message, recipients, town=town,
+                            priority=severity_priority(severity))
+    get_logger().log(LogLevel.INFO, LogCategory.SMS, f"Queued {queued['queued']} SMS for {town}", queued)
+    return queued
+
 # FIREBASE FIRESTORE SETUP
 # =============================================================================
-import firebase_admin
-from firebase_admin import credentials, firestore
+firebase_admin = lazy_module("firebase_admin")
+credentials = lazy_module("firebase_admin.credentials")
+firestore = lazy_module("firebase_admin.firestore")
+google_exceptions = lazy_module("google.api_core.exceptions")
 
 FIRESTORE_DB = None
 def init_firestore():
@@ -119,6 +195,19 @@ LOOKBACK_DAYS = 21
 HORIZON_DAYS = 7
 MAX_FFILL_GAP = 5
 SCHEDULER_ENABLED = True
+MODEL_WAIT_SECONDS = 120  # runs that arrive while the model is still loading wait this long
+# Batch sizes traced at load time; defaults to a single window and one window per town
+MODEL_WARMUP_BATCH_SIZES = [int(b) for b in os.getenv("MODEL_WARMUP_BATCH_SIZES", "").split(",") if b.strip()]
+MODEL_WARMUP_REPEATS = 3
+MC_DROPOUT_SAMPLES = int(os.getenv("MC_DROPOUT_SAMPLES", "30"))       # K dropout samples per window
+PREDICT_UNCERTAINTY = os.getenv("PREDICT_UNCERTAINTY", "0") == "1"     # MC dropout on scheduled runs
+UNCERTAINTY_QUANTILES = (0.05, 0.5, 0.95)
+# Parity on the reference batch: a reload of the same network must reproduce the active outputs;
+# a different network is only compared against a limit when one is set explicitly
+MODEL_PARITY_MAX_DIFF = float(os.getenv("MODEL_PARITY_MAX_DIFF", "1e-3"))
+MODEL_PARITY_CROSS_VERSION_MAX_DIFF = (float(os.getenv("MODEL_PARITY_CROSS_VERSION_MAX_DIFF"))
+                                       if os.getenv("MODEL_PARITY_CROSS_VERSION_MAX_DIFF") else None)
+HOT_RETENTION_DAYS = int(os.getenv("HOT_RETENTION_DAYS", "0"))  # 0 keeps all SQLite history
 
 DATE_COL = "date"
 TOWN_COL = "town"
@@ -149,6 +238,8 @@ app.add_middleware(RequestLoggingMiddleware)
 # Include routes
 app.include_router(auth_routes.router, prefix="/auth", tags=["Authentication"])
 app.include_router(export_routes.router, prefix="/api", tags=["Export"])
+app.include_router(profiling_routes.router, prefix="/admin", tags=["Profiling"])
+app.include_router(subscriber_routes.router, prefix="/admin", tags=["Subscribers"])
 
 # =============================================================================
 # DATABASE (SQLite)
@@ -163,6 +254,14 @@ class Prediction(SQLModel, table=True):
     probability: float
     alert: int
     details_json: Optional[str] = None
+    model_version: Optional[str] = None
+    served_by: Optional[str] = None   # "lstm" or "fallback"
+    # MC dropout summary (uncertainty runs only)
+    prob_mean: Optional[float] = None
+    prob_std: Optional[float] = None
+    prob_p05: Optional[float] = None
+    prob_p50: Optional[float] = None
+    prob_p95: Optional[float] = None
 
 # =============================================================================
 # EARTH ENGINE
@@ -171,7 +270,7 @@ EE_READY = False
 era5 = None
 modis_lst = None
 modis_ndvi = None
-towns: Dict[str, ee.Geometry] = {}
+towns: Dict[str, "ee.Geometry"] = {}
 
 def init_gee():
     """Initialize Google Earth Engine using EE_SERVICE_KEY from environment (Render-safe)."""
@@ -194,6 +293,8 @@ def init_gee():
         print(f" EE initialization failed: {e}")
         print(" Google Earth Engine not ready — check EE_SERVICE_KEY formatting in Render dashboard.")
 
+TOWN_NAMES = ["Juba", "Wau", "Yambio", "Bor", "Malakal", "Bentiu"]
+
 def build_ee_objects():
     
     global era5, modis_lst, modis_ndvi, towns
@@ -218,13 +319,100 @@ def build_ee_objects():
 MODEL = None
 SCALER = None
 THRESHOLD = 0.5
+MODEL_VERSION: Optional[str] = None
+MODEL_LATENCY: Dict[str, Dict] = {"warmup": {}, "last_run": None}
 def load_artifacts():
-    global MODEL, SCALER, THRESHOLD
-    with open(os.path.join(ARTIFACT_DIR, "threshold.json")) as f:
-        THRESHOLD = float(json.load(f)["threshold"])
-    SCALER = joblib.load(os.path.join(ARTIFACT_DIR, "scaler.pkl"))
-    MODEL = tf.keras.models.load_model(os.path.join(ARTIFACT_DIR, "model.keras"))
-    print(f" Artifacts loaded (threshold={THRESHOLD})")
+    """Load the registry's active version (the legacy artifacts become the first version)"""
+    registry = get_model_registry()
+    registry.configure(load_bundle, check_bundle_parity, publish_bundle)
+    registry.bootstrap(ARTIFACT_DIR)
+    registry.load_active()
+
+def load_bundle(version: str, path: str) -> ModelBundle:
+    with open(os.path.join(path, "threshold.json")) as f:
+        threshold = float(json.load(f)["threshold"])
+    scaler_path = os.path.join(path, SCALER_FILE)
+    if not os.path.exists(scaler_path):  # version registered before scaler.json existed
+        convert_pickled_scaler(os.path.join(path, LEGACY_SCALER_FILE), scaler_path)
+    scaler = load_scaler(scaler_path)
+    fallback_path = os.path.join(path, FALLBACK_FILE)
+    fallback = load_fallback(fallback_path) if os.path.exists(fallback_path) else None
+    if FALLBACK_POLICY == "always" and fallback is None:
+        raise RuntimeError(f"FALLBACK_POLICY=always but {version} has no {FALLBACK_FILE}")
+
+    model, latency, model_error = None, {}, None
+    if FALLBACK_POLICY != "always":  # 'always' never imports TensorFlow
+        try:
+            model = tf.keras.models.load_model(os.path.join(path, "model.keras"))
+            # Traced before it can be published, so the first real run is already warm
+            latency = warmup_model(model)
+        except Exception as e:
+            if fallback is None or FALLBACK_POLICY == "never":
+                raise
+            model, model_error = None, f"{type(e).__name__}: {e}"
+            print(f" Model {version} unavailable, serving the fallback model: {model_error}")
+    print(f" Artifacts {version} loaded (threshold={threshold}, fallback={'yes' if fallback else 'no'})")
+    return ModelBundle(version, model, scaler, threshold, latency, fallback, model_error)
+
+def publish_bundle(bundle: ModelBundle):
+    """Mirror the active bundle into the module globals read by health and legacy paths"""
+    global MODEL, SCALER, THRESHOLD, MODEL_VERSION
+    MODEL, SCALER, THRESHOLD, MODEL_VERSION = bundle.model, bundle.scaler, bundle.threshold, bundle.version
+    MODEL_LATENCY["warmup"] = bundle.latency
+
+def bundle_predictor(bundle: ModelBundle):
+    """The model that serves a bundle under FALLBACK_POLICY when nothing fails"""
+    if bundle.model is not None and FALLBACK_POLICY != "always":
+        return bundle.model
+    return bundle.fallback
+
+def predictor_hash(bundle: ModelBundle) -> Optional[str]:
+    """Content hash of the file behind the bundle's serving predictor (model.keras or fallback.json)"""
+    name = "model.keras" if bundle_predictor(bundle) is bundle.model else FALLBACK_FILE
+    return get_model_registry().manifest()["versions"].get(bundle.version, {}).get("files", {}).get(name)
+
+def check_bundle_parity(candidate: ModelBundle, active: Optional[ModelBundle]) -> Dict:
+    """Candidate must score a fixed reference batch sanely and stay close to the active model.
+
+    The same network (predictor file hash) must match within MODEL_PARITY_MAX_DIFF; a
+    different one only within MODEL_PARITY_CROSS_VERSION_MAX_DIFF, when that is set.
+    """
+    rng = np.random.default_rng(0)
+    X = rng.normal(0, 1, (len(TOWN_NAMES), LOOKBACK_DAYS, len(FEATURE_COLS))).astype(np.float32)
+    p_new = np.asarray(bundle_predictor(candidate).predict(X, batch_size=len(X), verbose=0)).ravel()
+    result = {"ok": False, "batch": len(X), "threshold": candidate.threshold}
+    if p_new.shape != (len(X),):
+        return {**result, "reason": f"output shape {p_new.shape}, expected ({len(X)},)"}
+    if not np.all(np.isfinite(p_new)) or p_new.min() < 0 or p_new.max() > 1:
+        return {**result, "reason": "probabilities not finite / outside [0, 1]"}
+    if not 0 < candidate.threshold < 1:
+        return {**result, "reason": f"threshold {candidate.threshold} outside (0, 1)"}
+    if active is not None:
+        p_old = np.asarray(bundle_predictor(active).predict(X, batch_size=len(X), verbose=0)).ravel()
+        diff = np.abs(p_new - p_old)
+        same_network = predictor_hash(candidate) is not None and predictor_hash(candidate) == predictor_hash(active)
+        limit = MODEL_PARITY_MAX_DIFF if same_network else MODEL_PARITY_CROSS_VERSION_MAX_DIFF
+        result.update(max_abs_diff=round(float(diff.max()), 6), mean_abs_diff=round(float(diff.mean()), 6),
+                      alert_agreement=round(float(np.mean((p_new >= candidate.threshold) == (p_old >= active.threshold))), 4),
+                      comparison="reload" if same_network else "cross-version", max_diff_limit=limit)
+        if limit is not None and diff.max() > limit:
+            return {**result, "reason": f"max |diff| {diff.max():.2g} > {limit} ({result['comparison']})"}
+    return {**result, "ok": True}
+
+def warmup_model(model, batch_sizes: Optional[List[int]] = None) -> Dict[int, Dict]:
+    """Trace predict at each batch size; first call is the cold latency, median of the rest warm"""
+    sizes = sorted(set(batch_sizes or MODEL_WARMUP_BATCH_SIZES or [1, len(TOWN_NAMES)]))
+    latency = {}
+    for batch in sizes:
+        X = np.zeros((batch, LOOKBACK_DAYS, len(FEATURE_COLS)), dtype=np.float32)
+        timings = []
+        for _ in range(1 + MODEL_WARMUP_REPEATS):
+            t0 = time.perf_counter()
+            model.predict(X, batch_size=batch, verbose=0)
+            timings.append((time.perf_counter() - t0) * 1000)
+        latency[batch] = {"cold_ms": round(timings[0], 1), "warm_ms": round(float(np.median(timings[1:])), 1)}
+        print(f" Model warmup batch={batch}: cold {timings[0]:.0f} ms, warm {latency[batch]['warm_ms']:.0f} ms")
+    return latency
 
 # =============================================================================
 # FEATURE FETCHING + IMPUTATION
@@ -275,8 +463,9 @@ def _ensure_daily_index(df, start, end):
 
 
 # Add missing imports
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
+with startup_profiler.measure("apscheduler", "import"):
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.cron import CronTrigger
 
 # Add missing models
 class PredictResponse(BaseModel):
@@ -284,6 +473,7 @@ class PredictResponse(BaseModel):
     start_date: str
     end_date: str
     threshold: float
+    model_version: Optional[str] = None
     predictions: List[Dict]
 
 class ManualAlertRequest(BaseModel):
@@ -291,6 +481,32 @@ class ManualAlertRequest(BaseModel):
     message: str
     severity: str = "High"
 
+class HindcastRequest(BaseModel):
+    start: dt.date
+    end: dt.date
+    towns: Optional[List[str]] = None     # default: all towns
+
+class ScenarioPerturbation(BaseModel):
+    feature: str                          # one of FEATURE_COLS, in its raw units
+    op: str = "add"                       # add | mul
+    value: float
+    towns: Optional[List[str]] = None     # default: every town
+    days: Optional[int] = None            # only the last N window days (default: the whole window)
+
+class Scenario(BaseModel):
+    name: str
+    perturbations: List[ScenarioPerturbation]
+
+class ScenarioRequest(BaseModel):
+    scenarios: List[Scenario]
+    towns: Optional[List[str]] = None     # default: every town with a current window
+    include_baseline: bool = True
+
+class ModelRegisterRequest(BaseModel):
+    path: str                  # server-side directory with model.keras, scaler.json, threshold.json
+    note: str = ""
+    activate: bool = False
+
 # Add scheduler variable
 scheduler: Optional[BackgroundScheduler] = None
 
@@ -530,27 +746,57 @@ def run_predictions() -> Dict:
     upload_predictions_to_firestore(result)
     return result
 
+@app.get("/diagnostics/startup", tags=["System"])
+def startup_diagnostics(current_user=Depends(require_auth)):
+    """Wall time and RSS delta of each heavy import and startup stage"""
+    return {**get_startup_profiler().report(), "stages": get_startup().status()["subsystems"]}
+
+@app.get("/live", tags=["System"])
+def live():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "alive", "timestamp": dt.datetime.now(ZoneInfo(TIMEZONE)).isoformat()}
+
+@app.get("/ready", tags=["System"])
+def ready(response: Response):
+    """Readiness: 200 once every required subsystem is ready, else 503 with per-subsystem state"""
+    status = get_startup().status()
+    if not status["ready"]:
+        response.status_code = 503
+    return status
+
 @app.get("/health", tags=["System"])
 def health():
     """Health check endpoint for system status"""
     try:
-        system_status = "online" if EE_READY and FIRESTORE_DB and MODEL else "degraded"
+        startup = get_startup()
+        if EE_READY and FIRESTORE_DB and model_ready() and serving_model() != "fallback":
+            system_status = "online"
+        elif startup.warming:
+            system_status = "starting"
+        else:
+            system_status = "degraded"
         return {
             "status": system_status,
             "ee_ready": EE_READY,
             "firestore_ready": FIRESTORE_DB is not None,
-            "model_loaded": MODEL is not None,
+            "model_loaded": model_ready(),
+            "inference_mode": INFERENCE_MODE,
+            "serving_model": serving_model(),
+            "model_version": MODEL_VERSION,
+            "model_latency": MODEL_LATENCY,
+            "subsystems": {n: s["state"] for n, s in startup.status()["subsystems"].items()},
             "timestamp": dt.datetime.now(ZoneInfo(TIMEZONE)).isoformat()
         }
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 @app.post("/predict/run", response_model=PredictResponse, tags=["Predictions"])
-def predict_run():
+def predict_run(uncertainty: Optional[bool] = None):
+    """uncertainty=true adds MC dropout mean / std / quantiles next to each probability"""
     start_time = time.time()
     try:
         get_logger().log(LogLevel.INFO, LogCategory.PREDICTION, "Starting prediction run")
-        result = run_predictions()
+        result = run_predictions(uncertainty=uncertainty)
         duration_ms = (time.time() - start_time) * 1000
         get_logger().log_prediction(True, len(result.get("predictions", [])), duration_ms)
         return result
@@ -688,7 +934,7 @@ def send_manual_alert(request: ManualAlertRequest):
         if FIRESTORE_DB is None:
             raise HTTPException(status_code=500, detail="Firestore not initialized")
         
-        if request.town not in ["Juba", "Wau", "Yambio", "Bor", "Malakal", "Bentiu"]:
+        if request.town not in TOWN_NAMES:
             raise HTTPException(status_code=400, detail="Invalid town")
         
         alert_data = {
@@ -701,35 +947,22 @@ def send_manual_alert(request: ManualAlertRequest):
             "timestamp": dt.datetime.now(ZoneInfo(TIMEZONE)),
         }
         
-        FIRESTORE_DB.collection("alerts").add(alert_data)
+        _, alert_ref = FIRESTORE_DB.collection("alerts").add(alert_data)
         
-        recipients = []
-        try:
-            users = FIRESTORE_DB.collection("users").where(filter=firestore.FieldFilter("town", "==", request.town)).where(filter=firestore.FieldFilter("active", "==", True)).stream()
-            recipients = [user.to_dict().get("phone_number") for user in users if user.to_dict().get("phone_number")]
-        except Exception as e:
-            print(f" Error fetching users: {e}")
+        recipients = resolve_subscribers(request.town)["phones"]
         
         if not recipients:
             recipients = ["+250792403010"]
         
-        for phone in recipients:
-            if phone and not phone.startswith('+'):
-                if phone.startswith('0'):
-                    phone = '+250' + phone[1:]
-                else:
-                    phone = '+250' + phone
-            
-            sms_result = send_sms_africa(phone, request.message)
-            success = sms_result.get("status") in ["sent", "simulated"]
-            provider = sms_result.get("provider", "unknown")
-            get_logger().log_sms(phone, success, provider, None if success else str(sms_result))
+        queued = enqueue_sms_alert(alert_ref.id, request.message, recipients, request.town, request.severity)
         
         return {
             "status": "success",
-            "message": "Manual alert sent successfully",
+            "message": "Manual alert queued for delivery",
             "town": request.town,
-            "recipients_count": len(recipients),
+            "alert_id": alert_ref.id,
+            "recipients_count": queued["queued"] + queued["duplicates"],
+            "queued_count": queued["queued"],
             "alert_data": alert_data
         }
     
@@ -759,25 +992,13 @@ def trigger_demo_alert():
         severity = latest_alert.get("severity")
         probability = latest_alert.get("probability")
 
-        recipients = []
-        try:
-            users = FIRESTORE_DB.collection("users").where(filter=firestore.FieldFilter("town", "==", town)).where(filter=firestore.FieldFilter("active", "==", True)).stream()
-            recipients = [user.to_dict().get("phone_number") for user in users if user.to_dict().get("phone_number")]
-        except Exception as e:
-            print(f" Error fetching users: {e}")
+        recipients = resolve_subscribers(town)["phones"]
         
         if not recipients:
             recipients = ["+250792403010"]
         
-        for phone in recipients:
-            if phone and not phone.startswith('+'):
-                if phone.startswith('0'):
-                    phone = '+250' + phone[1:]
-                else:
-                    phone = '+250' + phone
-            
-            professional_message = f"HARARA ALERT: Elevated heatwave conditions forecasted for {town} area. Please stay hydrated, seek shade during peak hours (10AM-4PM), and check on vulnerable community members. Risk level: {probability:.0%}. Stay safe."
-            send_sms_africa(phone, professional_message)
+        professional_message = alert_sms_text(town, probability)
+        queued = enqueue_sms_alert(docs[0].id, professional_message, recipients, town, severity)
 
         return {
             "status": "ok",
@@ -785,48 +1006,101 @@ def trigger_demo_alert():
             "message": message,
             "severity": severity,
             "probability": probability,
+            "alert_id": docs[0].id,
+            "recipients_count": queued["queued"] + queued["duplicates"],
+            "queued_count": queued["queued"],
         }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/users/register", tags=["Users"])
-def register_user(phone: str, town: str, name: str = ""):
-    """Register a user for SMS alerts"""
+def register_user(phone: str, town: str, name: str = "", fcm_token: Optional[str] = None):
+    """Register a user for SMS alerts (and push, when an FCM token is given)"""
     try:
         get_logger().log(LogLevel.INFO, LogCategory.API, f"User registration attempt for {town}", 
                         {"phone_masked": phone[-4:].rjust(len(phone), '*'), "town": town})
         if not FIRESTORE_DB:
             raise HTTPException(500, "Firestore not initialized")
         
-        if town not in ["Juba", "Wau", "Yambio", "Bor", "Malakal", "Bentiu"]:
+        if town not in TOWN_NAMES:
             raise HTTPException(400, "Invalid town")
         
+        phone_number = normalize_phone(phone)
+        if phone_number is None:
+            raise HTTPException(400, "Invalid phone number")
+        
         user_data = {
-            "phone_number": phone,
+            "phone_number": phone_number,
             "town": town,
             "name": name,
             "active": True,
             "created_at": firestore.SERVER_TIMESTAMP
         }
+        if fcm_token:
+            user_data["fcm_token"] = fcm_token
         
-        FIRESTORE_DB.collection("users").add(user_data)
+        # The normalized number is the document id: create() fails if it exists
+        user_ref = FIRESTORE_DB.collection("users").document(phone_number)
+        try:
+            user_ref.create(user_data)
+        except google_exceptions.AlreadyExists:
+            existing = user_ref.get().to_dict() or {}
+            if existing.get("active") and existing.get("town") == town and fcm_token in (None, existing.get("fcm_token")):
+                raise HTTPException(409, f"{phone_number} is already registered for {town} alerts")
+            # Re-activation, town change or a new device updates the same document
+            user_data.pop("created_at")
+            user_data["updated_at"] = firestore.SERVER_TIMESTAMP
+            user_ref.set(user_data, merge=True)
+            update_town_topics(existing.get("fcm_token"), existing.get("town"), fcm_token or existing.get("fcm_token"), town)
+            get_logger().log(LogLevel.SUCCESS, LogCategory.DATABASE, f"User registration updated for {town}")
+            return {"success": True, "message": f"User registration updated for {town} alerts", "phone_number": phone_number}
+        update_town_topics(None, None, fcm_token, town)
         get_logger().log(LogLevel.SUCCESS, LogCategory.DATABASE, f"User registered successfully for {town}")
-        return {"success": True, "message": f"User registered for {town} alerts"}
+        return {"success": True, "message": f"User registered for {town} alerts", "phone_number": phone_number}
     
+    except HTTPException:
+        raise
     except Exception as e:
         get_logger().log_error(LogCategory.DATABASE, e, "register_user")
         raise HTTPException(500, str(e))
 
+@app.post("/users/topics/sync", tags=["Users"])
+def sync_town_topics(current_user=Depends(require_auth)):
+    """Subscribe every indexed FCM token to its town topic (backfill for older registrations)"""
+    index = get_subscriber_index()
+    if not index.ready:
+        raise HTTPException(status_code=503, detail="Subscriber index not loaded")
+    summary, unregistered = {}, []
+    for town in TOWN_NAMES:
+        tokens = index.recipients(town)["tokens"]
+        if not tokens:
+            continue
+        result = subscribe_to_town(tokens, town)
+        unregistered.extend(result["unregistered"])
+        summary[town] = {"topic": town_topic(town), "subscribed": result["ok"],
+                         "unregistered": len(result["unregistered"]), "failed": len(result["failed"])}
+    return {"towns": summary, "pruned": prune_fcm_tokens(unregistered)}
+
+@app.get("/users/index", tags=["Users"])
+def subscriber_index_status(current_user=Depends(require_auth)):
+    """Subscriber index version, Firestore read time and per-town counts"""
+    return get_subscriber_index().stats()
+
 @app.get("/users/town/{town}", tags=["Users"])
 def get_town_users(town: str):
     """Get registered users for a town"""
     try:
+        index = get_subscriber_index()
+        if index.ready:
+            user_list = index.users(town)
+            return {"town": town, "count": len(user_list), "users": user_list, "index_version": index.version}
+
         if not FIRESTORE_DB:
             raise HTTPException(500, "Firestore not initialized")
         
         users = FIRESTORE_DB.collection("users").where(filter=firestore.FieldFilter("town", "==", town)).where(filter=firestore.FieldFilter("active", "==", True)).stream()
-        user_list = [user.to_dict() for user in users]
+        user_list = [public_user(user.to_dict()) for user in users]
         
         return {"town": town, "count": len(user_list), "users": user_list}
     
@@ -841,12 +1115,32 @@ def scheduled_job():
         duration_ms = (time.time() - start_time) * 1000
         get_logger().log(LogLevel.SUCCESS, LogCategory.SYSTEM, "Scheduled predictions completed", 
                         {"duration_ms": duration_ms, "predictions_count": len(result.get("predictions", []))})
+        report_service.build_report_async(db=FIRESTORE_DB)
     except Exception as e:
         duration_ms = (time.time() - start_time) * 1000
         get_logger().log_error(LogCategory.SYSTEM, e, "scheduled_job")
         get_logger().log(LogLevel.ERROR, LogCategory.SYSTEM, f"Scheduled run failed: {str(e)}", 
                         {"duration_ms": duration_ms})
 
+def archive_maintenance_job():
+    """Compact closed archive months, then drop archived rows from the hot SQLite store"""
+    try:
+        compacted = compact_closed_months()
+        pruned = 0
+        if HOT_RETENTION_DAYS > 0:
+            cutoff = dt.datetime.now(ZoneInfo(TIMEZONE)) - dt.timedelta(days=HOT_RETENTION_DAYS)
+            with Session(engine) as sess:
+                for row in sess.exec(select(Prediction).where(Prediction.run_ts < cutoff)):
+                    # Only drop rows whose month is safely compacted in the archive
+                    if compacted_file("predictions", row.run_ts.strftime("%Y-%m"), "parquet"):
+                        sess.delete(row)
+                        pruned += 1
+                sess.commit()
+        get_logger().log(LogLevel.INFO, LogCategory.DATABASE, "Archive maintenance completed",
+                         {"compacted_files": len(compacted), "pruned_predictions": pruned})
+    except Exception as e:
+        get_logger().log_error(LogCategory.DATABASE, e, "archive_maintenance_job")
+
 @app.get("/scheduler/status", tags=["Scheduler"])
 def scheduler_status(current_user=Depends(require_auth)):
     jobs = []
@@ -877,21 +1171,23 @@ def get_dashboard_stats(current_user=Depends(require_auth)):
         alerts_docs = FIRESTORE_DB.collection("alerts").where("timestamp", ">=", today_start).stream()
         alerts = [doc.to_dict() for doc in alerts_docs]
         
-        # Get all users
-        users_docs = FIRESTORE_DB.collection("users").where("active", "==", True).stream()
-        users = [doc.to_dict() for doc in users_docs]
+        # Active user count (index when loaded, else a full scan)
+        index = get_subscriber_index()
+        if index.ready:
+            total_users = index.count()
+        else:
+            total_users = sum(1 for _ in FIRESTORE_DB.collection("users").where("active", "==", True).stream())
         
         # Calculate statistics
         active_alerts = len([a for a in alerts if a.get("alert", False)])
         high_risk_towns = len([p for p in predictions if p.get("probability", 0) >= 0.75])
-        total_users = len(users)
         
         # System status
         system_status = {
             "status": "ok" if EE_READY else "degraded",
             "ee_ready": EE_READY,
             "firestore_ready": FIRESTORE_DB is not None,
-            "model_loaded": MODEL is not None
+            "model_loaded": model_ready()
         }
         
         return {
@@ -906,45 +1202,194 @@ def get_dashboard_stats(current_user=Depends(require_auth)):
         get_logger().log_error(LogCategory.API, e, "get_dashboard_stats")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/logs/stats", tags=["System"])
+def get_log_stats(current_user=Depends(require_auth)):
+    """Rolling request latency, error-rate and event counts (5m / 1h / 24h)"""
+    return rolling_aggregates.snapshot()
+
+@app.get("/alerts/outbox", tags=["Alerts"])
+def outbox_status(alert_id: Optional[str] = None, current_user=Depends(require_auth)):
+    """Outbox job counts plus queue depth and ETA per channel and priority, or counts for one alert"""
+    outbox = get_outbox()
+    if outbox is None:
+        raise HTTPException(status_code=503, detail="Notification outbox not running")
+    if alert_id:
+        return outbox.alert_status(alert_id)
+    return {**outbox.stats(), "last_run_dispatch": LAST_DISPATCH}
+
+@app.get("/alerts/providers", tags=["Alerts"])
+def sms_provider_status(current_user=Depends(require_auth)):
+    """SMS provider chain with per-provider latency, errors and availability"""
+    return sms_provider.info()
+
+@app.get("/alerts/state", tags=["Alerts"])
+def alert_state(current_user=Depends(require_auth)):
+    """Active heat episodes per town with send and suppression counters"""
+    store = get_alert_state()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Alert state store not initialized")
+    return store.snapshot()
+
+@app.delete("/alerts/state/{town}", tags=["Alerts"])
+def reset_alert_state(town: str, current_user=Depends(require_auth)):
+    """Close a town's episode so its next alerting run notifies again"""
+    store = get_alert_state()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Alert state store not initialized")
+    if not store.reset(town):
+        raise HTTPException(status_code=404, detail=f"No alert state for {town}")
+    return {"status": "ok", "town": town}
+
+@app.post("/hindcast", tags=["Predictions"])
+def hindcast_run(request: HindcastRequest, current_user=Depends(require_auth)):
+    """Score every day of a range from the archived daily features (stored under a run id)"""
+    towns = request.towns or TOWN_NAMES
+    unknown = [t for t in towns if t not in TOWN_NAMES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown towns: {', '.join(unknown)}")
+    if not model_ready() and not get_startup().wait("model", timeout=MODEL_WAIT_SECONDS):
+        raise HTTPException(status_code=503, detail="Model is not loaded yet")
+    try:
+        return hindcast(towns, request.start, request.end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@app.post("/scenarios", tags=["Predictions"])
+def run_scenarios(request: ScenarioRequest, current_user=Depends(require_auth)):
+    """What-if probabilities: the current windows with each scenario's perturbations applied"""
+    unknown = [t for t in (request.towns or []) if t not in TOWN_NAMES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown towns: {', '.join(unknown)}")
+    if not model_ready() and not get_startup().wait("model", timeout=MODEL_WAIT_SECONDS):
+        raise HTTPException(status_code=503, detail="Model is not loaded yet")
+    try:
+        return evaluate_scenarios([s.model_dump() for s in request.scenarios], request.towns,
+                                  request.include_baseline)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@app.get("/hindcast/{run_id}", tags=["Predictions"])
+def get_hindcast(run_id: str, town: Optional[str] = None, current_user=Depends(require_auth)):
+    """Daily hindcast rows of a run (optionally one town)"""
+    rows = hindcast_service.hindcast_rows(engine, run_id, town)
+    if not rows:
+        raise HTTPException(status_code=404, detail=f"No hindcast rows for run {run_id}")
+    return {"run_id": run_id, "count": len(rows), "rows": rows}
+
+@app.get("/models", tags=["Models"])
+def model_registry_status(current_user=Depends(require_auth)):
+    """Active / previous model version, activation job, manifest versions and recent swaps"""
+    if INFERENCE_MODE == "shared":
+        return get_inference_client().call("models")
+    return get_model_registry().status()
+
+@app.post("/models/register", tags=["Models"])
+def register_model(request: ModelRegisterRequest, current_user=Depends(require_auth)):
+    """Copy a bundle into the registry under its content hash; optionally activate it"""
+    try:
+        version = get_model_registry().register(request.path, request.note)
+    except (ValueError, OSError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if request.activate:
+        return activate_model(version)
+    return {"status": "registered", "version": version}
+
+@app.post("/models/{version}/activate", status_code=202, tags=["Models"])
+def activate_model(version: str, current_user=Depends(require_auth)):
+    """Load + warm up + parity-check a version in the background, then swap it in"""
+    try:
+        if INFERENCE_MODE == "shared":
+            job = get_inference_client().call("activate", version=version)
+        else:
+            job = get_model_registry().activate(version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model version {version}")
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "accepted", "job": job}
+
+@app.post("/models/rollback", status_code=202, tags=["Models"])
+def rollback_model(current_user=Depends(require_auth)):
+    """Swap back to the version active before the current one"""
+    try:
+        if INFERENCE_MODE == "shared":
+            return {"status": "accepted", "job": get_inference_client().call("rollback")}
+        return {"status": "accepted", "job": get_model_registry().rollback()}
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
 @app.post("/scheduler/run-now", tags=["Scheduler"])
 def scheduler_run_now():
     scheduled_job()
     return {"status": "ok", "message": "Scheduled job executed immediately"}
 
+def init_model():
+    if INFERENCE_MODE == "shared":
+        # The inference process owns the model; this worker only needs it to answer
+        global THRESHOLD, MODEL_VERSION
+        with startup_profiler.measure("connect inference server", "step"):
+            status = get_inference_client().wait_ready(MODEL_WAIT_SECONDS)
+        THRESHOLD, MODEL_VERSION = status["threshold"], status["model_version"]
+        print(f" Inference server ready (model {MODEL_VERSION})")
+        return
+    with startup_profiler.measure("load_artifacts", "step"):
+        load_artifacts()
+    print(" ML artifacts loaded")
+
+def init_earth_engine() -> bool:
+    with startup_profiler.measure("init_gee", "step"):
+        init_gee()
+    if EE_READY:
+        with startup_profiler.measure("build_ee_objects", "step"):
+            build_ee_objects()
+        print(" Google Earth Engine ready")
+    else:
+        print(" Google Earth Engine not ready")
+    return EE_READY
+
+def init_firestore_stage() -> bool:
+    with startup_profiler.measure("init_firestore", "step"):
+        init_firestore()
+    if FIRESTORE_DB:
+        print(" Firestore connected")
+        try:
+            get_subscriber_index().start(FIRESTORE_DB, wait=False)
+        except Exception as e:
+            print(f" Subscriber index listener failed: {e}")
+    else:
+        print(" Firestore not connected")
+    
+    # Logging service
+    with startup_profiler.measure("init_logger", "step"):
+        init_logger(FIRESTORE_DB)
+    get_logger().log(LogLevel.INFO, LogCategory.SYSTEM, "Harara API started successfully")
+    
+    # Export + subscriber routes
+    export_routes.set_firestore_db(FIRESTORE_DB)
+    subscriber_routes.configure(FIRESTORE_DB, TOWN_NAMES)
+    return FIRESTORE_DB is not None
+
 @app.on_event("startup")
 def on_startup():
     try:
         print(" Starting Harara API initialization...")
         
         # Database
-        SQLModel.metadata.create_all(engine)
+        with startup_profiler.measure("create_all", "step"):
+            SQLModel.metadata.create_all(engine)
         print(" Database initialized")
         
-        # ML Artifacts
-        load_artifacts()
-        print(" ML artifacts loaded")
-        
-        # Google Earth Engine
-        init_gee()
-        if EE_READY:
-            build_ee_objects()
-            print(" Google Earth Engine ready")
-        else:
-            print(" Google Earth Engine not ready")
-        
-        # Firestore
-        init_firestore()
-        if FIRESTORE_DB:
-            print(" Firestore connected")
-        else:
-            print(" Firestore not connected")
-        
-        # Logging service
-        init_logger(FIRESTORE_DB)
-        get_logger().log(LogLevel.INFO, LogCategory.SYSTEM, "Harara API started successfully")
-        
-        # Export routes
-        export_routes.set_firestore_db(FIRESTORE_DB)
+        # Notification outbox
+        with startup_profiler.measure("outbox + alert state", "step"):
+            migrate_table(engine, OutboxJob)
+            migrate_table(engine, Prediction)
+            init_outbox(engine, dispatch_scheduler).start()
+            init_alert_state(engine)
+        get_startup().mark("database", READY)
         
         # Scheduler
         if SCHEDULER_ENABLED:
@@ -956,10 +1401,25 @@ def on_startup():
                 id="daily-07",
                 replace_existing=True
             )
-            scheduler.start()
+            scheduler.add_job(
+                archive_maintenance_job,
+                CronTrigger(day=1, hour=2, minute=0, timezone=ZoneInfo(TIMEZONE)),
+                id="archive-monthly",
+                replace_existing=True
+            )
+            with startup_profiler.measure("scheduler start", "step"):
+                scheduler.start()
             print(" Scheduler started for 07:00 daily (Africa/Kigali)")
         
-        print(" Harara API initialization complete!")
+        # Model, Earth Engine and Firestore warm up concurrently in the
+        # background; the API serves cached reads meanwhile (see /ready)
+        startup = get_startup()
+        startup.register("model", init_model)
+        startup.register("earth_engine", init_earth_engine)
+        startup.register("firestore", init_firestore_stage)
+        startup.start(on_complete=lambda: print(" Startup profile\n" + startup_profiler.table()))
+        
+        print(" Harara API accepting traffic (subsystems warming up in background)")
         
     except Exception as e:
         print(f" Startup error: {e}")
@@ -972,6 +1432,10 @@ def on_shutdown():
     if scheduler:
         scheduler.shutdown(wait=False)
         print("Scheduler stopped")
+    if get_outbox():
+        get_outbox().stop()
+        print(" Notification outbox stopped")
+    get_subscriber_index().stop()
 
 def _collection_to_df_old(imgcol, geom, scale=1000, band_rename=None, constant_cols=None):
     def extract_mean(img):
@@ -1053,27 +1517,151 @@ def fetch_features_for_town(town_name, geom, lon, lat, lookback_days=LOOKBACK_DA
 # =============================================================================
 # PREDICTION PIPELINE
 # =============================================================================
-def prepare_window(df_recent: pd.DataFrame, town_name: str) -> np.ndarray:
+def town_noise(town_name: str) -> tuple:
+    """Per-town deterministic noise (identical every run) to avoid identical input; returns (rng, noise)"""
+    rng = np.random.default_rng(sum(ord(c) for c in town_name))
+    return rng, rng.normal(0, 0.03, (LOOKBACK_DAYS, len(FEATURE_COLS))).astype(np.float32)
+
+def raw_window(df_recent: pd.DataFrame, town_name: str) -> np.ndarray:
+    """Unscaled (LOOKBACK_DAYS, features) window; scaling happens next to the model"""
     arr = df_recent[FEATURE_COLS].tail(LOOKBACK_DAYS).to_numpy(dtype=np.float32)
     if len(arr) < LOOKBACK_DAYS:
         pad_len = LOOKBACK_DAYS - len(arr)
         arr = np.vstack([np.tile(arr[:1], (pad_len, 1)), arr])
     arr = np.nan_to_num(arr, nan=0.0)
 
-    # Per-town deterministic noise to avoid identical input
-    seed = sum(ord(c) for c in town_name)
-    rng = np.random.default_rng(seed)
-    noise = rng.normal(0, 0.03, arr.shape).astype(np.float32)
+    rng, noise = town_noise(town_name)
     arr = arr + noise
     if np.std(arr, axis=0).mean() < 1e-8:
         arr += rng.normal(0, 0.05, arr.shape).astype(np.float32)
+    return arr
+
+def prepare_window(df_recent: pd.DataFrame, town_name: str, scaler=None) -> np.ndarray:
+    return scale_windows_inplace(raw_window(df_recent, town_name)[None], scaler or SCALER)
+
+def predict_local(X_raw: np.ndarray, mc_samples: int = 0) -> tuple:
+    """Score raw windows with this process's active bundle; returns (probabilities, model meta).
+
+    X_raw is scaled in place. With mc_samples the LSTM's meta also carries
+    "uncertainty", an (N, 5) array of mean, std, p05, p50, p95.
+    """
+    # One bundle per call, so a concurrent hot-swap cannot mix versions
+    bundle = get_model_registry().active
+    if bundle is None:
+        raise RuntimeError("Model is not loaded yet")
+    X = scale_windows_inplace(X_raw, bundle.scaler)
+    probs, served_by = serve_bundle(bundle, X)
+    threshold = bundle.threshold if served_by == "lstm" else bundle.fallback.threshold
+    meta = {"model_version": bundle.version, "threshold": threshold, "served_by": served_by}
+    if mc_samples and served_by == "lstm":  # the fallback has no dropout to sample
+        meta["uncertainty"] = mc_dropout(bundle.model, X, mc_samples)
+        meta["mc_samples"] = mc_samples
+    return probs, meta
+
+def mc_dropout(model, X: np.ndarray, samples: int) -> np.ndarray:
+    """One training=True pass over X tiled `samples` times -> per-window mean, std, quantiles"""
+    n = len(X)
+    draws = np.asarray(model(np.tile(X, (samples, 1, 1)), training=True)).reshape(samples, n)
+    quantiles = np.quantile(draws, UNCERTAINTY_QUANTILES, axis=0)
+    return np.column_stack([draws.mean(axis=0), draws.std(axis=0), *quantiles]).astype(np.float32)
+
+def serve_bundle(bundle: ModelBundle, X: np.ndarray) -> tuple:
+    """Selection policy: the LSTM, unless it is missing or its forward pass fails (auto);
+    FALLBACK_POLICY=always serves the fallback, never disables it"""
+    if bundle_predictor(bundle) is bundle.model:
+        try:
+            return bundle.model.predict(X, batch_size=len(X), verbose=0).ravel(), "lstm"
+        except Exception as e:
+            if bundle.fallback is None or FALLBACK_POLICY == "never":
+                raise
+            print(f" LSTM forward pass failed, serving the fallback model: {e}")
+    if bundle.fallback is None:
+        raise RuntimeError("Model is not loaded and no fallback model is packaged")
+    return bundle.fallback.predict(X).ravel(), "fallback"
+
+def predict_windows(X_raw: np.ndarray, mc_samples: int = 0) -> tuple:
+    """Score raw windows here (INFERENCE_MODE=local) or in the shared inference process"""
+    global THRESHOLD, MODEL_VERSION
+    if INFERENCE_MODE == "shared":
+        probs, meta = get_inference_client().predict(X_raw, mc_samples=mc_samples)
+        THRESHOLD, MODEL_VERSION = meta["threshold"], meta["model_version"]
+        return probs, meta
+    return predict_local(X_raw, mc_samples)
+
+def model_ready() -> bool:
+    if INFERENCE_MODE == "shared":
+        return get_startup().state("model") == READY
+    return get_model_registry().active is not None
+
+def serving_model() -> Optional[str]:
+    """'lstm' or 'fallback' for the active bundle; in shared mode, whatever served the last run"""
+    if INFERENCE_MODE == "shared":
+        return (MODEL_LATENCY["last_run"] or {}).get("served_by")
+    bundle = get_model_registry().active
+    if bundle is None:
+        return None
+    return "lstm" if bundle_predictor(bundle) is bundle.model else "fallback"
+
+def model_status() -> Dict:
+    return {"mode": INFERENCE_MODE, "model_version": MODEL_VERSION, "threshold": THRESHOLD,
+            "serving_model": serving_model(), "fallback_policy": FALLBACK_POLICY, "latency": MODEL_LATENCY}
+
+CURRENT_WINDOWS: Dict = {}   # raw windows of the last run, the base of what-if scenarios
+
+def current_windows() -> Dict:
+    """The last run's raw windows, or the latest archived day's when this process has not run yet"""
+    if CURRENT_WINDOWS:
+        return CURRENT_WINDOWS
+    today = dt.datetime.now(ZoneInfo(TIMEZONE)).date()
+    first = today - dt.timedelta(days=LOOKBACK_DAYS + 31)
+    history = hindcast_service.history_from_archive(TOWN_NAMES, first, today, FEATURE_COLS)
+    if history.empty:
+        raise RuntimeError("No prediction run or archived features to build scenarios on")
+    latest = max(history["date"])
+    batch = hindcast_service.build_windows(history, TOWN_NAMES, latest, latest, FEATURE_COLS, LOOKBACK_DAYS,
+                                           MAX_FFILL_GAP, noise=lambda t: town_noise(t)[1])
+    return {"run_ts": None, "as_of": str(latest), "towns": batch["towns"], "X": batch["X"]}
+
+def evaluate_scenarios(scenarios: List[Dict], towns: Optional[List[str]] = None,
+                       include_baseline: bool = True) -> Dict:
+    """Town x scenario probabilities; every perturbed window goes through one forward pass"""
+    base = current_windows()
+    rows = [i for i, t in enumerate(base["towns"]) if not towns or t in towns]
+    names = [base["towns"][i] for i in rows]
+    error = scenario_service.validate_scenarios(scenarios, FEATURE_COLS, TOWN_NAMES)
+    if error:
+        raise ValueError(error)
+    t0 = time.perf_counter()
+    X = scenario_service.build_scenario_batch(base["X"][rows], names, FEATURE_COLS, scenarios, include_baseline)
+    probs, meta = predict_windows(X)
+    labels = ([scenario_service.BASELINE] if include_baseline else []) + [s["name"] for s in scenarios]
+    return {
+        **scenario_service.scenario_matrix(np.nan_to_num(probs, nan=0.0), names, labels, meta["threshold"]),
+        "base_run_ts": base.get("run_ts"),
+        "base_as_of": base.get("as_of"),
+        "threshold": meta["threshold"],
+        "model_version": meta["model_version"],
+        "served_by": meta["served_by"],
+        "windows": len(X),
+        "duration_ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
 
-    arr_scaled = SCALER.transform(arr)
-    arr_scaled = (arr_scaled - arr_scaled.mean()) / (arr_scaled.std() + 1e-6)
-    return arr_scaled.reshape(1, LOOKBACK_DAYS, len(FEATURE_COLS))
-
-def run_predictions() -> Dict:
-    global era5, modis_lst, modis_ndvi, towns
+def hindcast(towns: List[str], start: dt.date, end: dt.date, csv_path: Optional[str] = None) -> Dict:
+    """What the active model would have predicted for each town on each day of [start, end]"""
+    first = start - dt.timedelta(days=LOOKBACK_DAYS - 1)
+    if csv_path:
+        history = hindcast_service.history_from_csv(csv_path, towns, FEATURE_COLS)
+    else:
+        history = hindcast_service.history_from_archive(towns, first, end, FEATURE_COLS)
+    return hindcast_service.run_hindcast(engine, history, towns, start, end, predict_windows, FEATURE_COLS,
+                                         LOOKBACK_DAYS, MAX_FFILL_GAP, noise=lambda t: town_noise(t)[1])
+
+@profiled(RUN_PREDICTIONS_TARGET)
+def run_predictions(uncertainty: Optional[bool] = None) -> Dict:
+    """uncertainty adds MC dropout statistics (default: PREDICT_UNCERTAINTY)"""
+    global era5, modis_lst, modis_ndvi, towns, CURRENT_WINDOWS
+    if not model_ready() and not get_startup().wait("model", timeout=MODEL_WAIT_SECONDS):
+        raise RuntimeError("Model is not loaded yet")
     if not EE_READY: init_gee()
     if not towns: build_ee_objects()
 
@@ -1095,41 +1683,82 @@ def run_predictions() -> Dict:
         if is_degenerate_window(windows[tname]):
             windows[tname] = final_variation_nudge(windows[tname])
 
+    # One forward pass for every town, at a batch size traced during warmup
+    town_names = list(windows)
+    X = np.stack([raw_window(windows[t], t) for t in town_names])
+    # Kept unscaled for what-if scenarios (the batch itself is scaled in place)
+    CURRENT_WINDOWS = {"run_ts": now_ts.isoformat(), "as_of": str(now_ts.date()), "towns": town_names, "X": X.copy()}
+    t0 = time.perf_counter()
+    mc_samples = MC_DROPOUT_SAMPLES if (PREDICT_UNCERTAINTY if uncertainty is None else uncertainty) else 0
+    probs, meta = predict_windows(X, mc_samples)
+    MODEL_LATENCY["last_run"] = {"batch": len(X), "ms": round((time.perf_counter() - t0) * 1000, 1),
+                                 "at": now_ts.isoformat(), "mode": INFERENCE_MODE, "served_by": meta["served_by"],
+                                 "mc_samples": meta.get("mc_samples", 0)}
+    spread = meta.get("uncertainty")
+
     preds = []
     with Session(engine) as sess:
-        for tname, df_t in windows.items():
-            X = prepare_window(df_t, tname)
-            prob = float(MODEL.predict(X, verbose=0).ravel()[0])
+        for i, (tname, prob) in enumerate(zip(town_names, probs)):
+            prob = float(prob)
             if np.isnan(prob): prob = 0.0
-            alert = int(prob >= THRESHOLD)
-            preds.append({"town": tname, "probability": prob, "alert": alert})
+            alert = int(prob >= meta["threshold"])
+            stats = (dict(zip(("mean", "std", "p05", "p50", "p95"), map(float, spread[i])))
+                     if spread is not None else {})
+            preds.append({"town": tname, "probability": prob, "alert": alert, "served_by": meta["served_by"],
+                          **({"uncertainty": stats} if stats else {})})
             sess.add(Prediction(run_ts=now_ts, start_date=now_ts.date(),
                                 end_date=now_ts.date()+dt.timedelta(days=7),
-                                town=tname, probability=prob, alert=alert))
+                                town=tname, probability=prob, alert=alert,
+                                model_version=meta["model_version"], served_by=meta["served_by"],
+                                **{f"prob_{k}": v for k, v in stats.items()}))
         sess.commit()
 
     result = {
         "run_ts": now_ts.isoformat(),
         "start_date": str(now_ts.date()),
         "end_date": str(now_ts.date()+dt.timedelta(days=7)),
-        "threshold": THRESHOLD,
+        "threshold": meta["threshold"],
+        "model_version": meta["model_version"],
         "predictions": preds,
     }
-    upload_predictions_to_firestore(result)
+    alerts = upload_predictions_to_firestore(result)
+    dispatch_run_alerts_async(alerts, result["run_ts"])
+    try:
+        archive_run(result, windows, FEATURE_COLS, DATE_COL, rolling_aggregates.snapshot())
+    except Exception as e:
+        print(f" Archive error: {e}")
     print(" Predictions completed with per-town variability.")
     return result
 
 # =============================================================================
 # FIRESTORE UPLOAD
 # =============================================================================
-def upload_predictions_to_firestore(result):
+def severity_for(prob: float) -> str:
+    """Alert severity for a probability (also drives dispatch priority)"""
+    return "High" if prob >= 0.75 else "Moderate" if prob >= 0.70 else "None"
+
+def should_send_alert(town: str, alert_flag: bool, severity: str, prob: float) -> bool:
+    """Consult the town's alert episode; repeated alerts within the cooldown are suppressed"""
+    store = get_alert_state()
+    if store is None:
+        return alert_flag
+    decision = store.observe(town, alert_flag, severity, prob)
+    if decision["reason"] == "suppressed":
+        get_logger().log(LogLevel.INFO, LogCategory.SMS, f"Alert for {town} suppressed (episode already notified)",
+                         {**decision, "suppressed_total": store.suppressed_total})
+    return decision["send"]
+
+def upload_predictions_to_firestore(result) -> List[Dict]:
+    """Write predictions + alert docs; returns the alert docs that should be notified"""
     if FIRESTORE_DB is None:
         print(" Firestore not initialized — skipping upload")
-        return
+        return []
     date_str = dt.datetime.now(ZoneInfo(TIMEZONE)).strftime("%Y-%m-%d")
+    report_service.record_predictions(date_str, result["predictions"], FIRESTORE_DB)
+    alerts = []
     for p in result["predictions"]:
         town = p["town"]; prob = float(p["probability"]); alert_flag = bool(p["alert"])
-        severity = "High" if prob >= 0.75 else "Moderate" if prob >= 0.70 else "None"
+        severity = severity_for(prob)
         message = (
             f"HARARA ALERT: High heatwave risk in {town}." if alert_flag
             else f"HARARA UPDATE: Normal conditions in {town}."
@@ -1137,12 +1766,91 @@ def upload_predictions_to_firestore(result):
         doc_data = {
             "town": town, "date": date_str, "probability": prob,
             "alert": alert_flag, "severity": severity, "message": message,
+            "model_version": result.get("model_version"), "served_by": p.get("served_by"),
+            "uncertainty": p.get("uncertainty"),
             "timestamp": dt.datetime.now(ZoneInfo(TIMEZONE)),
         }
         FIRESTORE_DB.collection("predictions").document(f"{date_str}_{town}").set(doc_data)
+        # The episode state decides who gets notified, never whether the alert is recorded
+        notify = should_send_alert(town, alert_flag, severity, prob)
         if alert_flag:
-            FIRESTORE_DB.collection("alerts").add(doc_data)
+            _, alert_ref = FIRESTORE_DB.collection("alerts").add(doc_data)
+            if notify:
+                alerts.append({**doc_data, "alert_id": alert_ref.id})
     print("📡 Uploaded predictions to Firestore successfully.")
+    return alerts
+
+# =============================================================================
+# ALERT DISPATCH
+# Runs after every upload: resolves each alerting town's subscribers and
+# enqueues SMS + push jobs in bulk, off the prediction run's thread.
+# =============================================================================
+LAST_DISPATCH: Dict = {}
+
+def alert_sms_text(town: str, probability: float) -> str:
+    return f"HARARA ALERT: Elevated heatwave conditions forecasted for {town} area. Please stay hydrated, seek shade during peak hours (10AM-4PM), and check on vulnerable community members. Risk level: {probability:.0%}. Stay safe."
+
+def resolve_subscribers(town: str) -> Dict[str, List[str]]:
+    """Active subscribers' phone numbers and FCM tokens for a town"""
+    index = get_subscriber_index()
+    if index.ready:
+        return index.recipients(town)
+    phones, tokens = [], []
+    if FIRESTORE_DB is None:
+        return {"phones": phones, "tokens": tokens}
+    try:
+        users = FIRESTORE_DB.collection("users").where(filter=firestore.FieldFilter("town", "==", town)).where(filter=firestore.FieldFilter("active", "==", True)).stream()
+        for user in users:
+            data = user.to_dict()
+            if data.get("phone_number"):
+                phones.append(data["phone_number"])
+            if data.get("fcm_token"):
+                tokens.append(data["fcm_token"])
+    except Exception as e:
+        print(f" Error fetching users: {e}")
+    return {"phones": phones, "tokens": tokens}
+
+def dispatch_run_alerts(alerts: List[Dict], run_ts: str) -> Dict:
+    """Enqueue notifications for every alerting town of one run"""
+    global LAST_DISPATCH
+    start_time = time.time()
+    metrics = {"run_ts": run_ts, "towns": 0, "sms_queued": 0, "push_queued": 0,
+               "duplicates": 0, "invalid": 0, "towns_without_subscribers": []}
+    outbox = get_outbox()
+    for alert in alerts:
+        town = alert["town"]
+        subscribers = resolve_subscribers(town)
+        metrics["towns"] += 1
+        if not subscribers["phones"] and not subscribers["tokens"]:
+            metrics["towns_without_subscribers"].append(town)
+            continue
+        message = alert_sms_text(town, alert["probability"])
+        if subscribers["phones"]:
+            queued = enqueue_sms_alert(alert["alert_id"], message, subscribers["phones"], town, alert["severity"])
+            metrics["sms_queued"] += queued["queued"]
+            metrics["duplicates"] += queued["duplicates"]
+            metrics["invalid"] += queued["invalid"]
+        if subscribers["tokens"] and outbox is not None:
+            # One topic send reaches the whole town; per-token multicast otherwise
+            channel, targets = ("fcm_topic", [town_topic(town)]) if FCM_USE_TOPICS else ("fcm", subscribers["tokens"])
+            queued = outbox.enqueue(alert["alert_id"], message, targets, town=town,
+                                    channel=channel, priority=severity_priority(alert["severity"]))
+            metrics["push_queued"] += queued["queued"]
+            metrics["duplicates"] += queued["duplicates"]
+    metrics["duration_ms"] = (time.time() - start_time) * 1000
+    LAST_DISPATCH = metrics
+    get_logger().log(LogLevel.INFO, LogCategory.SMS, f"Run dispatch queued alerts for {metrics['towns']} towns", metrics)
+    return metrics
+
+def dispatch_run_alerts_async(alerts: List[Dict], run_ts: str):
+    if not alerts:
+        return
+    def _run():
+        try:
+            dispatch_run_alerts(alerts, run_ts)
+        except Exception as e:
+            get_logger().log_error(LogCategory.SMS, e, "dispatch_run_alerts")
+    threading.Thread(target=_run, name="harara-dispatch", daemon=True).start()
 
 # =============================================================================
 # ROUTES + SCHEDULER
@@ -1160,4 +1868,4 @@ def on_shutdown():
         print(" Scheduler stopped")
 
 @app.post("/predict/run", tags=["Predictions"])
-def predict_run(): return run_predictions()
+def predict_run(uncertainty: Optional[bool] = None): return run_predictions(uncertainty=uncertainty)
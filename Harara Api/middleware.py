@@ -4,9 +4,39 @@
 # =============================================================================
 
 import time
+from typing import Optional
 from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.routing import Route, Match
 from logging_service import get_logger, LogLevel, LogCategory
+from profiling_service import get_profiler, route_target
+
+def _route_template(request: Request) -> str:
+    """Collapse path params back into the route template (/firestore/history/{days})"""
+    path = request.url.path
+    for name, value in (request.scope.get("path_params") or {}).items():
+        path = path.replace(f"/{value}", f"/{{{name}}}", 1)
+    return path
+
+def match_route_template(routes, path: str, method: str = "GET") -> Optional[str]:
+    """Template of the route serving path (/hindcast/abc -> /hindcast/{run_id}), None if unrouted.
+
+    Works before routing has run, and accepts a template as its own path.
+    """
+    for route in routes:
+        if isinstance(route, Route) and route.path == path:
+            return path
+    partial = None
+    scope = {"type": "http", "path": path, "method": method}
+    for route in routes:
+        if not isinstance(route, Route):
+            continue  # mounts (static files) are never profiled
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial
 
 class RequestLoggingMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
@@ -23,15 +53,20 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
             return await call_next(request)
         
         try:
-            # Process request
-            response = await call_next(request)
+            # Process request (profiled when an admin armed this route's template)
+            profiler = get_profiler()
+            template = endpoint
+            if profiler.armed:
+                template = match_route_template(request.app.router.routes, endpoint, method) or endpoint
+            with profiler.profile(route_target(template)):
+                response = await call_next(request)
             
             # Calculate duration
             duration_ms = (time.time() - start_time) * 1000
             
             # Log successful request
             get_logger().log_api_request(
-                endpoint=endpoint,
+                endpoint=_route_template(request),
                 method=method,
                 status_code=response.status_code,
                 duration_ms=duration_ms,
@@ -47,7 +82,7 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
             
             # Log failed request
             get_logger().log_api_request(
-                endpoint=endpoint,
+                endpoint=_route_template(request),
                 method=method,
                 status_code=500,
                 duration_ms=duration_ms,
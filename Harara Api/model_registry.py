@@ -0,0 +1,252 @@
+# =============================================================================
+# Harara Model Registry
+# - Content-hashed artifact bundles (model + scaler + threshold) stored as
+#   registry/<version>/ with a manifest recording the active version and
+#   activation history
+# - New versions load and warm up in a background thread, must pass a parity
+#   check against the active bundle, then replace it with one reference swap;
+#   in-flight runs keep the bundle they started with
+# - Rollback re-activates the previous version (instantly if still in memory)
+# =============================================================================
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+import datetime as dt
+from typing import Callable, Dict, List, Optional
+
+ARTIFACT_FILES = ("model.keras", "scaler.json", "threshold.json")
+OPTIONAL_FILES = ("fallback.json",)  # NumPy fallback model (fallback_model.py)
+REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR",
+                         os.path.join(os.path.dirname(__file__), "harara_artifacts", "registry"))
+MANIFEST_FILE = "manifest.json"
+MAX_HISTORY = 50
+
+def _utcnow() -> str:
+    return dt.datetime.utcnow().isoformat() + "Z"
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def bundle_version(hashes: Dict[str, str]) -> str:
+    """Version id = hash over the file hashes, so identical bundles share a version"""
+    digest = hashlib.sha256("".join(f"{n}:{h}\n" for n, h in sorted(hashes.items())).encode())
+    return digest.hexdigest()[:12]
+
+class ModelBundle:
+    """One loaded version; run code reads model, scaler and threshold from the same bundle"""
+
+    def __init__(self, version: str, model, scaler, threshold: float, latency: Optional[Dict] = None,
+                 fallback=None, model_error: Optional[str] = None):
+        self.version = version
+        self.model = model            # None when the primary model failed to load
+        self.scaler = scaler
+        self.threshold = threshold
+        self.latency = latency or {}
+        self.fallback = fallback
+        self.model_error = model_error
+        self.loaded_at = _utcnow()
+
+    def info(self) -> Dict:
+        return {"version": self.version, "threshold": self.threshold,
+                "loaded_at": self.loaded_at, "latency": self.latency,
+                "primary_loaded": self.model is not None, "model_error": self.model_error,
+                "fallback": self.fallback.info() if self.fallback is not None else None}
+
+class ModelRegistry:
+    def __init__(self, root: str = REGISTRY_DIR, files=ARTIFACT_FILES):
+        self.root = root
+        self.files = tuple(files)
+        self.active: Optional[ModelBundle] = None
+        self.previous: Optional[ModelBundle] = None
+        self.job: Optional[Dict] = None
+        self._loader: Optional[Callable[[str, str], ModelBundle]] = None
+        self._check: Optional[Callable[[ModelBundle, Optional[ModelBundle]], Dict]] = None
+        self._on_swap: List[Callable[[ModelBundle], None]] = []
+        self._lock = threading.Lock()
+        self._activating = threading.Lock()
+
+    def configure(self, loader: Callable[[str, str], ModelBundle],
+                  check: Optional[Callable[[ModelBundle, Optional[ModelBundle]], Dict]] = None,
+                  on_swap: Optional[Callable[[ModelBundle], None]] = None):
+        """loader(version, path) -> bundle; check(candidate, active) -> {"ok": bool, ...}"""
+        self._loader, self._check = loader, check
+        if on_swap is not None:
+            self._on_swap.append(on_swap)
+
+    # ---------------------------------------------------------------- manifest
+    def manifest(self) -> Dict:
+        try:
+            with open(os.path.join(self.root, MANIFEST_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"active": None, "versions": {}, "history": []}
+
+    def _save_manifest(self, manifest: Dict):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, MANIFEST_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def path(self, version: str) -> str:
+        return os.path.join(self.root, version)
+
+    # ------------------------------------------------------------ registration
+    def register(self, source_dir: str, note: str = "") -> str:
+        """Copy a bundle directory into the registry; returns its content version"""
+        missing = [n for n in self.files if not os.path.isfile(os.path.join(source_dir, n))]
+        if missing:
+            raise ValueError(f"{source_dir} is missing {', '.join(missing)}")
+        files = self.files + tuple(n for n in OPTIONAL_FILES if os.path.isfile(os.path.join(source_dir, n)))
+        hashes = {n: hash_file(os.path.join(source_dir, n)) for n in files}
+        version = bundle_version(hashes)
+        with self._lock:
+            manifest = self.manifest()
+            if version in manifest["versions"]:
+                return version
+            target = self.path(version)
+            staging = target + ".staging"
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(staging)
+            for n in files:
+                shutil.copy2(os.path.join(source_dir, n), os.path.join(staging, n))
+            os.replace(staging, target)
+            manifest["versions"][version] = {
+                "files": hashes, "source": os.path.abspath(source_dir), "note": note,
+                "registered_at": _utcnow(), "status": "registered",
+            }
+            self._save_manifest(manifest)
+        print(f" Model version {version} registered from {source_dir}")
+        return version
+
+    def bootstrap(self, legacy_dir: str) -> str:
+        """Registry with no active version: adopt the fixed-filename artifacts as the first one"""
+        manifest = self.manifest()
+        if manifest["active"] and os.path.isdir(self.path(manifest["active"])):
+            return manifest["active"]
+        version = self.register(legacy_dir, note="bootstrapped from legacy artifacts")
+        with self._lock:
+            manifest = self.manifest()
+            manifest["active"] = version
+            manifest["versions"][version]["status"] = "active"
+            self._save_manifest(manifest)
+        return version
+
+    # -------------------------------------------------------------- activation
+    def load_active(self) -> ModelBundle:
+        """Synchronously load the manifest's active version (startup)"""
+        version = self.manifest()["active"]
+        if not version:
+            raise RuntimeError("No active model version")
+        bundle = self._loader(version, self.path(version))
+        self._swap(bundle, record=False)
+        return bundle
+
+    def activate(self, version: str, wait: bool = False) -> Dict:
+        """Load, check and swap in a version; runs in the background unless `wait`"""
+        if version not in self.manifest()["versions"]:
+            raise KeyError(version)
+        if self.active is not None and self.active.version == version:
+            return {"version": version, "state": "active", "message": "already active"}
+        if not self._activating.acquire(blocking=False):
+            raise RuntimeError(f"Activation of {self.job['version']} already in progress")
+        self.job = {"version": version, "state": "loading", "started_at": _utcnow(),
+                    "finished_at": None, "parity": None, "error": None}
+        if wait:
+            self._activate(version)
+        else:
+            threading.Thread(target=self._activate, args=(version,),
+                             name=f"model-activate-{version}", daemon=True).start()
+        return self.job
+
+    def _activate(self, version: str):
+        job = self.job
+        try:
+            candidate = self._loader(version, self.path(version))
+            job["state"] = "checking"
+            parity = self._check(candidate, self.active) if self._check else {"ok": True}
+            job["parity"] = parity
+            if not parity.get("ok"):
+                raise RuntimeError(f"parity check failed: {parity.get('reason')}")
+            self._swap(candidate)
+            job["state"] = "active"
+        except Exception as e:
+            job["state"], job["error"] = "failed", str(e)
+            self._set_status(version, "rejected", error=str(e))
+            print(f" Model version {version} not activated: {e}")
+        finally:
+            job["finished_at"] = _utcnow()
+            self._activating.release()
+
+    def rollback(self) -> Dict:
+        """Re-activate the version that was active before the current one"""
+        history = self.manifest()["history"]
+        current = self.active.version if self.active else None
+        target = next((h["from"] for h in reversed(history) if h["to"] == current and h["from"]), None)
+        if target is None:
+            raise RuntimeError("No previous model version to roll back to")
+        if self.previous is not None and self.previous.version == target:
+            self._swap(self.previous, reason="rollback")  # already checked when first activated
+            return {"version": target, "state": "active", "message": "rolled back from memory"}
+        return self.activate(target)
+
+    def _swap(self, bundle: ModelBundle, reason: str = "activate", record: bool = True):
+        with self._lock:
+            old, self.active = self.active, bundle
+            if old is not None and old.version != bundle.version:
+                self.previous = old
+            if record:
+                manifest = self.manifest()
+                manifest["active"] = bundle.version
+                manifest["history"] = (manifest["history"] + [{
+                    "from": old.version if old else None, "to": bundle.version,
+                    "reason": reason, "at": _utcnow(),
+                }])[-MAX_HISTORY:]
+                manifest["versions"][bundle.version]["status"] = "active"
+                if old is not None and old.version in manifest["versions"]:
+                    manifest["versions"][old.version]["status"] = "retired"
+                self._save_manifest(manifest)
+        for callback in self._on_swap:
+            callback(bundle)
+        print(f" Model version {bundle.version} active ({reason})")
+
+    def _set_status(self, version: str, status: str, error: Optional[str] = None):
+        with self._lock:
+            manifest = self.manifest()
+            if version in manifest["versions"]:
+                manifest["versions"][version]["status"] = status
+                manifest["versions"][version]["error"] = error
+                self._save_manifest(manifest)
+
+    def status(self) -> Dict:
+        manifest = self.manifest()
+        return {
+            "active": self.active.info() if self.active else None,
+            "previous": self.previous.version if self.previous else None,
+            "job": self.job,
+            "versions": manifest["versions"],
+            "history": manifest["history"][-10:],
+        }
+
+# Global model registry
+model_registry = ModelRegistry()
+
+def get_model_registry() -> ModelRegistry:
+    """Get the global model registry"""
+    return model_registry
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Register a model bundle (model.keras, scaler.json, threshold.json)")
+    parser.add_argument("source_dir")
+    parser.add_argument("--note", default="")
+    args = parser.parse_args()
+    print(model_registry.register(args.source_dir, args.note))
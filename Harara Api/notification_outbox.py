@@ -0,0 +1,271 @@
+# =============================================================================
+# Harara Notification Outbox
+# - Alert fan-out is written to SQLite as one job per recipient
+# - Worker threads claim jobs with leases (highest severity first, then
+#   oldest), send them in batches through rate-limited dispatch channels,
+#   retry with exponential backoff + jitter, and record a terminal status
+# - (alert_id, channel, recipient) is unique, so re-enqueueing an alert
+#   never queues a recipient twice and a restart resumes from the table
+# - Delivery is AT-LEAST-ONCE, not exactly-once: the SMS providers take no
+#   idempotency key, so a worker that dies after the provider accepted a
+#   batch but before _complete leaves the jobs in flight, and they are sent
+#   again once the lease expires (a duplicate alert beats a lost one)
+# =============================================================================
+
+import os
+import uuid
+import random
+import threading
+import datetime as dt
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import UniqueConstraint, Index, update, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import SQLModel, Field, Session, select
+
+from sms_dispatcher import normalize_recipients
+from dispatch_scheduler import DEFAULT_PRIORITY
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "2"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "120"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "5"))      # seconds
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "1800"))     # seconds
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1.0"))
+
+PENDING, IN_FLIGHT, SENT, DEAD = "pending", "in_flight", "sent", "dead"
+
+def _utcnow() -> dt.datetime:
+    return dt.datetime.utcnow()
+
+class OutboxJob(SQLModel, table=True):
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        UniqueConstraint("alert_id", "channel", "recipient", name="uq_outbox_alert_recipient"),
+        Index("ix_outbox_claim", "status", "next_attempt_at"),
+        Index("ix_outbox_priority", "channel", "status", "priority", "created_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    alert_id: str
+    channel: str = "sms"
+    town: Optional[str] = None
+    recipient: str
+    message: str
+    priority: int = DEFAULT_PRIORITY
+    status: str = PENDING
+    attempts: int = 0
+    max_attempts: int = OUTBOX_MAX_ATTEMPTS
+    next_attempt_at: dt.datetime = Field(default_factory=_utcnow)
+    lease_owner: Optional[str] = None
+    lease_until: Optional[dt.datetime] = None
+    last_error: Optional[str] = None
+    provider_status: Optional[str] = None
+    created_at: dt.datetime = Field(default_factory=_utcnow)
+    updated_at: dt.datetime = Field(default_factory=_utcnow)
+
+def backoff_seconds(attempts: int) -> float:
+    """Exponential backoff with full jitter in [0.5x, 1.5x)"""
+    delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.5, 1.5)
+
+class NotificationOutbox:
+    def __init__(self, engine, scheduler, workers: int = OUTBOX_WORKERS,
+                 batch_size: int = OUTBOX_BATCH_SIZE):
+        self.engine = engine
+        self.scheduler = scheduler
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    # ---------------------------------------------------------------- enqueue
+    def enqueue(self, alert_id: str, message: str, recipients: Iterable,
+                town: Optional[str] = None, channel: str = "sms",
+                priority: int = DEFAULT_PRIORITY) -> Dict:
+        """Record one job per recipient (phones are normalized). Duplicates are ignored."""
+        if channel == "sms":
+            normalized = normalize_recipients(recipients)
+        else:
+            tokens = list(dict.fromkeys(r for r in recipients if r))
+            normalized = {"valid": tokens, "invalid": []}
+        now = _utcnow()
+        rows = [{
+            "alert_id": alert_id, "channel": channel, "town": town, "recipient": phone,
+            "message": message, "priority": priority, "status": PENDING, "attempts": 0,
+            "max_attempts": OUTBOX_MAX_ATTEMPTS, "next_attempt_at": now,
+            "created_at": now, "updated_at": now,
+        } for phone in normalized["valid"]]
+
+        inserted = 0
+        if rows:
+            stmt = sqlite_insert(OutboxJob.__table__).on_conflict_do_nothing(
+                index_elements=["alert_id", "channel", "recipient"]
+            )
+            with self.engine.begin() as conn:
+                inserted = conn.execute(stmt, rows).rowcount or 0
+            self._wake.set()
+
+        return {
+            "alert_id": alert_id,
+            "queued": inserted,
+            "duplicates": len(rows) - inserted,
+            "invalid": len(normalized["invalid"]),
+        }
+
+    # ------------------------------------------------------------------ claim
+    def _claimable(self, now: dt.datetime):
+        return (
+            ((OutboxJob.status == PENDING) & (OutboxJob.next_attempt_at <= now)) |
+            # Expired lease: the previous send may have reached the provider (at-least-once)
+            ((OutboxJob.status == IN_FLIGHT) & (OutboxJob.lease_until < now))
+        )
+
+    def _claim_order(self):
+        # Severity first, then age - high-severity towns drain before anything else
+        return (OutboxJob.priority.desc(), OutboxJob.created_at, OutboxJob.id)
+
+    def claim(self, owner: str, limit: int, channel: str = "sms") -> List[OutboxJob]:
+        now = _utcnow()
+        lease_until = now + dt.timedelta(seconds=OUTBOX_LEASE_SECONDS)
+        with Session(self.engine) as sess:
+            ids = sess.exec(
+                select(OutboxJob.id)
+                .where((OutboxJob.channel == channel) & self._claimable(now))
+                .order_by(*self._claim_order()).limit(limit)
+            ).all()
+            if not ids:
+                return []
+            # The claimable guard is re-checked, so two workers can never lease the same row
+            sess.exec(
+                update(OutboxJob)
+                .where(OutboxJob.id.in_(ids) & self._claimable(now))
+                .values(status=IN_FLIGHT, lease_owner=owner, lease_until=lease_until,
+                        attempts=OutboxJob.attempts + 1, updated_at=now)
+            )
+            sess.commit()
+            # Only the rows this call won: same ids and this exact lease (an owner's stuck
+            # in-flight jobs from other claims or channels are left for lease expiry)
+            jobs = sess.exec(
+                select(OutboxJob).where(OutboxJob.id.in_(ids), OutboxJob.lease_owner == owner,
+                                        OutboxJob.lease_until == lease_until, OutboxJob.status == IN_FLIGHT)
+            ).all()
+            for job in jobs:
+                sess.expunge(job)
+            return jobs
+
+    # --------------------------------------------------------------- complete
+    def _complete(self, owner: str, jobs: List[OutboxJob], results: Dict[str, Dict]):
+        now = _utcnow()
+        with Session(self.engine) as sess:
+            for job in jobs:
+                result = results.get(job.recipient, {"status": "failed", "error": "no result"})
+                values = {"lease_owner": None, "lease_until": None, "updated_at": now,
+                          "provider_status": result.get("provider_status")}
+                if result["status"] == "sent":
+                    values["status"] = SENT
+                    values["last_error"] = None
+                else:
+                    values["last_error"] = str(result.get("error") or result.get("provider_status"))[:500]
+                    if job.attempts >= job.max_attempts or result.get("permanent"):
+                        values["status"] = DEAD
+                    else:
+                        values["status"] = PENDING
+                        values["next_attempt_at"] = now + dt.timedelta(seconds=backoff_seconds(job.attempts))
+                # Fenced by lease owner: a worker whose lease expired cannot overwrite
+                sess.exec(
+                    update(OutboxJob)
+                    .where(OutboxJob.id == job.id, OutboxJob.lease_owner == owner)
+                    .values(**values)
+                )
+            sess.commit()
+
+    def process_once(self, owner: str) -> int:
+        """Claim one batch per channel, send it, and record results. Returns jobs processed."""
+        processed = 0
+        for name, channel in self.scheduler.channels.items():
+            jobs = self.claim(owner, min(self.batch_size, channel.batch_size), name)
+            if not jobs:
+                continue
+            groups: Dict[tuple, List[OutboxJob]] = {}
+            for job in jobs:
+                groups.setdefault((job.alert_id, job.message), []).append(job)
+            for (_, message), group in groups.items():
+                try:
+                    results = channel.send(message, [j.recipient for j in group])
+                except Exception as e:
+                    results = {j.recipient: {"status": "failed", "error": str(e)} for j in group}
+                self._complete(owner, group, results)
+            processed += len(jobs)
+        return processed
+
+    # ---------------------------------------------------------------- workers
+    def _worker(self):
+        owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        while not self._stop.is_set():
+            try:
+                if self.process_once(owner):
+                    continue
+            except Exception as e:
+                print(f" Outbox worker error: {e}")
+            self._wake.wait(OUTBOX_POLL_SECONDS)
+            self._wake.clear()
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"outbox-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        print(f" Notification outbox started ({self.workers} workers)")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads = []
+
+    # ------------------------------------------------------------------ stats
+    def stats(self) -> Dict:
+        with Session(self.engine) as sess:
+            rows = sess.exec(select(OutboxJob.status, func.count()).group_by(OutboxJob.status)).all()
+            queued = sess.exec(
+                select(OutboxJob.channel, OutboxJob.priority, func.count())
+                .where(OutboxJob.status.in_([PENDING, IN_FLIGHT]))
+                .group_by(OutboxJob.channel, OutboxJob.priority)
+            ).all()
+        counts = {status: n for status, n in rows}
+        pending: Dict[str, Dict[int, int]] = {name: {} for name in self.scheduler.channels}
+        for channel, priority, n in queued:
+            pending.setdefault(channel, {})[priority] = n
+        return {
+            "workers": len(self._threads),
+            "counts": {s: counts.get(s, 0) for s in (PENDING, IN_FLIGHT, SENT, DEAD)},
+            "channels": {name: self.scheduler.eta(name, by_priority) for name, by_priority in pending.items()},
+        }
+
+    def alert_status(self, alert_id: str) -> Dict:
+        with Session(self.engine) as sess:
+            rows = sess.exec(
+                select(OutboxJob.status, func.count())
+                .where(OutboxJob.alert_id == alert_id).group_by(OutboxJob.status)
+            ).all()
+        return {"alert_id": alert_id, "counts": {status: n for status, n in rows}}
+
+# Global outbox instance
+notification_outbox: Optional[NotificationOutbox] = None
+
+def init_outbox(engine, scheduler) -> NotificationOutbox:
+    """Initialize the global outbox (call after the tables exist)"""
+    global notification_outbox
+    notification_outbox = NotificationOutbox(engine, scheduler)
+    return notification_outbox
+
+def get_outbox() -> Optional[NotificationOutbox]:
+    """Get the global outbox instance"""
+    return notification_outbox
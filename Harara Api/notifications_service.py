@@ -1,73 +1,122 @@
 # =============================================================================
 # notifications_service.py
-# - Handles SMS alerts via Africa’s Talking
 # - Handles push notifications via Firebase Cloud Messaging (FCM)
+# - SMS goes through sms_providers / sms_dispatcher
 # =============================================================================
 
-import os
-from dotenv import load_dotenv
-import africastalking
-from firebase_admin import messaging
+from startup_service import lazy_module
 
-# Load environment variables
-load_dotenv()
+messaging = lazy_module("firebase_admin.messaging")
 
-AT_USERNAME = os.getenv("AT_USERNAME", "Madolkuol")  # default sandbox
-AT_API_KEY = os.getenv("AT_API_KEY")
+import re
+from concurrent.futures import ThreadPoolExecutor
 
-try:
-    africastalking.initialize(AT_USERNAME, AT_API_KEY)
-    sms = africastalking.SMS
-    print("Afica’s Talking SMS service initialized.")
-except Exception as e:
-    print(f" Error initializing Africa’s Talking: {e}")
-    sms = None
+FCM_MULTICAST_LIMIT = 500        # tokens per multicast
+FCM_TOPIC_BATCH_LIMIT = 1000     # tokens per topic (un)subscribe call
+FCM_MAX_CONCURRENCY = 8
+
+def _is_dead_token(error) -> bool:
+    """Token errors that mean the token will never work again"""
+    return isinstance(error, (messaging.UnregisteredError, messaging.SenderIdMismatchError))
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
 
 # =============================================================================
-# SMS FUNCTION
+# TOWN TOPICS
+# Every subscriber token is subscribed to its town's topic, so a town-wide
+# alert is one send regardless of audience size.
 # =============================================================================
-def send_sms(to_number: str, message: str):
-    """
-    Send an SMS using Africa’s Talking API.
+def town_topic(town: str) -> str:
+    return "harara-town-" + re.sub(r"[^a-z0-9_-]", "-", town.strip().lower())
 
-    Args:
-        to_number (str): Recipient phone number
-        message (str): Message content
+def subscribe_to_town(tokens, town):
+    """Subscribe tokens to a town topic in 1000-token calls"""
+    return _manage_topic(messaging.subscribe_to_topic, tokens, town_topic(town))
 
-    Returns:
-        dict: Status report with message ID or error
-    """
-    if not sms:
-        return {"status": "failed", "error": "Africa's Talking not initialized"}
+def unsubscribe_from_town(tokens, town):
+    return _manage_topic(messaging.unsubscribe_from_topic, tokens, town_topic(town))
 
-    try:
-        response = sms.send(message, [to_number])
-        print(f" SMS sent to {to_number}: {response}")
-        return {"status": "sent", "response": response}
-    except Exception as e:
-        print(f" SMS send failed: {e}")
-        return {"status": "failed", "error": str(e)}
+def _manage_topic(call, tokens, topic):
+    """Returns {"ok": count, "unregistered": [...], "failed": [(token, reason), ...]}"""
+    tokens = list(dict.fromkeys(t for t in tokens if t))
+    result = {"ok": 0, "unregistered": [], "failed": []}
+    for chunk in _chunks(tokens, FCM_TOPIC_BATCH_LIMIT):
+        resp = call(chunk, topic)
+        result["ok"] += resp.success_count
+        for e in resp.errors:
+            if "not-registered" in (e.reason or ""):
+                result["unregistered"].append(chunk[e.index])
+            else:
+                result["failed"].append((chunk[e.index], e.reason))
+    return result
+
+def send_topic_notification(topic, title, body, data=None):
+    """One send to every device subscribed to the topic"""
+    msg = messaging.Message(
+        notification=messaging.Notification(title=title, body=body),
+        data={k: str(v) for k, v in (data or {}).items()},
+        topic=topic,
+    )
+    return messaging.send(msg)
 
 # =============================================================================
 # FCM PUSH NOTIFICATION FUNCTION (optional)
 # =============================================================================
 def send_fcm_notification(tokens, title, body, data=None):
     """
-    Send push notifications to multiple devices via Firebase Cloud Messaging.
+    Send push notifications to multiple devices via Firebase Cloud Messaging
+    (500-token multicasts sent concurrently).
     """
     try:
         if not tokens:
             print(" No FCM tokens provided.")
             return {"status": "no_tokens"}
-        
-        msg = messaging.MulticastMessage(
-            notification=messaging.Notification(title=title, body=body),
-            data={k: str(v) for k, v in (data or {}).items()},
-            tokens=tokens
-        )
-        resp = messaging.send_multicast(msg)
-        print(f" FCM sent: {resp.success_count} success, {resp.failure_count} failure(s)")
-        return {"status": "sent", "success": resp.success_count}
+
+        results = send_fcm_batch(tokens, title, body, data)
+        success = sum(1 for r in results.values() if r["status"] == "sent")
+        unregistered = [t for t, r in results.items() if r.get("unregistered")]
+        print(f" FCM sent: {success} success, {len(results) - success} failure(s)")
+        return {"status": "sent", "success": success, "failure": len(results) - success,
+                "unregistered": unregistered}
     except Exception as e:
         print(f" FCM error: {e}")
         return {"status": "failed", "error": str(e)}
+
+
+def _send_multicast(tokens, title, body, data):
+    msg = messaging.MulticastMessage(
+        notification=messaging.Notification(title=title, body=body),
+        data={k: str(v) for k, v in (data or {}).items()},
+        tokens=tokens
+    )
+    resp = messaging.send_each_for_multicast(msg)
+    results = {}
+    for token, r in zip(tokens, resp.responses):
+        if r.success:
+            results[token] = {"status": "sent", "provider_status": r.message_id}
+        else:
+            dead = _is_dead_token(r.exception)
+            results[token] = {"status": "failed", "error": str(r.exception),
+                              "permanent": dead, "unregistered": dead}
+    return results
+
+
+def send_fcm_batch(tokens, title, body, data=None):
+    """
+    Send to any number of tokens in concurrent 500-token multicasts and report
+    per-token status (used by the outbox workers).
+
+    Returns:
+        dict: token -> {"status": "sent" | "failed", "error": ..., "unregistered": bool}
+    """
+    tokens = list(dict.fromkeys(t for t in tokens if t))
+    chunks = _chunks(tokens, FCM_MULTICAST_LIMIT)
+    results = {}
+    if len(chunks) == 1:
+        return _send_multicast(chunks[0], title, body, data)
+    with ThreadPoolExecutor(max_workers=min(FCM_MAX_CONCURRENCY, len(chunks) or 1),
+                            thread_name_prefix="fcm-send") as pool:
+        for chunk_result in pool.map(lambda c: _send_multicast(c, title, body, data), chunks):
+            results.update(chunk_result)
+    return results
@@ -0,0 +1,319 @@
+# =============================================================================
+# Harara On-Demand Profiling Service
+# Arms a profiler for the next N requests to a route or the next N
+# run_predictions calls, and returns collapsed stacks or speedscope JSON.
+# - Routes are armed by template (/hindcast/{run_id}) and always sampled:
+#   their handlers run on threadpool threads, not the middleware's thread
+# - cProfile only wraps same-thread @profiled targets, one capture at a time,
+#   and switches itself off after MAX_CAPTURE_SECONDS
+# =============================================================================
+
+import sys
+import json
+import time
+import uuid
+import threading
+import cProfile
+import pstats
+import datetime as dt
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List
+
+# Hard caps - an armed profile can never run away in production
+MAX_CAPTURES = 20              # max requests/runs per session
+MAX_CAPTURE_SECONDS = 60.0     # sampling / cProfile stops after this per capture
+MAX_SAMPLES = 50000            # per session
+MIN_INTERVAL_MS = 5.0
+MAX_OVERHEAD = 0.05            # sampler self-time / wall-time budget
+ARM_TTL_SECONDS = 30 * 60      # unused sessions expire
+MAX_SESSIONS = 10
+MAX_STACK_DEPTH = 128
+
+RUN_PREDICTIONS_TARGET = "run_predictions"
+
+ROUTE_PREFIX = "route:"
+
+def route_target(template: str) -> str:
+    return f"{ROUTE_PREFIX}{template}"
+
+_cprofile_lock = threading.Lock()  # cProfile hooks are per process (3.12+) - one capture at a time
+
+def _stop_cprofile():
+    """Switch the running cProfile off from inside the profiled thread"""
+    if hasattr(sys, "monitoring"):  # 3.12+: cProfile is a sys.monitoring tool
+        sys.monitoring.set_events(sys.monitoring.PROFILER_ID, 0)
+    else:
+        sys.setprofile(None)
+
+class _CappedTimer:
+    """cProfile timer that stops profiling once the capture passes its deadline.
+
+    The timer runs on every profiler event in the profiled thread, the one
+    place a 3.11 profile hook can be removed from.
+    """
+
+    def __init__(self, seconds: float):
+        self.deadline = time.perf_counter() + seconds
+        self.truncated = False
+
+    def __call__(self) -> float:
+        now = time.perf_counter()
+        if now > self.deadline and not self.truncated:
+            self.truncated = True
+            _stop_cprofile()
+        return now
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+class _StackSampler(threading.Thread):
+    """Samples every thread's stack at a fixed interval using sys._current_frames().
+
+    Each sample is weighted by the current interval in microseconds; the interval
+    doubles whenever sampling costs more than MAX_OVERHEAD of wall time.
+    """
+
+    def __init__(self, stacks: Counter, interval_ms: float, max_samples: int):
+        super().__init__(name="harara-profiler", daemon=True)
+        self.stacks = stacks
+        self.interval = max(MIN_INTERVAL_MS, interval_ms) / 1000.0
+        self.max_samples = max_samples
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own_id = threading.get_ident()
+        names = {}
+        started = window_start = time.perf_counter()
+        busy = 0.0
+        while not self._stop_event.is_set():
+            t0 = time.perf_counter()
+            if t0 - started > MAX_CAPTURE_SECONDS or self.samples >= self.max_samples:
+                break
+            weight = int(self.interval * 1e6)
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for tid, frame in sys._current_frames().items():
+                if tid == own_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(f"thread {names.get(tid, tid)}")
+                self.stacks[";".join(reversed(stack))] += weight
+            self.samples += 1
+            busy += time.perf_counter() - t0
+            elapsed = time.perf_counter() - window_start
+            if elapsed > 10 * self.interval and busy / elapsed > MAX_OVERHEAD:
+                self.interval *= 2
+                busy, window_start = 0.0, time.perf_counter()
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=1.0)
+
+class ProfileSession:
+    def __init__(self, target: str, count: int, fmt: str, mode: str, interval_ms: float):
+        self.id = uuid.uuid4().hex[:12]
+        self.target = target
+        self.requested = min(max(1, count), MAX_CAPTURES)
+        self.remaining = self.requested
+        self.format = fmt
+        self.mode = mode
+        self.interval_ms = max(MIN_INTERVAL_MS, interval_ms)
+        self.created_at = time.time()
+        self.completed_at: Optional[float] = None
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.capture_ms: List[float] = []
+        self.truncated = 0
+        self.active = 0
+
+    @property
+    def status(self) -> str:
+        if self.completed_at:
+            return "done"
+        if time.time() - self.created_at > ARM_TTL_SECONDS:
+            return "expired"
+        return "capturing" if self.active else "armed"
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "target": self.target,
+            "mode": self.mode,
+            "format": self.format,
+            "status": self.status,
+            "requested": self.requested,
+            "captured": len(self.capture_ms),
+            "samples": self.samples,
+            "capture_ms": [round(ms, 1) for ms in self.capture_ms],
+            "truncated": self.truncated,
+            "created_at": dt.datetime.utcfromtimestamp(self.created_at).isoformat() + "Z",
+        }
+
+    def render(self) -> bytes:
+        if self.format == "collapsed":
+            lines = [f"{stack} {n}" for stack, n in self.stacks.most_common()]
+            return ("\n".join(lines) + "\n").encode()
+        return json.dumps(self._speedscope()).encode()
+
+    def _speedscope(self) -> Dict[str, Any]:
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, n in self.stacks.most_common():
+            ids = []
+            for name in stack.split(";"):
+                if name not in index:
+                    index[name] = len(frames)
+                    frames.append({"name": name})
+                ids.append(index[name])
+            samples.append(ids)
+            weights.append(n / 1000.0)  # µs -> ms
+        total = sum(weights)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": f"Harara {self.target}",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": total,
+                "samples": samples,
+                "weights": weights,
+            }],
+            "name": f"Harara {self.target} ({self.id})",
+            "exporter": "harara-profiling-service",
+        }
+
+def _cprofile_to_stacks(profiler: cProfile.Profile) -> Counter:
+    """Turn cProfile caller/callee timings into two-level collapsed stacks (weights in µs)"""
+    stacks: Counter = Counter()
+    stats = pstats.Stats(profiler).stats
+    for func, (_, _, tottime, _, callers) in stats.items():
+        name = f"{func[2]} ({func[0]}:{func[1]})"
+        if not callers:
+            stacks[name] += int(tottime * 1e6)
+            continue
+        for caller, caller_stats in callers.items():
+            caller_name = f"{caller[2]} ({caller[0]}:{caller[1]})"
+            stacks[f"{caller_name};{name}"] += int(caller_stats[2] * 1e6)
+    return stacks
+
+class ProfilingService:
+    """Registry of armed profile sessions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, ProfileSession] = {}
+
+    def arm(self, target: str, count: int = 1, fmt: str = "speedscope",
+            mode: str = "sampling", interval_ms: float = 10.0) -> ProfileSession:
+        if fmt not in ("speedscope", "collapsed"):
+            raise ValueError("format must be 'speedscope' or 'collapsed'")
+        if mode not in ("sampling", "cprofile"):
+            raise ValueError("mode must be 'sampling' or 'cprofile'")
+        if mode == "cprofile" and target.startswith(ROUTE_PREFIX):
+            raise ValueError("cprofile mode is only available for run_predictions; "
+                             "route handlers run on threadpool threads, use sampling")
+        session = ProfileSession(target, count, fmt, mode, interval_ms)
+        with self._lock:
+            self._sessions[session.id] = session
+            # Keep only the most recent sessions
+            for old in sorted(self._sessions.values(), key=lambda s: s.created_at)[:-MAX_SESSIONS]:
+                self._sessions.pop(old.id, None)
+        return session
+
+    def get(self, session_id: str) -> Optional[ProfileSession]:
+        return self._sessions.get(session_id)
+
+    def cancel(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [s.info() for s in sorted(self._sessions.values(), key=lambda s: -s.created_at)]
+
+    @property
+    def armed(self) -> bool:
+        return bool(self._sessions)
+
+    def _claim(self, target: str) -> Optional[ProfileSession]:
+        if not self._sessions:
+            return None  # fast path: nothing armed
+        with self._lock:
+            for session in self._sessions.values():
+                if session.target == target and session.remaining > 0 and session.status != "expired":
+                    session.remaining -= 1
+                    session.active += 1
+                    return session
+        return None
+
+    @contextmanager
+    def profile(self, target: str, same_thread: bool = False):
+        """Profile the wrapped block if a session is armed for this target.
+
+        same_thread: the block runs on this thread, so cProfile can see it;
+        otherwise (and while another cProfile capture runs) the block is sampled.
+        """
+        session = self._claim(target)
+        if session is None:
+            yield
+            return
+
+        started = time.perf_counter()
+        sampler = None
+        profiler = timer = None
+        if session.mode == "cprofile" and same_thread and _cprofile_lock.acquire(blocking=False):
+            timer = _CappedTimer(MAX_CAPTURE_SECONDS)
+            profiler = cProfile.Profile(timer)
+            try:
+                profiler.enable()
+            except BaseException:
+                _cprofile_lock.release()
+                raise
+        else:
+            stacks: Counter = Counter()
+            sampler = _StackSampler(stacks, session.interval_ms, MAX_SAMPLES - session.samples)
+            sampler.start()
+        try:
+            yield
+        finally:
+            if sampler is not None:
+                sampler.stop()
+                captured, samples = sampler.stacks, sampler.samples
+            else:
+                profiler.disable()
+                _cprofile_lock.release()
+                captured, samples = _cprofile_to_stacks(profiler), 0
+            with self._lock:
+                session.stacks.update(captured)
+                session.samples += samples
+                session.truncated += int(bool(timer and timer.truncated))
+                session.capture_ms.append((time.perf_counter() - started) * 1000)
+                session.active -= 1
+                if session.remaining == 0 and session.active == 0:
+                    session.completed_at = time.time()
+
+# Global profiling service instance
+profiling_service = ProfilingService()
+
+def get_profiler() -> ProfilingService:
+    """Get the global profiling service"""
+    return profiling_service
+
+def profiled(target: str):
+    """Decorator that profiles a function when a session is armed for `target`"""
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            with profiling_service.profile(target, same_thread=True):
+                return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+    return decorator
@@ -0,0 +1,301 @@
+# =============================================================================
+# Harara Monthly Report Service
+# - Maintains small per-month aggregates incrementally after each run
+# - Renders the PDF report in the background from those aggregates
+# - Stores each build as a versioned artifact served as cached bytes
+# =============================================================================
+
+import io
+import os
+import json
+import glob
+import threading
+import datetime as dt
+from zoneinfo import ZoneInfo
+from typing import Dict, List, Optional, Tuple
+
+REPORT_DIR = os.getenv("HARARA_REPORT_DIR", os.path.join(os.path.dirname(__file__), "harara_reports"))
+REPORT_TIMEZONE = "Africa/Kigali"
+REPORT_DPI = 300
+KEEP_VERSIONS = 5
+HIGH_RISK = 0.7
+MODERATE_RISK = 0.4
+
+_lock = threading.Lock()
+_build_lock = threading.Lock()
+_cache: Dict[str, Tuple[bytes, dt.datetime, int]] = {}  # month -> (pdf, built_at, version)
+
+def _now() -> dt.datetime:
+    return dt.datetime.now(ZoneInfo(REPORT_TIMEZONE))
+
+def _month_key(day: dt.date) -> str:
+    return day.strftime("%Y-%m")
+
+def _agg_path(month: str) -> str:
+    return os.path.join(REPORT_DIR, f"aggregates_{month.replace('-', '')}.json")
+
+def _load_aggregates(month: str) -> Dict:
+    try:
+        with open(_agg_path(month)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"month": month, "cells": {}, "seeded": False}
+
+def _save_aggregates(agg: Dict):
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    path = _agg_path(agg["month"])
+    with open(path + ".tmp", "w") as f:
+        json.dump(agg, f)
+    os.replace(path + ".tmp", path)
+
+# =============================================================================
+# INCREMENTAL AGGREGATES
+# Cells mirror the predictions collection: one (probability, alert) per
+# date and town, overwritten by later runs on the same day. A month is
+# seeded from Firestore once ("seeded" marker), so days predicted before
+# the aggregates existed are not lost.
+# =============================================================================
+
+def record_predictions(date_str: str, predictions: List[Dict], db=None):
+    """Fold one run's predictions into the month aggregates (seeding the month first if needed)"""
+    month = date_str[:7]
+    seed = None
+    if db is not None and not _load_aggregates(month).get("seeded"):
+        seed = _fetch_from_firestore(db, month)
+    with _lock:
+        agg = _load_aggregates(month)
+        if seed is not None and not agg.get("seeded"):
+            for date, towns in seed["cells"].items():
+                for town, cell in towns.items():
+                    agg["cells"].setdefault(date, {}).setdefault(town, cell)
+            agg["seeded"] = True
+        day = agg["cells"].setdefault(date_str, {})
+        for p in predictions:
+            day[p["town"]] = [float(p["probability"]), bool(p["alert"])]
+        agg["updated_at"] = _now().isoformat()
+        _save_aggregates(agg)
+
+def _fetch_from_firestore(db, month: str) -> Dict:
+    start = month + "-01"
+    end = month + "-31"
+    docs = db.collection("predictions").where("date", ">=", start).where("date", "<=", end).stream()
+    agg = {"month": month, "cells": {}, "seeded": True}
+    for doc in docs:
+        d = doc.to_dict()
+        if d.get("date") and d.get("town"):
+            agg["cells"].setdefault(d["date"], {})[d["town"]] = [
+                float(d.get("probability", 0.0)), bool(d.get("alert", False))
+            ]
+    return agg
+
+def seed_from_firestore(db, month: str):
+    """Rebuild a month's aggregates from Firestore (first run of a month or forced rebuild)"""
+    agg = _fetch_from_firestore(db, month)
+    agg["updated_at"] = _now().isoformat()
+    with _lock:
+        _save_aggregates(agg)
+    return agg
+
+def summarize(month: str, now: Optional[dt.datetime] = None) -> Dict:
+    """Derive every report figure from the aggregates (no Firestore reads)"""
+    now = now or _now()
+    agg = _load_aggregates(month)
+    cells = agg["cells"]
+
+    # The weekly window may reach back into the previous month
+    week_start = (now - dt.timedelta(days=7)).date()
+    weekly_cells = dict(cells)
+    if _month_key(week_start) != month:
+        weekly_cells.update(_load_aggregates(_month_key(week_start))["cells"])
+
+    total = heatwaves = high_risk = 0
+    risk_bins = {"Low": 0, "Moderate": 0, "High": 0}
+    town_latest: Dict[str, Tuple[str, float]] = {}
+    daily_counts: Dict[str, int] = {}
+    for date_str in sorted(cells):
+        for town, (prob, alert) in cells[date_str].items():
+            total += 1
+            heatwaves += int(alert)
+            high_risk += int(prob >= HIGH_RISK)
+            if 0 < prob <= 0.3:
+                risk_bins["Low"] += 1
+            elif 0.3 < prob <= 0.6:
+                risk_bins["Moderate"] += 1
+            elif 0.6 < prob <= 1.0:
+                risk_bins["High"] += 1
+            town_latest[town] = (date_str, prob)
+        daily_counts[date_str] = len(cells[date_str])
+
+    weekly = {}
+    for date_str, towns in sorted(weekly_cells.items()):
+        if dt.date.fromisoformat(date_str) < week_start:
+            continue
+        probs = [p for p, _ in towns.values()]
+        weekly[date_str] = {
+            "avg_probability": sum(probs) / len(probs) if probs else 0.0,
+            "alerts": sum(int(a) for _, a in towns.values()),
+        }
+    weekly_probs = [p for d in weekly for p, _ in weekly_cells[d].values()]
+
+    return {
+        "month": month,
+        "total_predictions": total,
+        "heatwave_events": heatwaves,
+        "high_risk": high_risk,
+        "town_latest": {t: p for t, (_, p) in town_latest.items()},
+        "weekly": weekly,
+        "weekly_avg": sum(weekly_probs) / len(weekly_probs) if weekly_probs else 0.0,
+        "daily_counts": daily_counts,
+        "risk_bins": risk_bins,
+    }
+
+# =============================================================================
+# PDF RENDERING
+# =============================================================================
+
+def render_pdf(summary: Dict, now: dt.datetime) -> bytes:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import inch
+
+    fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(14, 10))
+
+    # Chart 1: Town Risk Comparison
+    if summary["town_latest"]:
+        latest = sorted(summary["town_latest"].items(), key=lambda kv: kv[1])
+        towns, probs = [t for t, _ in latest], [p for _, p in latest]
+        colors = ['red' if p >= HIGH_RISK else 'orange' if p >= MODERATE_RISK else 'green' for p in probs]
+        ax1.barh(towns, probs, color=colors)
+        ax1.set_title('Current Town Risk Levels', fontweight='bold')
+        ax1.set_xlabel('Heatwave Probability')
+        ax1.axvline(x=HIGH_RISK, color='red', linestyle='--', alpha=0.7, label='High Risk')
+        ax1.axvline(x=MODERATE_RISK, color='orange', linestyle='--', alpha=0.7, label='Moderate Risk')
+        ax1.legend()
+
+    # Chart 2: Weekly Trend Analysis
+    if summary["weekly"]:
+        days = list(summary["weekly"])
+        ax2_twin = ax2.twinx()
+        ax2.plot(days, [summary["weekly"][d]["avg_probability"] for d in days],
+                 color='blue', marker='o', label='Avg Probability')
+        ax2_twin.plot(days, [summary["weekly"][d]["alerts"] for d in days],
+                      color='red', marker='s', label='Alert Count')
+        ax2.set_title('7-Day Prediction Trends', fontweight='bold')
+        ax2.set_ylabel('Average Probability', color='blue')
+        ax2_twin.set_ylabel('Alert Count', color='red')
+        ax2.tick_params(axis='x', rotation=45)
+
+    # Chart 3: Daily Activity
+    if summary["daily_counts"]:
+        days = list(summary["daily_counts"])
+        ax3.bar(days, [summary["daily_counts"][d] for d in days], color='skyblue')
+        ax3.set_title('Daily Prediction Activity')
+        ax3.set_ylabel('Predictions Count')
+        ax3.tick_params(axis='x', rotation=45)
+
+    # Chart 4: Risk Distribution
+    bins = {k: v for k, v in summary["risk_bins"].items() if v}
+    if bins:
+        palette = {'Low': 'green', 'Moderate': 'orange', 'High': 'red'}
+        ax4.pie(list(bins.values()), labels=list(bins), colors=[palette[k] for k in bins], autopct='%1.1f%%')
+        ax4.set_title('Risk Level Distribution')
+
+    plt.tight_layout()
+    chart_buffer = io.BytesIO()
+    plt.savefig(chart_buffer, format='png', dpi=REPORT_DPI, bbox_inches='tight')
+    chart_buffer.seek(0)
+    plt.close(fig)
+
+    pdf_buffer = io.BytesIO()
+    doc = SimpleDocTemplate(pdf_buffer, pagesize=letter)
+    styles = getSampleStyleSheet()
+    total = summary["total_predictions"]
+    month_label = dt.datetime.strptime(summary["month"], "%Y-%m").strftime('%B %Y')
+    stats_text = f"""
+    <b>Monthly Statistics:</b><br/>
+    • Total Predictions: {total}<br/>
+    • Heatwave Events Detected: {summary["heatwave_events"]}<br/>
+    • Detection Rate: {(summary["heatwave_events"] / total * 100 if total else 0):.1f}%<br/>
+    • High Risk Towns: {summary["high_risk"]}<br/>
+    • Weekly Average Risk: {summary["weekly_avg"]:.2f}<br/>
+    • Report Generated: {now.strftime('%Y-%m-%d %H:%M:%S')}
+    """
+    story = [
+        Paragraph(f"Harara Heatwave Enhanced Report - {month_label}", styles['Title']),
+        Spacer(1, 12),
+        Paragraph(stats_text, styles['Normal']),
+        Spacer(1, 20),
+        Image(chart_buffer, width=7*inch, height=5*inch),
+    ]
+    doc.build(story)
+    return pdf_buffer.getvalue()
+
+# =============================================================================
+# VERSIONED ARTIFACTS
+# =============================================================================
+
+def _artifact_versions(month: str) -> List[Tuple[int, str]]:
+    pattern = os.path.join(REPORT_DIR, f"report_{month.replace('-', '')}_v*.pdf")
+    found = []
+    for path in glob.glob(pattern):
+        try:
+            found.append((int(path.rsplit("_v", 1)[1][:-4]), path))
+        except ValueError:
+            continue
+    return sorted(found)
+
+def build_report(month: Optional[str] = None, db=None, reseed: bool = False) -> Tuple[bytes, dt.datetime, int]:
+    """Render the report for a month and store it as the next artifact version"""
+    now = _now()
+    month = month or _month_key(now.date())
+    with _build_lock:
+        if db is not None and (reseed or not _load_aggregates(month).get("seeded")):
+            seed_from_firestore(db, month)
+        summary = summarize(month, now)
+        if not summary["total_predictions"]:
+            raise LookupError(f"No data for {month}")
+
+        pdf = render_pdf(summary, now)
+        versions = _artifact_versions(month)
+        version = versions[-1][0] + 1 if versions else 1
+        os.makedirs(REPORT_DIR, exist_ok=True)
+        path = os.path.join(REPORT_DIR, f"report_{month.replace('-', '')}_v{version}.pdf")
+        with open(path + ".tmp", "wb") as f:
+            f.write(pdf)
+        os.replace(path + ".tmp", path)
+        for _, old in versions[:-(KEEP_VERSIONS - 1) or None]:
+            os.remove(old)
+
+        _cache[month] = (pdf, now, version)
+        print(f" Report {month} v{version} built ({len(pdf) // 1024} KB)")
+        return _cache[month]
+
+def build_report_async(month: Optional[str] = None, db=None):
+    """Rebuild in a background thread so the scheduler is never blocked"""
+    def _run():
+        try:
+            build_report(month, db)
+        except LookupError:
+            pass
+        except Exception as e:
+            print(f" Report build failed: {e}")
+    threading.Thread(target=_run, name="harara-report", daemon=True).start()
+
+def get_report(month: Optional[str] = None) -> Optional[Tuple[bytes, dt.datetime, int]]:
+    """Latest stored report for a month (memory first, then disk)"""
+    month = month or _month_key(_now().date())
+    if month in _cache:
+        return _cache[month]
+    versions = _artifact_versions(month)
+    if not versions:
+        return None
+    version, path = versions[-1]
+    with open(path, "rb") as f:
+        pdf = f.read()
+    built_at = dt.datetime.fromtimestamp(os.path.getmtime(path), ZoneInfo(REPORT_TIMEZONE))
+    _cache[month] = (pdf, built_at, version)
+    return _cache[month]
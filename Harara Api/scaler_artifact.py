@@ -0,0 +1,115 @@
+# =============================================================================
+# Harara Scaler Artifact
+# - scaler.json: float32 mean and scale of the training StandardScaler, so
+#   serving needs neither scikit-learn nor pickle
+# - `python scaler_artifact.py scaler.pkl scaler.json` converts the pickled
+#   scaler with a restricted unpickler (StandardScaler + numpy arrays only,
+#   scikit-learn does not need to be installed)
+# - scale_windows_inplace fuses the feature scaling and per-window
+#   standardization into in-place passes over the (N, days, features) batch
+# =============================================================================
+
+import json
+import pickle
+from typing import Dict
+
+import numpy as np
+
+SCALER_FILE = "scaler.json"
+LEGACY_SCALER_FILE = "scaler.pkl"
+WINDOW_EPS = 1e-6
+
+class WindowScaler:
+    """(x - mean) / scale with float32 constants; reciprocal precomputed once"""
+
+    def __init__(self, mean, scale):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.scale = np.asarray(scale, dtype=np.float32)
+        if self.mean.shape != self.scale.shape or self.mean.ndim != 1:
+            raise ValueError("scaler mean and scale must be 1-D arrays of the same length")
+        self.inv_scale = (1.0 / self.scale).astype(np.float32)
+        self.n_features = len(self.mean)
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        """Feature scaling only (copying); the old StandardScaler.transform"""
+        return (np.asarray(X, dtype=np.float32) - self.mean) * self.inv_scale
+
+    def to_dict(self) -> Dict:
+        return {"type": "standard", "n_features": self.n_features,
+                "mean": [float(v) for v in self.mean], "scale": [float(v) for v in self.scale]}
+
+def load_scaler(path: str) -> WindowScaler:
+    with open(path) as f:
+        data = json.load(f)
+    scaler = WindowScaler(data["mean"], data["scale"])
+    if data.get("n_features", scaler.n_features) != scaler.n_features:
+        raise ValueError(f"{path}: n_features does not match mean/scale length")
+    return scaler
+
+def save_scaler(scaler: WindowScaler, path: str):
+    with open(path, "w") as f:
+        json.dump(scaler.to_dict(), f, indent=2)
+
+def scale_windows_inplace(X: np.ndarray, scaler: WindowScaler) -> np.ndarray:
+    """Feature scaling + per-window standardization of a float32 batch, in place.
+
+    Only per-window statistics (N values) are allocated; X itself is
+    overwritten and returned.
+    """
+    if X.dtype != np.float32 or not X.flags.c_contiguous:
+        raise ValueError("scale_windows_inplace needs a C-contiguous float32 batch")
+    np.subtract(X, scaler.mean, out=X)
+    np.multiply(X, scaler.inv_scale, out=X)
+    per_window = X.shape[1] * X.shape[2]
+    mean = X.mean(axis=(1, 2), dtype=np.float64).astype(np.float32).reshape(-1, 1, 1)
+    np.subtract(X, mean, out=X)
+    # std after centering = sqrt(sum(x^2) / n); einsum reduces without an X-sized temporary
+    std = np.sqrt(np.einsum("ntf,ntf->n", X, X, dtype=np.float64) / per_window).astype(np.float32)
+    std += WINDOW_EPS
+    np.divide(X, std.reshape(-1, 1, 1), out=X)
+    return X
+
+# =============================================================================
+# LEGACY CONVERSION
+# =============================================================================
+
+class _PickledStandardScaler:
+    """Receives the state of a pickled sklearn StandardScaler"""
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+class _ScalerUnpickler(pickle.Unpickler):
+    _ALLOWED = {
+        ("numpy.core.multiarray", "_reconstruct"), ("numpy._core.multiarray", "_reconstruct"),
+        ("numpy.core.multiarray", "scalar"), ("numpy._core.multiarray", "scalar"),
+        ("numpy", "ndarray"), ("numpy", "dtype"),
+    }
+
+    def find_class(self, module, name):
+        if (module, name) == ("sklearn.preprocessing._data", "StandardScaler"):
+            return _PickledStandardScaler
+        if (module, name) in self._ALLOWED:
+            return getattr(np.core.multiarray if module.endswith("multiarray") else np, name)
+        raise pickle.UnpicklingError(f"{module}.{name} is not allowed in a scaler pickle")
+
+def convert_pickled_scaler(pkl_path: str, json_path: str) -> WindowScaler:
+    """scaler.pkl (sklearn StandardScaler) -> scaler.json"""
+    with open(pkl_path, "rb") as f:
+        state = _ScalerUnpickler(f).load()
+    n_features = int(state.n_features_in_)
+    mean = state.mean_ if getattr(state, "with_mean", True) and state.mean_ is not None else np.zeros(n_features)
+    scale = state.scale_ if getattr(state, "with_std", True) and state.scale_ is not None else np.ones(n_features)
+    scaler = WindowScaler(mean, scale)
+    save_scaler(scaler, json_path)
+    return scaler
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a pickled StandardScaler to scaler.json")
+    parser.add_argument("pkl_path")
+    parser.add_argument("json_path")
+    args = parser.parse_args()
+    converted = convert_pickled_scaler(args.pkl_path, args.json_path)
+    print(f" Wrote {args.json_path} ({converted.n_features} features)")
@@ -0,0 +1,79 @@
+# =============================================================================
+# Harara What-If Scenarios
+# - A scenario is a list of perturbations of the current raw (unscaled)
+#   windows: multiplicative and/or additive, per feature, for some towns or
+#   all of them, over the whole window or only its last N days
+# - Every scenario x town window is built by broadcasting one (S, T, days,
+#   features) factor / offset grid over the base windows, then scored in a
+#   single forward pass; the result is a town x scenario probability matrix
+# =============================================================================
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+MAX_SCENARIOS = 200
+BASELINE = "baseline"
+OPS = ("add", "mul")
+
+def validate_scenarios(scenarios: List[Dict], feature_cols: List[str], towns: List[str]) -> Optional[str]:
+    """Error message for an invalid scenario list, else None"""
+    if not scenarios:
+        return "at least one scenario is required"
+    if len(scenarios) > MAX_SCENARIOS:
+        return f"at most {MAX_SCENARIOS} scenarios per request"
+    names = [s["name"] for s in scenarios]
+    if len(set(names)) != len(names) or BASELINE in names:
+        return f"scenario names must be unique and not '{BASELINE}'"
+    for s in scenarios:
+        for p in s["perturbations"]:
+            if p["feature"] not in feature_cols:
+                return f"{s['name']}: unknown feature {p['feature']!r}"
+            if p["op"] not in OPS:
+                return f"{s['name']}: op must be one of {', '.join(OPS)}"
+            unknown = [t for t in (p.get("towns") or []) if t not in towns]
+            if unknown:
+                return f"{s['name']}: unknown towns {', '.join(unknown)}"
+            if p.get("days") is not None and p["days"] < 1:
+                return f"{s['name']}: days must be >= 1"
+    return None
+
+def build_scenario_batch(base: np.ndarray, towns: List[str], feature_cols: List[str],
+                         scenarios: List[Dict], include_baseline: bool = True) -> np.ndarray:
+    """(T, days, F) raw windows -> (S * T, days, F) perturbed batch, scenario-major.
+
+    Within a scenario every factor is applied before every offset: x * mul + add.
+    """
+    n_towns, n_days, n_features = base.shape
+    specs = ([{"name": BASELINE, "perturbations": []}] if include_baseline else []) + list(scenarios)
+    mul = np.ones((len(specs), n_towns, n_days, n_features), dtype=np.float32)
+    add = np.zeros_like(mul)
+    town_index = {t: i for i, t in enumerate(towns)}
+    feature_index = {f: i for i, f in enumerate(feature_cols)}
+    for s, spec in enumerate(specs):
+        for p in spec["perturbations"]:
+            # Towns outside the evaluated selection are simply not in the batch
+            rows = [town_index[t] for t in p["towns"] if t in town_index] if p.get("towns") else slice(None)
+            days = slice(n_days - min(p["days"], n_days), None) if p.get("days") else slice(None)
+            f = feature_index[p["feature"]]
+            if p["op"] == "mul":
+                mul[s, rows, days, f] *= p["value"]
+            else:
+                add[s, rows, days, f] += p["value"]
+    # One broadcast multiply-add builds the whole grid into the (contiguous) result
+    batch = np.multiply(mul, base[None], out=mul)
+    batch += add
+    return batch.reshape(len(specs) * n_towns, n_days, n_features)
+
+def scenario_matrix(probs: np.ndarray, towns: List[str], names: List[str], threshold: float) -> Dict:
+    """Scenario-major probabilities -> town x scenario matrices (plus change vs baseline)"""
+    grid = np.asarray(probs, dtype=np.float64).reshape(len(names), len(towns)).T   # (T, S)
+    result = {
+        "towns": towns,
+        "scenarios": names,
+        "probabilities": np.round(grid, 4).tolist(),
+        "alerts": (grid >= threshold).astype(int).tolist(),
+    }
+    if names and names[0] == BASELINE:
+        result["delta"] = np.round(grid - grid[:, :1], 4).tolist()
+    return result
@@ -0,0 +1,138 @@
+# =============================================================================
+# Harara Bulk SMS Dispatcher
+# - Normalizes and deduplicates recipient numbers
+# - Sends multi-recipient chunks concurrently within the provider rate limit
+# - Collects per-recipient status from the provider (see sms_providers)
+# =============================================================================
+
+import os
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_COUNTRY_CODE = os.getenv("SMS_DEFAULT_COUNTRY_CODE", "+250")
+SMS_CHUNK_SIZE = int(os.getenv("SMS_CHUNK_SIZE", "100"))
+SMS_MAX_CONCURRENCY = int(os.getenv("SMS_MAX_CONCURRENCY", "4"))
+SMS_REQUESTS_PER_SECOND = float(os.getenv("SMS_REQUESTS_PER_SECOND", "5"))
+
+_NON_DIGITS = re.compile(r"[^\d+]")
+
+def normalize_phone(phone, country_code: str = DEFAULT_COUNTRY_CODE) -> Optional[str]:
+    """Normalize a phone number to E.164 (+<country><subscriber>), or None if invalid"""
+    if phone is None:
+        return None
+    phone = _NON_DIGITS.sub("", str(phone))
+    if not phone:
+        return None
+    if phone.startswith("00"):
+        phone = "+" + phone[2:]
+    elif not phone.startswith("+"):
+        if phone.startswith("0"):
+            phone = country_code + phone[1:]
+        else:
+            phone = country_code + phone
+    digits = phone[1:]
+    if not digits.isdigit() or not 8 <= len(digits) <= 15:
+        return None
+    return phone
+
+def normalize_recipients(phones: Iterable) -> Dict[str, List]:
+    """Normalize and dedupe, preserving first-seen order"""
+    seen = {}
+    invalid = []
+    total = 0
+    for raw in phones:
+        total += 1
+        phone = normalize_phone(raw)
+        if phone is None:
+            invalid.append(raw)
+        elif phone not in seen:
+            seen[phone] = True
+    return {"valid": list(seen), "invalid": invalid, "total": total}
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = max(rate, 1e-6)
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0):
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+class SMSDispatcher:
+    """Fan a message out to many recipients in concurrent multi-recipient chunks.
+
+    `provider.send_batch(message, numbers)` sends one chunk and returns
+    number -> status dict (see sms_providers).
+    """
+
+    def __init__(self, provider,
+                 chunk_size: int = SMS_CHUNK_SIZE,
+                 max_concurrency: int = SMS_MAX_CONCURRENCY,
+                 requests_per_second: float = SMS_REQUESTS_PER_SECOND):
+        self.provider = provider
+        self.chunk_size = max(1, chunk_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.bucket = TokenBucket(requests_per_second)
+
+    def _send_chunk(self, message: str, chunk: List[str]) -> Dict[str, Dict]:
+        self.bucket.acquire()
+        try:
+            statuses = self.provider.send_batch(message, chunk)
+        except Exception as e:
+            return {n: {"status": "failed", "error": str(e)} for n in chunk}
+        # Recipients missing from the response are treated as failed
+        return {n: statuses.get(n, {"status": "failed", "error": "missing from provider response"})
+                for n in chunk}
+
+    def dispatch(self, message: str, phones: Iterable) -> Dict:
+        started = time.time()
+        recipients = normalize_recipients(phones)
+        numbers = recipients["valid"]
+        chunks = [numbers[i:i + self.chunk_size] for i in range(0, len(numbers), self.chunk_size)]
+
+        results: Dict[str, Dict] = {}
+        if chunks:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(chunks)),
+                                    thread_name_prefix="sms-dispatch") as pool:
+                for chunk_result in pool.map(lambda c: self._send_chunk(message, c), chunks):
+                    results.update(chunk_result)
+
+        sent = sum(1 for r in results.values() if r["status"] == "sent")
+        return {
+            "provider": self.provider.name,
+            "requested": recipients["total"],
+            "unique": len(numbers),
+            "invalid": len(recipients["invalid"]),
+            "chunks": len(chunks),
+            "sent": sent,
+            "failed": len(results) - sent,
+            "duration_ms": (time.time() - started) * 1000,
+            "results": results,
+        }
@@ -0,0 +1,356 @@
+# =============================================================================
+# Harara SMS Providers
+# - One interface: send_batch(message, numbers) -> number -> status dict
+# - Adapters for Africa's Talking, Twilio and a local HTTP stub
+# - FailoverProvider walks the chain when a provider errors or is slow,
+#   with a per-provider cooldown (circuit breaker)
+# - Nothing is ever reported as sent unless a provider accepted it
+#
+# Stub server for offline load tests:
+#   python sms_providers.py --port 8089 --latency-ms 80 --error-rate 0.02
+# =============================================================================
+
+import os
+import json
+import time
+import uuid
+import random
+import threading
+from typing import Dict, List, Optional
+
+SMS_PROVIDERS = os.getenv("SMS_PROVIDERS", "africastalking,twilio")
+SMS_STUB_URL = os.getenv("SMS_STUB_URL", "http://127.0.0.1:8089/sms")
+SMS_PROVIDER_TIMEOUT = float(os.getenv("SMS_PROVIDER_TIMEOUT", "10"))              # seconds
+SMS_FAILOVER_LATENCY_MS = float(os.getenv("SMS_FAILOVER_LATENCY_MS", "5000"))
+SMS_FAILOVER_COOLDOWN = float(os.getenv("SMS_FAILOVER_COOLDOWN", "60"))            # seconds
+
+# Africa's Talking status codes: accepted, and rejected for the number itself
+AT_ACCEPTED_CODES = {100, 101, 102}                  # Processed, Sent, Queued
+AT_PERMANENT_CODES = {403, 404, 406}                 # InvalidPhoneNumber, UnsupportedNumberType, UserInBlacklist
+
+def parse_recipient_statuses(response) -> Dict[str, Dict]:
+    """Map number -> status dict from an Africa's Talking sms.send response"""
+    statuses = {}
+    try:
+        recipients = response["SMSMessageData"]["Recipients"]
+    except (KeyError, TypeError):
+        return statuses
+    for r in recipients or []:
+        number = r.get("number")
+        if not number:
+            continue
+        status = r.get("status", "Unknown")
+        code = r.get("statusCode")
+        sent = code in AT_ACCEPTED_CODES or "Success" in status
+        statuses[number] = {
+            "status": "sent" if sent else "failed",
+            "permanent": code in AT_PERMANENT_CODES,
+            "provider_status": status,
+            "status_code": code,
+            "cost": r.get("cost"),
+            "message_id": r.get("messageId"),
+        }
+    return statuses
+
+def _failed(numbers: List[str], error: str) -> Dict[str, Dict]:
+    return {n: {"status": "failed", "error": error} for n in numbers}
+
+class SMSProvider:
+    """Base adapter. `send_batch` sends one provider request and never raises for
+    per-recipient rejections; it raises when the request itself fails."""
+
+    name = "base"
+
+    def send_batch(self, message: str, numbers: List[str]) -> Dict[str, Dict]:
+        raise NotImplementedError
+
+    def info(self) -> Dict:
+        return {"name": self.name}
+
+class AfricasTalkingProvider(SMSProvider):
+    name = "africastalking"
+
+    def __init__(self, username: Optional[str] = None, api_key: Optional[str] = None,
+                 sender_id: Optional[str] = None):
+        self.username = username or os.getenv("AT_USERNAME", "Sandbox")
+        self.api_key = api_key or os.getenv("AT_API_KEY")
+        self.sender_id = sender_id or os.getenv("AT_SENDER_ID")
+        self._sms = None
+        self._lock = threading.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def _client(self):
+        if self._sms is None:
+            with self._lock:
+                if self._sms is None:
+                    import africastalking
+                    africastalking.initialize(self.username, self.api_key)
+                    self._sms = africastalking.SMS
+        return self._sms
+
+    def send_batch(self, message: str, numbers: List[str]) -> Dict[str, Dict]:
+        if self.sender_id:
+            response = self._client().send(message, numbers, self.sender_id)
+        else:
+            response = self._client().send(message, numbers)
+        statuses = parse_recipient_statuses(response)
+        if not statuses:
+            raise RuntimeError(f"Unexpected Africa's Talking response: {str(response)[:200]}")
+        return statuses
+
+class TwilioProvider(SMSProvider):
+    """Twilio has no multi-recipient send, so a batch is one request per number"""
+
+    name = "twilio"
+
+    def __init__(self, account_sid: Optional[str] = None, auth_token: Optional[str] = None,
+                 from_number: Optional[str] = None):
+        self.account_sid = account_sid or os.getenv("TWILIO_ACCOUNT_SID")
+        self.auth_token = auth_token or os.getenv("TWILIO_AUTH_TOKEN")
+        self.from_number = from_number or os.getenv("TWILIO_FROM_NUMBER")
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.account_sid and self.auth_token and self.from_number)
+
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from twilio.rest import Client
+                    self._client = Client(self.account_sid, self.auth_token)
+        return self._client
+
+    def send_batch(self, message: str, numbers: List[str]) -> Dict[str, Dict]:
+        from twilio.base.exceptions import TwilioRestException
+
+        client = self.client()
+        statuses = {}
+        for number in numbers:
+            try:
+                msg = client.messages.create(body=message, from_=self.from_number, to=number)
+                failed = msg.status in ("failed", "undelivered")
+                statuses[number] = {
+                    "status": "failed" if failed else "sent",
+                    "provider_status": msg.status,
+                    "message_id": msg.sid,
+                    "error": msg.error_message if failed else None,
+                }
+            except TwilioRestException as e:
+                if e.status and e.status >= 500:
+                    raise  # provider outage - let the failover move on
+                statuses[number] = {"status": "failed", "permanent": True,
+                                    "provider_status": str(e.code), "error": e.msg}
+        return statuses
+
+class HTTPStubProvider(SMSProvider):
+    """Posts batches to the local stub server (see run_stub_server)"""
+
+    name = "stub"
+    configured = True
+
+    def __init__(self, url: str = SMS_STUB_URL, timeout: float = SMS_PROVIDER_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    def send_batch(self, message: str, numbers: List[str]) -> Dict[str, Dict]:
+        import urllib.request
+
+        req = urllib.request.Request(
+            self.url, data=json.dumps({"message": message, "to": numbers}).encode(),
+            headers={"Content-Type": "application/json"}, method="POST",
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:  # raises on 5xx
+            return parse_recipient_statuses(json.loads(resp.read()))
+
+    def info(self) -> Dict:
+        return {"name": self.name, "url": self.url}
+
+class FailoverProvider(SMSProvider):
+    """Try providers in order; recipients that fail move on to the next provider
+    (rejections of the number itself are final).
+
+    A provider that raises, or answers slower than `max_latency_ms`, is skipped
+    for `cooldown` seconds unless it is the last one left.
+    """
+
+    def __init__(self, providers: List[SMSProvider], max_latency_ms: float = SMS_FAILOVER_LATENCY_MS,
+                 cooldown: float = SMS_FAILOVER_COOLDOWN):
+        if not providers:
+            raise ValueError("FailoverProvider needs at least one provider")
+        self.providers = providers
+        self.max_latency_ms = max_latency_ms
+        self.cooldown = cooldown
+        self.name = "failover(" + ",".join(p.name for p in providers) + ")"
+        self._lock = threading.Lock()
+        self._state = {p.name: {"open_until": 0.0, "requests": 0, "errors": 0, "slow": 0,
+                                "latency_ms": None, "last_error": None} for p in providers}
+
+    def _available(self) -> List[SMSProvider]:
+        now = time.monotonic()
+        healthy = [p for p in self.providers if self._state[p.name]["open_until"] <= now]
+        return healthy or self.providers[-1:]
+
+    def _record(self, provider: SMSProvider, latency_ms: float, error: Optional[str] = None):
+        with self._lock:
+            state = self._state[provider.name]
+            state["requests"] += 1
+            prev = state["latency_ms"]
+            state["latency_ms"] = latency_ms if prev is None else 0.8 * prev + 0.2 * latency_ms
+            trip = False
+            if error is not None:
+                state["errors"] += 1
+                state["last_error"] = error[:200]
+                trip = True
+            elif latency_ms > self.max_latency_ms:
+                state["slow"] += 1
+                trip = True
+            if trip:
+                state["open_until"] = time.monotonic() + self.cooldown
+
+    def send_batch(self, message: str, numbers: List[str]) -> Dict[str, Dict]:
+        results: Dict[str, Dict] = {}
+        pending = list(numbers)
+        for provider in self._available():
+            if not pending:
+                break
+            started = time.perf_counter()
+            try:
+                statuses = provider.send_batch(message, pending)
+            except Exception as e:
+                self._record(provider, (time.perf_counter() - started) * 1000, str(e))
+                results.update({n: {**r, "provider": provider.name} for n, r in _failed(pending, str(e)).items()})
+                continue
+            self._record(provider, (time.perf_counter() - started) * 1000)
+            retry = []
+            for n in pending:
+                r = statuses.get(n, {"status": "failed", "error": "missing from provider response"})
+                results[n] = {**r, "provider": provider.name}
+                if r["status"] != "sent" and not r.get("permanent"):
+                    retry.append(n)
+            pending = retry
+        return results
+
+    def info(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "name": self.name,
+                "max_latency_ms": self.max_latency_ms,
+                "cooldown_s": self.cooldown,
+                "providers": [{
+                    **p.info(),
+                    **{k: v for k, v in self._state[p.name].items() if k != "open_until"},
+                    "available": self._state[p.name]["open_until"] <= now,
+                } for p in self.providers],
+            }
+
+class NoProvider(SMSProvider):
+    """Used when nothing is configured: every send fails loudly"""
+
+    name = "none"
+
+    def send_batch(self, message: str, numbers: List[str]) -> Dict[str, Dict]:
+        raise RuntimeError("No SMS provider configured (set AT_API_KEY, TWILIO_* or SMS_PROVIDERS=stub)")
+
+PROVIDER_CLASSES = {
+    "africastalking": AfricasTalkingProvider,
+    "twilio": TwilioProvider,
+    "stub": HTTPStubProvider,
+}
+
+def build_provider(names: str = SMS_PROVIDERS) -> SMSProvider:
+    """Failover chain from a comma-separated provider list; unconfigured adapters are skipped"""
+    chain = []
+    for name in [n.strip().lower() for n in names.split(",") if n.strip()]:
+        cls = PROVIDER_CLASSES.get(name)
+        if cls is None:
+            print(f" Unknown SMS provider '{name}' ignored")
+            continue
+        provider = cls()
+        if provider.configured:
+            chain.append(provider)
+        else:
+            print(f" SMS provider '{name}' not configured — skipped")
+    if not chain:
+        print(" No SMS provider configured — SMS sends will fail")
+        return NoProvider()
+    provider = FailoverProvider(chain)
+    print(f" SMS providers: {provider.name}")
+    return provider
+
+# =============================================================================
+# LOCAL STUB SERVER
+# Answers like Africa's Talking with configurable latency and error rate,
+# and counts what it received so fan-out throughput can be measured offline.
+# =============================================================================
+
+def run_stub_server(host: str = "127.0.0.1", port: int = 8089, latency_ms: float = 50.0,
+                    jitter_ms: float = 20.0, error_rate: float = 0.0, reject_rate: float = 0.0):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    stats = {"requests": 0, "messages": 0, "errors": 0, "rejected": 0, "started": time.time()}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, code: int, payload: Dict):
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            with lock:
+                elapsed = time.time() - stats["started"]
+                self._reply(200, {**stats, "messages_per_second": stats["messages"] / elapsed if elapsed else 0.0})
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            numbers = payload.get("to", [])
+            time.sleep(max(0.0, random.gauss(latency_ms, jitter_ms)) / 1000)
+            if random.random() < error_rate:
+                with lock:
+                    stats["requests"] += 1
+                    stats["errors"] += 1
+                return self._reply(503, {"error": "stub provider error"})
+            recipients = []
+            for n in numbers:
+                ok = random.random() >= reject_rate
+                recipients.append({
+                    "number": n, "status": "Success" if ok else "InvalidPhoneNumber",
+                    "statusCode": 101 if ok else 403, "cost": "RWF 0.0000",
+                    "messageId": f"stub-{uuid.uuid4().hex[:16]}",
+                })
+            with lock:
+                stats["requests"] += 1
+                stats["messages"] += len(numbers)
+                stats["rejected"] += sum(1 for r in recipients if r["statusCode"] != 101)
+            self._reply(201, {"SMSMessageData": {"Message": f"Sent to {len(numbers)}", "Recipients": recipients}})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f" SMS stub listening on http://{host}:{port}/sms "
+          f"(latency {latency_ms}±{jitter_ms} ms, error rate {error_rate:.0%}, reject rate {reject_rate:.0%})")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local SMS provider stub for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    parser.add_argument("--reject-rate", type=float, default=0.0, help="fraction of recipients rejected")
+    args = parser.parse_args()
+    run_stub_server(args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate, args.reject_rate)
@@ -0,0 +1,264 @@
+# =============================================================================
+# Harara Startup Service
+# - Lazy module proxies so heavy SDKs (TensorFlow, Earth Engine, Firebase)
+#   are imported on first use instead of at process start
+# - Staged startup: each subsystem initializes in its own background thread
+#   and reports pending / starting / ready / degraded / failed, which backs
+#   the liveness and readiness endpoints
+# - Startup profiler: wall time and RSS delta of every heavy import and
+#   startup stage, printed as a table at boot and served as diagnostics
+# =============================================================================
+
+import os
+import sys
+import time
+import types
+import importlib
+import threading
+import datetime as dt
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional
+
+# =============================================================================
+# STARTUP PROFILER
+# =============================================================================
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def current_rss_bytes() -> int:
+    """Resident set size now (Linux /proc), else the peak RSS from getrusage"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+class StartupProfiler:
+    """Records (name, kind, wall ms, RSS delta) for imports and startup stages.
+
+    Stages run concurrently, so their RSS deltas overlap; imports nested inside
+    a stage are counted in both rows.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records: List[Dict] = []
+        self.process_start = time.time()
+        self.baseline_rss = current_rss_bytes()
+
+    @contextmanager
+    def measure(self, name: str, kind: str = "stage"):
+        rss0, t0 = current_rss_bytes(), time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record = {
+                "name": name,
+                "kind": kind,
+                "wall_ms": round((time.perf_counter() - t0) * 1000, 1),
+                "rss_delta_mb": round((current_rss_bytes() - rss0) / 2**20, 1),
+                "at_s": round(time.time() - self.process_start, 2),
+                "thread": threading.current_thread().name,
+                "error": error,
+            }
+            with self._lock:
+                self.records.append(record)
+
+    def report(self) -> Dict:
+        with self._lock:
+            records = list(self.records)
+        return {
+            "process_start": dt.datetime.utcfromtimestamp(self.process_start).isoformat() + "Z",
+            "baseline_rss_mb": round(self.baseline_rss / 2**20, 1),
+            "rss_mb": round(current_rss_bytes() / 2**20, 1),
+            "records": records,
+            "totals": {
+                kind: {
+                    "wall_ms": round(sum(r["wall_ms"] for r in records if r["kind"] == kind), 1),
+                    "rss_delta_mb": round(sum(r["rss_delta_mb"] for r in records if r["kind"] == kind), 1),
+                } for kind in sorted({r["kind"] for r in records})
+            },
+        }
+
+    def table(self) -> str:
+        report = self.report()
+        rows = sorted(report["records"], key=lambda r: -r["wall_ms"])
+        width = max([len(r["name"]) for r in rows] + [10])
+        lines = [f" {'name':<{width}}  {'kind':<6}  {'wall ms':>9}  {'RSS MB':>7}  {'at s':>6}",
+                 " " + "-" * (width + 36)]
+        for r in rows:
+            flag = "  !" if r["error"] else ""
+            lines.append(f" {r['name']:<{width}}  {r['kind']:<6}  {r['wall_ms']:>9.1f}  "
+                         f"{r['rss_delta_mb']:>+7.1f}  {r['at_s']:>6.2f}{flag}")
+        lines.append(f" RSS now {report['rss_mb']} MB (baseline {report['baseline_rss_mb']} MB before app imports)")
+        return "\n".join(lines)
+
+# Global startup profiler
+startup_profiler = StartupProfiler()
+
+def get_startup_profiler() -> StartupProfiler:
+    """Get the global startup profiler"""
+    return startup_profiler
+
+# =============================================================================
+# LAZY IMPORTS
+# =============================================================================
+
+class LazyModule(types.ModuleType):
+    """Stands in for a module and imports it on first attribute access"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_module"] = None
+        self.__dict__["_lazy_lock"] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with self.__dict__["_lazy_lock"]:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    with startup_profiler.measure(f"import {self.__name__}", "import"):
+                        module = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    @property
+    def loaded(self) -> bool:
+        return self.__dict__["_lazy_module"] is not None
+
+def lazy_module(name: str) -> LazyModule:
+    return LazyModule(name)
+
+# =============================================================================
+# STAGED STARTUP
+# =============================================================================
+
+PENDING, STARTING, READY, DEGRADED, FAILED = "pending", "starting", "ready", "degraded", "failed"
+
+class Subsystem:
+    def __init__(self, name: str, init: Callable[[], Optional[bool]], after: Iterable[str] = (),
+                 required: bool = True):
+        self.name = name
+        self.init = init
+        self.after = tuple(after)
+        self.required = required
+        self.state = PENDING
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.done = threading.Event()
+
+    def info(self) -> Dict:
+        duration = None
+        if self.started_at is not None:
+            duration = ((self.finished_at or time.time()) - self.started_at) * 1000
+        return {
+            "state": self.state,
+            "required": self.required,
+            "after": list(self.after),
+            "error": self.error,
+            "duration_ms": round(duration, 1) if duration is not None else None,
+        }
+
+class StartupManager:
+    """Runs registered init stages concurrently, each after its dependencies"""
+
+    def __init__(self):
+        self._subsystems: Dict[str, Subsystem] = {}
+        self.started_at: Optional[float] = None
+
+    def register(self, name: str, init: Callable[[], Optional[bool]], after: Iterable[str] = (),
+                 required: bool = True) -> Subsystem:
+        subsystem = Subsystem(name, init, after, required)
+        self._subsystems[name] = subsystem
+        return subsystem
+
+    def mark(self, name: str, state: str, error: Optional[str] = None, required: bool = True):
+        """Record a stage that ran synchronously"""
+        subsystem = self._subsystems.get(name) or self.register(name, lambda: None, required=required)
+        subsystem.state, subsystem.error = state, error
+        subsystem.started_at = subsystem.finished_at = time.time()
+        subsystem.done.set()
+
+    def _run(self, subsystem: Subsystem):
+        for dep in subsystem.after:
+            if dep in self._subsystems:
+                self._subsystems[dep].done.wait()
+        subsystem.state = STARTING
+        subsystem.started_at = time.time()
+        try:
+            with startup_profiler.measure(subsystem.name, "stage"):
+                ok = subsystem.init()
+            subsystem.state = DEGRADED if ok is False else READY
+        except Exception as e:
+            subsystem.state = FAILED
+            subsystem.error = str(e)
+        finally:
+            subsystem.finished_at = time.time()
+            subsystem.done.set()
+            print(f" Startup stage '{subsystem.name}' {subsystem.state} "
+                  f"({(subsystem.finished_at - subsystem.started_at) * 1000:.0f} ms)"
+                  + (f": {subsystem.error}" if subsystem.error else ""))
+
+    def start(self, on_complete: Optional[Callable[[], None]] = None):
+        """Launch every pending stage in a background thread and return immediately"""
+        self.started_at = time.time()
+        for subsystem in self._subsystems.values():
+            if subsystem.state == PENDING:
+                threading.Thread(target=self._run, args=(subsystem,),
+                                 name=f"startup-{subsystem.name}", daemon=True).start()
+        if on_complete is not None:
+            def _wait_all():
+                for subsystem in list(self._subsystems.values()):
+                    subsystem.done.wait()
+                on_complete()
+            threading.Thread(target=_wait_all, name="startup-complete", daemon=True).start()
+
+    def wait(self, name: str, timeout: Optional[float] = None) -> bool:
+        """Block until a stage finished; True if it is ready"""
+        subsystem = self._subsystems.get(name)
+        if subsystem is None:
+            return False
+        subsystem.done.wait(timeout)
+        return subsystem.state == READY
+
+    def state(self, name: str) -> Optional[str]:
+        subsystem = self._subsystems.get(name)
+        return subsystem.state if subsystem else None
+
+    @property
+    def ready(self) -> bool:
+        return all(s.state == READY for s in self._subsystems.values() if s.required)
+
+    @property
+    def warming(self) -> bool:
+        """Some required stage has not finished yet"""
+        return any(s.state in (PENDING, STARTING) for s in self._subsystems.values() if s.required)
+
+    def status(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "uptime_s": round(time.time() - self.started_at, 1) if self.started_at else 0.0,
+            "started_at": dt.datetime.utcfromtimestamp(self.started_at).isoformat() + "Z" if self.started_at else None,
+            "subsystems": {n: s.info() for n, s in self._subsystems.items()},
+        }
+
+# Global startup manager
+startup_manager = StartupManager()
+
+def get_startup() -> StartupManager:
+    """Get the global startup manager"""
+    return startup_manager
@@ -0,0 +1,239 @@
+# =============================================================================
+# Harara Bulk Subscriber Import
+# - Parses CSV / NDJSON uploads into a DataFrame
+# - Validates towns and normalizes + dedupes phone numbers column-wise
+# - Upserts users (document id = E.164 number) through a Firestore
+#   BulkWriter in a background job with progress and a per-row error report
+# - Imported FCM tokens are subscribed to their town topic
+# =============================================================================
+
+import io
+import uuid
+import threading
+import datetime as dt
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from sms_dispatcher import DEFAULT_COUNTRY_CODE
+
+MAX_IMPORT_JOBS = 20
+MAX_REPORTED_ERRORS = 10000
+PROGRESS_EVERY = 2000      # rows between flushes / progress updates
+
+PHONE_COLUMNS = ("phone_number", "phone", "msisdn")
+OPTIONAL_COLUMNS = ("name", "fcm_token")
+
+def parse_upload(body: bytes, fmt: str) -> pd.DataFrame:
+    """Read a CSV or NDJSON upload with every column as a string"""
+    if fmt == "csv":
+        df = pd.read_csv(io.BytesIO(body), dtype=str, keep_default_na=False, skipinitialspace=True)
+    elif fmt == "ndjson":
+        df = pd.read_json(io.BytesIO(body), lines=True, dtype=False)
+        df = df.astype(object).where(df.notna(), "").astype(str)
+    else:
+        raise ValueError("format must be 'csv' or 'ndjson'")
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    phone_cols = [c for c in PHONE_COLUMNS if c in df.columns]
+    if not phone_cols or "town" not in df.columns:
+        raise ValueError(f"upload needs a town column and one of {', '.join(PHONE_COLUMNS)}")
+    # First non-empty phone column wins (NDJSON rows may use different keys)
+    phone = df[phone_cols[0]]
+    for c in phone_cols[1:]:
+        phone = phone.where(phone.str.strip() != "", df[c])
+    return df.drop(columns=phone_cols).assign(phone_number=phone)
+
+def normalize_phones(phones: pd.Series, country_code: str = DEFAULT_COUNTRY_CODE) -> pd.Series:
+    """Column-wise sms_dispatcher.normalize_phone: E.164 strings, None where invalid"""
+    s = phones.fillna("").astype(str).str.replace(r"[^\d+]", "", regex=True)
+    intl = s.str.startswith("00")
+    s = s.where(~intl, "+" + s.str[2:])
+    local = ~s.str.startswith("+")
+    trunk = local & s.str.startswith("0")
+    s = s.where(~trunk, country_code + s.str[1:])
+    s = s.where(~(local & ~trunk), country_code + s)
+    valid = s.str.fullmatch(r"\+\d{8,15}") & (phones.fillna("").astype(str).str.strip() != "")
+    return s.where(valid, None)
+
+def validate(df: pd.DataFrame, towns: Iterable[str]) -> Dict:
+    """Split an upload into writable rows and per-row errors (row = 1-based data row)"""
+    canonical = {t.lower(): t for t in towns}
+    df = df.copy()
+    df["row"] = range(1, len(df) + 1)
+    df["town"] = df["town"].str.strip().str.lower().map(canonical)
+    df["normalized"] = normalize_phones(df["phone_number"])
+
+    bad_phone = df["normalized"].isna()
+    bad_town = df["town"].isna()
+    # Only rows that would otherwise be written compete for a number, so a row
+    # rejected for its town does not shadow a later valid row with the same phone
+    writable = ~bad_phone & ~bad_town
+    duplicate = df[writable].duplicated("normalized", keep="first").reindex(df.index, fill_value=False)
+
+    errors = pd.concat([
+        df.loc[bad_phone, ["row", "phone_number"]].assign(error="invalid phone number"),
+        df.loc[~bad_phone & bad_town, ["row", "phone_number"]].assign(error="unknown town"),
+        df.loc[~bad_phone & ~bad_town & duplicate, ["row", "phone_number"]].assign(error="duplicate phone in upload"),
+    ]).sort_values("row")
+    valid = df.loc[~bad_phone & ~bad_town & ~duplicate]
+    return {"valid": valid, "errors": errors}
+
+class ImportJob:
+    def __init__(self, fmt: str, filename: Optional[str] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.format = fmt
+        self.filename = filename
+        self.status = "queued"
+        self.total = 0
+        self.valid = 0
+        self.processed = 0
+        self.written = 0
+        self.failed = 0
+        self.topic_subscribed = 0
+        self.errors: List[Dict] = []
+        self.error_count = 0
+        self.message: Optional[str] = None
+        self.created_at = dt.datetime.utcnow()
+        self.finished_at: Optional[dt.datetime] = None
+        self._lock = threading.Lock()
+
+    def add_error(self, row: int, phone: str, error: str):
+        with self._lock:
+            self.error_count += 1
+            if len(self.errors) < MAX_REPORTED_ERRORS:
+                self.errors.append({"row": int(row), "phone_number": phone, "error": error})
+
+    def info(self, include_errors: bool = False) -> Dict:
+        data = {
+            "id": self.id,
+            "status": self.status,
+            "format": self.format,
+            "filename": self.filename,
+            "total": self.total,
+            "valid": self.valid,
+            "processed": self.processed,
+            "written": self.written,
+            "failed": self.failed,
+            "topic_subscribed": self.topic_subscribed,
+            "error_count": self.error_count,
+            "progress": round(self.processed / self.valid, 4) if self.valid else (1.0 if self.finished_at else 0.0),
+            "message": self.message,
+            "created_at": self.created_at.isoformat() + "Z",
+            "finished_at": self.finished_at.isoformat() + "Z" if self.finished_at else None,
+        }
+        if include_errors:
+            data["errors"] = sorted(self.errors, key=lambda e: e["row"])
+            data["errors_truncated"] = self.error_count > len(self.errors)
+        return data
+
+def run_import(job: ImportJob, db, body: bytes, towns: Iterable[str], collection: str = "users"):
+    """Validate and upsert an upload, updating the job as it goes"""
+    from firebase_admin import firestore
+
+    job.status = "validating"
+    try:
+        df = parse_upload(body, job.format)
+        job.total = len(df)
+        checked = validate(df, towns)
+        for e in checked["errors"].itertuples(index=False):
+            job.add_error(e.row, e.phone_number, e.error)
+        valid = checked["valid"]
+        job.valid = len(valid)
+
+        job.status = "writing"
+        rows_by_id: Dict[str, int] = dict(zip(valid["normalized"], valid["row"]))
+        lock = threading.Lock()
+
+        def on_result(reference, result, writer):
+            with lock:
+                job.written += 1
+
+        def on_error(failure, writer):
+            if failure.attempts < 3:
+                return True  # let the BulkWriter retry with backoff
+            with lock:
+                job.failed += 1
+            ref_id = failure.reference.id
+            job.add_error(rows_by_id.get(ref_id, 0), ref_id, f"write failed: {failure.message}")
+            return False
+
+        writer = db.bulk_writer()
+        writer.on_write_result(on_result)
+        writer.on_write_error(on_error)
+        users = db.collection(collection)
+        extra = [c for c in OPTIONAL_COLUMNS if c in valid.columns]
+        for i, row in enumerate(valid[["normalized", "town", *extra]].itertuples(index=False), 1):
+            data = {
+                "phone_number": row.normalized,
+                "town": row.town,
+                "active": True,
+                "source": "bulk_import",
+                "updated_at": firestore.SERVER_TIMESTAMP,
+            }
+            for c in extra:
+                value = getattr(row, c)
+                if value:
+                    data[c] = value
+            # merge=True: the document id is the number, so re-imports are upserts
+            writer.set(users.document(row.normalized), data, merge=True)
+            if i % PROGRESS_EVERY == 0:
+                writer.flush()
+                job.processed = i
+        writer.close()
+        job.processed = job.valid
+
+        if "fcm_token" in valid.columns:
+            job.status = "subscribing"
+            subscribe_town_topics(job, valid)
+        job.status = "completed"
+    except ValueError as e:
+        job.status = "failed"
+        job.message = str(e)
+    except Exception as e:
+        job.status = "failed"
+        job.message = f"Import failed: {e}"
+    finally:
+        job.finished_at = dt.datetime.utcnow()
+        print(f" Subscriber import {job.id} {job.status}: {job.written}/{job.total} written, "
+              f"{job.error_count} rejected")
+
+def subscribe_town_topics(job: ImportJob, valid: pd.DataFrame):
+    """Subscribe imported FCM tokens to their town topics"""
+    from notifications_service import subscribe_to_town
+
+    with_token = valid[valid["fcm_token"].str.strip() != ""]
+    for town, group in with_token.groupby("town"):
+        try:
+            result = subscribe_to_town(group["fcm_token"].tolist(), town)
+            job.topic_subscribed += result["ok"]
+        except Exception as e:
+            job.message = f"Topic subscription failed for {town}: {e}"
+
+class ImportRegistry:
+    def __init__(self):
+        self._jobs: Dict[str, ImportJob] = {}
+        self._lock = threading.Lock()
+
+    def start(self, db, body: bytes, fmt: str, towns: Iterable[str],
+              filename: Optional[str] = None) -> ImportJob:
+        job = ImportJob(fmt, filename)
+        with self._lock:
+            self._jobs[job.id] = job
+            for old in sorted(self._jobs.values(), key=lambda j: j.created_at)[:-MAX_IMPORT_JOBS]:
+                self._jobs.pop(old.id, None)
+        threading.Thread(target=run_import, args=(job, db, body, list(towns)),
+                         name=f"subscriber-import-{job.id}", daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Optional[ImportJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Dict]:
+        return [j.info() for j in sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)]
+
+# Global import registry
+import_registry = ImportRegistry()
+
+def get_import_registry() -> ImportRegistry:
+    """Get the global import registry"""
+    return import_registry
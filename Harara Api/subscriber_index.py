@@ -0,0 +1,239 @@
+# =============================================================================
+# Harara Subscriber Index
+# - Process-local town -> subscribers map, loaded once from the active users
+#   and kept current by a Firestore on_snapshot listener
+# - Per-town phone/token arrays are normalized and deduplicated once per
+#   change, so alert fan-out resolves recipients with a dict lookup
+# - `version` increments with every applied snapshot; `read_time` is the
+#   Firestore time the index is consistent with
+# - Snapshots are applied to copies and swapped in whole, so readers never
+#   see a half-applied change
+# - A closed, failed or silent listener is resubscribed (a fresh full load)
+#   and reports ready=False meanwhile, so callers fall back to queries
+# =============================================================================
+
+import time
+import threading
+import datetime as dt
+from typing import Dict, List, Optional, Set, Tuple
+
+from sms_dispatcher import normalize_phone
+
+INDEX_LOAD_TIMEOUT = 30.0            # seconds to wait for the initial snapshot
+INDEX_MAX_AGE_SECONDS = 6 * 3600.0   # resubscribe when no snapshot arrived for this long
+INDEX_RESTART_INTERVAL = 60.0        # min seconds between listener restarts
+PUBLIC_USER_FIELDS = ("name", "phone_number", "town", "active")   # never tokens or timestamps
+
+def public_user(data: Dict) -> Dict:
+    """The fields of a user document that user listings may return"""
+    return {f: data.get(f) for f in PUBLIC_USER_FIELDS}
+
+class _TownEntry:
+    __slots__ = ("users", "phones", "tokens")
+
+    def __init__(self, users: Optional[Dict[str, Dict]] = None):
+        self.users: Dict[str, Dict] = dict(users or {})   # doc id -> user document
+        self.phones: Tuple[str, ...] = ()
+        self.tokens: Tuple[str, ...] = ()
+
+    def compact(self):
+        phones, tokens = {}, {}
+        for user in self.users.values():
+            phone = normalize_phone(user.get("phone_number"))
+            if phone:
+                phones[phone] = True
+            if user.get("fcm_token"):
+                tokens[user["fcm_token"]] = True
+        self.phones, self.tokens = tuple(phones), tuple(tokens)
+
+class SubscriberIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._towns: Dict[str, _TownEntry] = {}
+        self._doc_town: Dict[str, str] = {}
+        self._ready = threading.Event()
+        self._watch = None
+        self._db = None
+        self._collection = "users"
+        self._generation = 0          # bumps with every (re)subscribe
+        self._loaded_generation = -1  # listener whose initial snapshot was applied
+        self._started_at = 0.0
+        self._last_snapshot = 0.0     # monotonic time of the last applied snapshot
+        self._restarted_at = 0.0
+        self._failed = False
+        self.version = 0
+        self.read_time: Optional[dt.datetime] = None
+        self.last_snapshot_at: Optional[dt.datetime] = None
+        self.last_error: Optional[str] = None
+        self.restarts = 0
+
+    # ---------------------------------------------------------------- listener
+    def start(self, db, collection: str = "users", wait: bool = True) -> bool:
+        """Subscribe to active users; blocks until the initial load when `wait`"""
+        if self._watch is not None:
+            return self.ready
+        self._db, self._collection = db, collection
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            self._started_at = time.monotonic()
+            self._failed = False
+        query = db.collection(collection).where("active", "==", True)
+        self._watch = query.on_snapshot(
+            lambda docs, changes, read_time: self._on_snapshot(docs, changes, read_time, generation))
+        if wait and not self._ready.wait(INDEX_LOAD_TIMEOUT):
+            print(" Subscriber index: initial load timed out — falling back to queries")
+        return self.ready
+
+    def stop(self):
+        if self._watch is not None:
+            try:
+                self._watch.unsubscribe()
+            except Exception:
+                pass
+            self._watch = None
+        self._db = None
+        self._ready.clear()
+
+    def _unhealthy(self) -> Optional[str]:
+        """Why the listener needs a restart, or None while it is healthy"""
+        if self._watch is None:
+            return None if self._db is None else "listener not running"
+        if getattr(self._watch, "_closed", False):
+            return "listener closed"
+        if self._failed:
+            return "snapshot update failed"
+        now = time.monotonic()
+        if not self._ready.is_set():
+            if now - self._started_at > INDEX_LOAD_TIMEOUT:
+                return "initial load timed out"
+        elif now - self._last_snapshot > INDEX_MAX_AGE_SECONDS:
+            return f"no snapshot for {INDEX_MAX_AGE_SECONDS:.0f}s"
+        return None
+
+    def _restart(self, reason: str):
+        """Drop out of ready and resubscribe (at most once per INDEX_RESTART_INTERVAL)"""
+        self._ready.clear()
+        with self._lock:
+            if time.monotonic() - self._restarted_at < INDEX_RESTART_INTERVAL:
+                return
+            self._restarted_at = time.monotonic()
+            self.restarts += 1
+        print(f" Subscriber index restarting listener: {reason}")
+        db, collection = self._db, self._collection
+        self.stop()
+        try:
+            self.start(db, collection, wait=False)
+        except Exception as e:
+            self.last_error = str(e)
+            print(f" Subscriber index listener failed: {e}")
+
+    def _on_snapshot(self, docs, changes, read_time, generation: int):
+        if generation != self._generation:
+            return  # a replaced listener
+        try:
+            if generation != self._loaded_generation:
+                # A listener's first snapshot is the full result set: rebuild from it,
+                # dropping users removed while the previous listener was down
+                towns: Dict[str, _TownEntry] = {}
+                doc_town: Dict[str, str] = {}
+                touched: Set[str] = set()
+                for doc in docs:
+                    self._upsert(towns, doc_town, touched, doc.id, doc.to_dict() or {})
+            else:
+                towns, doc_town, touched = dict(self._towns), dict(self._doc_town), set()
+                for change in changes:
+                    doc = change.document
+                    if change.type.name == "REMOVED":
+                        self._remove(towns, doc_town, touched, doc.id)
+                    else:
+                        self._upsert(towns, doc_town, touched, doc.id, doc.to_dict() or {})
+            for town in touched:
+                towns[town].compact()
+            with self._lock:
+                if generation != self._generation:
+                    return
+                self._towns, self._doc_town = towns, doc_town
+                self._loaded_generation = generation
+                self._last_snapshot = time.monotonic()
+                self.last_snapshot_at = dt.datetime.now(dt.timezone.utc)
+                self.version += 1
+                self.read_time = read_time
+                self.last_error = None
+            if not self._ready.is_set():
+                print(f" Subscriber index loaded ({self.count()} active users, {len(towns)} towns)")
+                self._ready.set()
+        except Exception as e:
+            # Nothing was applied, but the listener has moved past these changes
+            self._failed = True
+            self._ready.clear()
+            self.last_error = str(e)
+            print(f" Subscriber index update failed: {e}")
+
+    @staticmethod
+    def _entry(towns: Dict[str, _TownEntry], touched: Set[str], town: str) -> _TownEntry:
+        """Writable entry for town in the new map (copied on first touch)"""
+        if town not in touched:
+            old = towns.get(town)
+            towns[town] = _TownEntry(old.users if old else None)
+            touched.add(town)
+        return towns[town]
+
+    def _remove(self, towns, doc_town, touched, doc_id: str):
+        town = doc_town.pop(doc_id, None)
+        if town is not None and town in towns:
+            self._entry(towns, touched, town).users.pop(doc_id, None)
+
+    def _upsert(self, towns, doc_town, touched, doc_id: str, data: Dict):
+        self._remove(towns, doc_town, touched, doc_id)  # the user may have moved town
+        town = data.get("town")
+        if not town:
+            return
+        self._entry(towns, touched, town).users[doc_id] = data
+        doc_town[doc_id] = town
+
+    # ----------------------------------------------------------------- lookups
+    @property
+    def ready(self) -> bool:
+        """Loaded and current; a closed or stale listener is restarted and reads False"""
+        reason = self._unhealthy()
+        if reason is not None:
+            self._restart(reason)
+            return False
+        return self._ready.is_set()
+
+    def recipients(self, town: str) -> Dict[str, List[str]]:
+        entry = self._towns.get(town)
+        if entry is None:
+            return {"phones": [], "tokens": []}
+        return {"phones": list(entry.phones), "tokens": list(entry.tokens)}
+
+    def users(self, town: str) -> List[Dict]:
+        entry = self._towns.get(town)
+        return [public_user(u) for u in entry.users.values()] if entry else []
+
+    def count(self, town: Optional[str] = None) -> int:
+        if town is not None:
+            entry = self._towns.get(town)
+            return len(entry.users) if entry else 0
+        return len(self._doc_town)
+
+    def stats(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "version": self.version,
+            "read_time": self.read_time.isoformat() if self.read_time else None,
+            "last_snapshot_at": self.last_snapshot_at.isoformat() if self.last_snapshot_at else None,
+            "restarts": self.restarts,
+            "last_error": self.last_error,
+            "users": self.count(),
+            "towns": {town: {"users": len(e.users), "phones": len(e.phones), "tokens": len(e.tokens)}
+                      for town, e in sorted(self._towns.items())},
+        }
+
+# Global subscriber index
+subscriber_index = SubscriberIndex()
+
+def get_subscriber_index() -> SubscriberIndex:
+    """Get the global subscriber index"""
+    return subscriber_index
@@ -0,0 +1,5 @@
+# The API modules are flat scripts imported by name from "Harara Api/"
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
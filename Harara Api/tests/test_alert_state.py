@@ -0,0 +1,59 @@
+import datetime as dt
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, create_engine
+
+from alert_state import AlertState, AlertStateStore
+
+T0 = dt.datetime(2026, 3, 1, 6, 0)
+
+@pytest.fixture
+def store():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine, tables=[AlertState.__table__])
+    return AlertStateStore(engine, cooldown_hours=72)
+
+def observe(store, hours, alerting=True, severity="Moderate", town="Juba"):
+    return store.observe(town, alerting, severity, 0.8 if alerting else 0.1, now=T0 + dt.timedelta(hours=hours))
+
+def test_episode_sends_once_then_suppresses(store):
+    assert observe(store, 0)["reason"] == "episode_started"
+    second = observe(store, 24)
+    assert (second["send"], second["reason"], second["suppressed"]) == (False, "suppressed", 1)
+    assert observe(store, 48)["suppressed"] == 2
+    assert store.suppressed_total == 2
+
+def test_escalation_sends_but_not_de_escalation(store):
+    observe(store, 0, severity="Moderate")
+    assert observe(store, 1, severity="High")["reason"] == "escalated"
+    assert not observe(store, 2, severity="Moderate")["send"]
+    assert not observe(store, 3, severity="High")["send"]   # High already alerted this episode
+
+def test_cooldown_resends_long_episodes(store):
+    observe(store, 0)
+    assert not observe(store, 71)["send"]
+    assert observe(store, 72)["reason"] == "cooldown_elapsed"
+    assert not observe(store, 73)["send"]   # cooldown restarts from the last send
+
+def test_non_alerting_run_ends_the_episode(store):
+    observe(store, 0, severity="High")
+    assert observe(store, 24, alerting=False)["reason"] == "episode_ended"
+    assert observe(store, 25, alerting=False)["reason"] == "no_alert"
+    assert observe(store, 26, severity="Moderate")["reason"] == "episode_started"
+
+def test_towns_are_independent_and_reset_reopens(store):
+    observe(store, 0, town="Juba")
+    assert observe(store, 1, town="Wau")["send"]
+    assert not observe(store, 2, town="Juba")["send"]
+    assert store.reset("Juba")
+    assert not store.reset("Juba")
+    assert observe(store, 3, town="Juba")["reason"] == "episode_started"
+
+def test_snapshot_reports_episode_state(store):
+    observe(store, 0, severity="High")
+    observe(store, 1, severity="High")
+    town = store.snapshot()["towns"]["Juba"]
+    assert town["active"] and town["peak_severity"] == "High"
+    assert (town["sends"], town["suppressed"]) == (1, 1)
+    assert town["episode_started_at"] == T0.isoformat()
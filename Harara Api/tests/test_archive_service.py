@@ -0,0 +1,43 @@
+import datetime as dt
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+import archive_service
+from archive_service import _write_part, _predictions_table, read_month, iter_arrow_stream
+
+def run(ts, served_by="lstm"):
+    return {"run_ts": ts.isoformat(), "start_date": str(ts.date()), "end_date": str(ts.date()),
+            "model_version": "v2", "predictions": [{"town": "Juba", "probability": 0.9, "alert": 1,
+                                                    "served_by": served_by}]}
+
+def old_part(ts):
+    """A predictions part written before model_version/served_by were archived"""
+    table = _predictions_table(run(ts), ts).drop(["model_version", "served_by"])
+    _write_part("predictions", table, ts)
+
+@pytest.fixture(autouse=True)
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_service, "ARCHIVE_DIR", str(tmp_path))
+
+def test_predictions_carry_model_version_and_served_by():
+    ts = dt.datetime(2026, 2, 1, 6, tzinfo=dt.timezone.utc)
+    _write_part("predictions", _predictions_table(run(ts, served_by="fallback"), ts), ts)
+    table = read_month("predictions", "2026-02")
+    assert table.column("model_version").to_pylist() == ["v2"]
+    assert table.column("served_by").to_pylist() == ["fallback"]
+
+def test_older_parts_read_back_with_null_columns():
+    old, new = (dt.datetime(2026, 1, d, 6, tzinfo=dt.timezone.utc) for d in (1, 2))
+    old_part(old)
+    _write_part("predictions", _predictions_table(run(new), new), new)
+    table = read_month("predictions", "2026-01").sort_by("run_ts")
+    assert table.column("served_by").to_pylist() == [None, "lstm"]
+
+def test_stream_keeps_columns_added_after_its_first_month():
+    jan, feb = dt.datetime(2026, 1, 1, tzinfo=dt.timezone.utc), dt.datetime(2026, 2, 1, tzinfo=dt.timezone.utc)
+    old_part(jan)
+    _write_part("predictions", _predictions_table(run(feb), feb), feb)
+    table = pa.ipc.open_stream(b"".join(iter_arrow_stream("predictions", ["2026-01", "2026-02"]))).read_all()
+    assert table.column("model_version").to_pylist() == [None, "v2"]
@@ -0,0 +1,63 @@
+import pytest
+
+import sms_dispatcher
+from sms_dispatcher import TokenBucket
+from dispatch_scheduler import DispatchScheduler, severity_priority, DEFAULT_PRIORITY
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.slept = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept += seconds
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sms_dispatcher.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(sms_dispatcher.time, "sleep", clock.sleep)
+    return clock
+
+def test_bucket_bursts_to_capacity_then_refills(clock):
+    bucket = TokenBucket(rate=10, capacity=5)
+    assert all(bucket.try_acquire() for _ in range(5))
+    assert not bucket.try_acquire()
+    clock.now += 0.25   # 2.5 tokens
+    assert bucket.try_acquire(2)
+    assert not bucket.try_acquire(1)
+    clock.now += 100    # refill is capped at capacity
+    assert bucket.try_acquire(5)
+    assert not bucket.try_acquire(0.5)
+
+def test_acquire_waits_for_the_deficit(clock):
+    bucket = TokenBucket(rate=4, capacity=4)
+    bucket.acquire(4)
+    bucket.acquire(2)
+    assert clock.slept == pytest.approx(0.5)
+
+def test_channel_paces_sends_at_the_configured_rate(clock):
+    sent = []
+    scheduler = DispatchScheduler()
+    channel = scheduler.register("sms", lambda m, rs: sent.append(len(rs)) or {}, messages_per_second=20)
+    channel.send("hot", [f"+2547000000{i:02d}" for i in range(60)])
+    # 20 tokens of burst, then 40 more at 20/s
+    assert clock.slept == pytest.approx(2.0)
+    assert sent == [60]
+
+def test_severity_priority():
+    assert severity_priority("High") > severity_priority("Moderate") > severity_priority("None")
+    assert severity_priority(None) == DEFAULT_PRIORITY
+
+def test_eta_waits_behind_higher_priorities():
+    scheduler = DispatchScheduler()
+    scheduler.register("sms", lambda m, rs: {}, messages_per_second=10)
+    eta = scheduler.eta("sms", {1: 50, 3: 20, 2: 30})
+    assert eta["queue_depth"] == 100
+    assert eta["eta_seconds"] == 10.0
+    assert {p: v["eta_seconds"] for p, v in eta["by_priority"].items()} == {3: 2.0, 2: 5.0, 1: 10.0}
+    assert scheduler.eta("fcm", {1: 5})["eta_seconds"] is None
@@ -0,0 +1,71 @@
+import json
+
+from app.routes import export_routes
+from app.routes.export_routes import _iter_pages, _encode_page
+
+class FakeDoc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+class FakeQuery:
+    """Ordered Firestore query stand-in; snapshot cursors need the order_by field, like Firestore"""
+
+    def __init__(self, docs, order_field, fields=None, limit=None, after=None):
+        self.docs, self.order_field = docs, order_field
+        self.fields, self._limit, self.after = fields, limit, after
+
+    def _copy(self, **changes):
+        state = {"fields": self.fields, "limit": self._limit, "after": self.after, **changes}
+        return FakeQuery(self.docs, self.order_field, **state)
+
+    def select(self, fields):
+        return self._copy(fields=list(fields))
+
+    def limit(self, n):
+        return self._copy(limit=n)
+
+    def start_after(self, snapshot):
+        data = snapshot.to_dict()
+        if self.order_field not in data:
+            raise ValueError(f"cursor snapshot is missing order_by field {self.order_field!r}")
+        return self._copy(after=(data[self.order_field], snapshot.id))
+
+    def stream(self):
+        docs = sorted(self.docs, key=lambda d: (d.to_dict()[self.order_field], d.id))
+        if self.after is not None:
+            docs = [d for d in docs if (d.to_dict()[self.order_field], d.id) > self.after]
+        for d in docs[:self._limit]:
+            data = d.to_dict()
+            if self.fields is not None:
+                data = {k: v for k, v in data.items() if k in self.fields}
+            yield FakeDoc(d.id, data)
+
+def make_docs(n):
+    return [FakeDoc(f"p{i:04d}", {"date": f"2026-01-{1 + i % 28:02d}", "town": f"T{i % 3}",
+                                  "probability": i / n, "alert": i % 2 == 0}) for i in range(n)]
+
+def test_projected_pages_keep_the_cursor_field(monkeypatch):
+    monkeypatch.setattr(export_routes, "EXPORT_PAGE_SIZE", 7)
+    docs = make_docs(30)
+    pages = list(_iter_pages(FakeQuery(docs, "date"), ["id", "town"], "date"))
+    rows = [row for page in pages for row in page]
+    assert [len(p) for p in pages] == [7, 7, 7, 7, 2]
+    assert sorted(doc_id for doc_id, _ in rows) == sorted(d.id for d in docs)
+    assert all(set(data) == {"town", "date"} for _, data in rows)
+
+def test_projection_output_drops_the_cursor_field():
+    rows = [("p1", {"town": "Juba", "date": "2026-01-01"})]
+    ndjson = json.loads(_encode_page([(i, dict(d)) for i, d in rows], "ndjson", ["id", "town"]))
+    assert ndjson == {"id": "p1", "town": "Juba"}
+    csv_text = _encode_page([(i, dict(d)) for i, d in rows], "csv", ["id", "town"])
+    assert csv_text.strip() == "p1,Juba"
+
+def test_unprojected_pages_cover_every_doc(monkeypatch):
+    monkeypatch.setattr(export_routes, "EXPORT_PAGE_SIZE", 10)
+    docs = make_docs(20)   # exact multiple: the last page is empty and ends the stream
+    rows = [row for page in _iter_pages(FakeQuery(docs, "date"), None, "date") for row in page]
+    assert len(rows) == 20
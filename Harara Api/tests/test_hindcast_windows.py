@@ -0,0 +1,93 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, create_engine
+
+import hindcast_service
+from hindcast_service import Hindcast, build_windows, run_hindcast, hindcast_rows, MIN_COVERAGE
+
+FEATURES = ["air_temp_2m", "soil_moisture"]
+LOOKBACK = 5
+D0 = dt.date(2026, 1, 1)
+
+def history(towns=("Juba", "Wau"), days=20, drop=()):
+    rows = []
+    for t, town in enumerate(towns):
+        for i in range(days):
+            day = D0 + dt.timedelta(days=i)
+            if (town, day) in drop:
+                continue
+            rows.append({"town": town, "date": day, "air_temp_2m": 100 * t + i, "soil_moisture": -i})
+    return pd.DataFrame(rows)
+
+def test_windows_match_the_daily_rows():
+    start, end = D0 + dt.timedelta(days=LOOKBACK - 1), D0 + dt.timedelta(days=9)
+    batch = build_windows(history(), ["Juba", "Wau"], start, end, FEATURES, LOOKBACK, max_gap=2)
+    X = batch["X"]
+    assert X.shape == (12, LOOKBACK, len(FEATURES)) and X.dtype == np.float32 and X.flags.c_contiguous
+    assert batch["towns"] == ["Juba"] * 6 + ["Wau"] * 6
+    assert batch["dates"][:6] == [start + dt.timedelta(days=i) for i in range(6)]
+    # The Wau window ending on day 6 holds days 2..6, oldest first
+    np.testing.assert_array_equal(X[6 + 2, :, 0], [102, 103, 104, 105, 106])
+    np.testing.assert_array_equal(X[6 + 2, :, 1], [-2, -3, -4, -5, -6])
+    np.testing.assert_array_equal(batch["coverage"], np.ones(12))
+
+def test_short_gaps_are_forward_filled_and_long_gaps_use_medians():
+    short = {("Juba", D0 + dt.timedelta(days=6))}
+    batch = build_windows(history(towns=("Juba",), drop=short), ["Juba"], D0 + dt.timedelta(days=8),
+                          D0 + dt.timedelta(days=8), FEATURES, LOOKBACK, max_gap=2)
+    np.testing.assert_array_equal(batch["X"][0, :, 0], [4, 5, 5, 7, 8])
+    assert batch["coverage"][0] == pytest.approx(0.8)
+
+    # Days 5-6 open the window with nothing earlier to carry forward
+    leading = {("Juba", D0 + dt.timedelta(days=i)) for i in (5, 6)}
+    hist = history(towns=("Juba",), drop=leading)
+    batch = build_windows(hist, ["Juba"], D0 + dt.timedelta(days=9), D0 + dt.timedelta(days=9),
+                          FEATURES, LOOKBACK, max_gap=2)
+    median = hist["air_temp_2m"].median()
+    np.testing.assert_array_equal(batch["X"][0, :, 0], [median, median, 7, 8, 9])
+    assert batch["coverage"][0] == pytest.approx(0.6)
+
+def test_sparse_windows_and_missing_towns_are_skipped():
+    sparse = {("Juba", D0 + dt.timedelta(days=i)) for i in range(10, 20)}
+    end = D0 + dt.timedelta(days=19)
+    batch = build_windows(history(drop=sparse), ["Juba", "Wau", "Bor"], end, end, FEATURES, LOOKBACK, max_gap=2)
+    assert batch["towns"] == ["Wau"]
+    assert (batch["coverage"] >= MIN_COVERAGE).all()
+
+    empty = build_windows(history(), ["Bor"], end, end, FEATURES, LOOKBACK, max_gap=2)
+    assert empty["X"].shape == (0, LOOKBACK, len(FEATURES)) and empty["coverage"].size == 0
+
+def test_noise_is_added_per_town():
+    end = D0 + dt.timedelta(days=9)
+    noise = {"Juba": np.full((LOOKBACK, 2), 0.5, np.float32), "Wau": np.zeros((LOOKBACK, 2), np.float32)}
+    plain = build_windows(history(), ["Juba", "Wau"], end, end, FEATURES, LOOKBACK, 2)
+    noisy = build_windows(history(), ["Juba", "Wau"], end, end, FEATURES, LOOKBACK, 2, noise=noise.get)
+    np.testing.assert_array_equal(noisy["X"] - plain["X"], np.stack([noise["Juba"], noise["Wau"]]))
+
+def test_run_hindcast_scores_in_batches_and_stores_rows(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine, tables=[Hindcast.__table__])
+    monkeypatch.setattr(hindcast_service, "HINDCAST_BATCH", 4)
+    calls = []
+
+    def predict(X):
+        calls.append(len(X))
+        return (X[:, -1, 0] % 2).astype(np.float32), {"threshold": 0.5, "model_version": "v1",
+                                                      "served_by": "lstm"}
+
+    start, end = D0 + dt.timedelta(days=LOOKBACK - 1), D0 + dt.timedelta(days=9)
+    result = run_hindcast(engine, history(), ["Juba", "Wau"], start, end, predict, FEATURES, LOOKBACK, 2)
+    assert calls == [4, 4, 4]
+    assert result["windows"] == 12 and result["model_version"] == "v1"
+    assert result["summary"]["Juba"] == {"days": 6, "alert_days": 3, "mean_probability": 0.5,
+                                         "max_probability": 1.0}
+    rows = hindcast_rows(engine, result["run_id"], "Wau")
+    assert [r["date"] for r in rows] == [str(start + dt.timedelta(days=i)) for i in range(6)]
+
+def test_run_hindcast_rejects_bad_ranges():
+    with pytest.raises(ValueError):
+        run_hindcast(None, history(), ["Juba"], D0 + dt.timedelta(days=5), D0, None, FEATURES, LOOKBACK, 2)
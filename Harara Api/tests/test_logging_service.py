@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from logging_service import (LatencySketch, RollingAggregates, MAX_TRACKED_ENDPOINTS, OTHER_ENDPOINT)
+
+def test_sketch_quantiles_within_relative_error():
+    rng = random.Random(0)
+    values = sorted(rng.uniform(1, 2000) for _ in range(5000))
+    sketch = LatencySketch()
+    for v in values:
+        sketch.add(v)
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * len(values)) - 1]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.06)
+
+def test_sketch_empty_and_merge():
+    a, b = LatencySketch(), LatencySketch()
+    assert a.quantile(0.5) is None
+    a.add(0.01)   # below MIN_MS lands in the first bin
+    b.add(100)
+    a.merge(b)
+    assert a.count == 2
+    assert a.quantile(1.0) == pytest.approx(100, rel=0.05)
+
+def test_windows_expire_old_buckets():
+    agg = RollingAggregates()
+    t0 = 1_000_000.0
+    agg.record_request("/predict", 200, 10, now=t0)
+    agg.record_request("/predict", 500, 20, now=t0 + 1)
+    agg.record_event("sms", "error", now=t0)
+
+    snap = agg.snapshot(now=t0 + 2)["windows"]
+    assert snap["5m"]["requests"] == 2
+    assert snap["5m"]["error_rate"] == 0.5
+    assert snap["5m"]["categories"] == {"sms": 1}
+
+    later = agg.snapshot(now=t0 + 600)["windows"]   # past 5m, inside 1h
+    assert later["5m"]["requests"] == 0
+    assert later["1h"]["requests"] == 2
+    assert later["1h"]["endpoints"]["/predict"]["error_rate"] == 0.5
+
+def test_client_errors_do_not_count_as_server_errors():
+    agg = RollingAggregates()
+    agg.record_request("/users", 404, 5, now=0)
+    stats = agg.snapshot(now=1)["windows"]["5m"]
+    assert stats["error_rate"] == 0.0
+    assert stats["endpoints"]["/users"]["client_error_rate"] == 1.0
+
+def test_endpoint_cardinality_is_capped():
+    agg = RollingAggregates()
+    for i in range(MAX_TRACKED_ENDPOINTS + 10):
+        agg.record_request(f"/e{i}", 200, 1, now=0)
+    endpoints = agg.snapshot(now=1)["windows"]["5m"]["endpoints"]
+    assert len(endpoints) == MAX_TRACKED_ENDPOINTS + 1
+    assert endpoints[OTHER_ENDPOINT]["count"] == 10
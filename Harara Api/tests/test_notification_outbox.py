@@ -0,0 +1,115 @@
+import datetime as dt
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine, select
+
+import notification_outbox
+from notification_outbox import (NotificationOutbox, OutboxJob, PENDING, IN_FLIGHT, SENT, DEAD,
+                                 OUTBOX_LEASE_SECONDS)
+from dispatch_scheduler import DispatchScheduler
+
+PHONES = ["+254700000001", "+254700000002", "+254700000003"]
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine, tables=[OutboxJob.__table__])
+    return engine
+
+def make_outbox(engine, send=None):
+    scheduler = DispatchScheduler()
+    sent = []
+
+    def record(message, recipients):
+        sent.append((message, list(recipients)))
+        return {r: {"status": "sent", "provider_status": "Success"} for r in recipients}
+
+    scheduler.register("sms", send or record, messages_per_second=1000)
+    return NotificationOutbox(engine, scheduler, workers=1), sent
+
+def jobs(engine):
+    with Session(engine) as sess:
+        return sess.exec(select(OutboxJob).order_by(OutboxJob.id)).all()
+
+def test_enqueue_normalizes_and_dedupes(engine):
+    outbox, _ = make_outbox(engine)
+    result = outbox.enqueue("a1", "hot", PHONES + [PHONES[0], "not-a-number"])
+    assert result == {"alert_id": "a1", "queued": 3, "duplicates": 0, "invalid": 1}
+    again = outbox.enqueue("a1", "hot", PHONES)
+    assert again["queued"] == 0 and again["duplicates"] == 3
+    assert len(jobs(engine)) == 3
+
+def test_claim_orders_by_priority_and_never_double_leases(engine):
+    outbox, _ = make_outbox(engine)
+    outbox.enqueue("low", "m", PHONES[:1], priority=1)
+    outbox.enqueue("high", "m", PHONES[1:2], priority=3)
+    first = outbox.claim("w1", limit=1)
+    assert [j.alert_id for j in first] == ["high"]
+    second = outbox.claim("w2", limit=10)
+    assert [j.alert_id for j in second] == ["low"]
+    assert outbox.claim("w3", limit=10) == []
+
+def test_process_once_marks_sent(engine):
+    outbox, sent = make_outbox(engine)
+    outbox.enqueue("a1", "hot", PHONES)
+    assert outbox.process_once("w1") == 3
+    assert sent == [("hot", PHONES)]
+    assert {j.status for j in jobs(engine)} == {SENT}
+    assert outbox.process_once("w1") == 0
+
+def test_failures_back_off_then_die(engine, monkeypatch):
+    monkeypatch.setattr(notification_outbox, "backoff_seconds", lambda attempts: 0.0)
+    outbox, _ = make_outbox(engine, send=lambda m, rs: {r: {"status": "failed", "error": "busy"} for r in rs})
+    outbox.enqueue("a1", "hot", PHONES[:1])
+    outbox.process_once("w1")
+    job = jobs(engine)[0]
+    assert (job.status, job.attempts, job.last_error) == (PENDING, 1, "busy")
+    for _ in range(job.max_attempts - 1):
+        outbox.process_once("w1")
+    job = jobs(engine)[0]
+    assert (job.status, job.attempts) == (DEAD, job.max_attempts)
+
+def test_permanent_failure_is_dead_immediately(engine):
+    outbox, _ = make_outbox(engine, send=lambda m, rs: {r: {"status": "failed", "permanent": True,
+                                                          "error": "invalid"} for r in rs})
+    outbox.enqueue("a1", "hot", PHONES[:1])
+    outbox.process_once("w1")
+    assert jobs(engine)[0].status == DEAD
+
+def test_expired_lease_is_reclaimed_and_stale_owner_is_fenced(engine, monkeypatch):
+    outbox, _ = make_outbox(engine)
+    outbox.enqueue("a1", "hot", PHONES[:1])
+    stale = outbox.claim("crashed", limit=10)
+    assert jobs(engine)[0].status == IN_FLIGHT
+    assert outbox.claim("w2", limit=10) == []   # lease still held
+
+    later = dt.datetime.utcnow() + dt.timedelta(seconds=OUTBOX_LEASE_SECONDS + 1)
+    monkeypatch.setattr(notification_outbox, "_utcnow", lambda: later)
+    reclaimed = outbox.claim("w2", limit=10)
+    assert [j.id for j in reclaimed] == [j.id for j in stale]
+    assert reclaimed[0].attempts == 2   # at-least-once: the crashed send may be repeated
+
+    # The crashed worker's late completion must not overwrite the new lease
+    outbox._complete("crashed", stale, {PHONES[0]: {"status": "sent"}})
+    job = jobs(engine)[0]
+    assert (job.status, job.lease_owner) == (IN_FLIGHT, "w2")
+
+def test_stats_report_queue_depth(engine):
+    outbox, _ = make_outbox(engine)
+    outbox.enqueue("a1", "hot", PHONES, priority=3)
+    stats = outbox.stats()
+    assert stats["counts"][PENDING] == 3
+    assert stats["channels"]["sms"]["queue_depth"] == 3
+
+def test_claim_returns_only_the_rows_it_won(engine):
+    outbox, _ = make_outbox(engine)
+    outbox.enqueue("a1", "hot", PHONES[:2])
+    outbox.enqueue("a1", "hot", ["tokenA", "tokenB"], channel="fcm")
+    stuck = outbox.claim("w1", limit=1, channel="sms")   # never completed, stays in flight
+    assert [(j.channel, j.recipient) for j in stuck] == [("sms", PHONES[0])]
+
+    push = outbox.claim("w1", limit=1, channel="fcm")
+    assert [(j.channel, j.recipient) for j in push] == [("fcm", "tokenA")]
+    more_sms = outbox.claim("w1", limit=5, channel="sms")
+    assert [j.recipient for j in more_sms] == [PHONES[1]]
@@ -0,0 +1,87 @@
+import time
+import threading
+
+import pytest
+from fastapi import FastAPI
+
+import profiling_service
+from profiling_service import ProfilingService, route_target, RUN_PREDICTIONS_TARGET
+from middleware import match_route_template
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(100))
+
+@pytest.fixture
+def app():
+    app = FastAPI()
+
+    @app.get("/hindcast/{run_id}")
+    def hindcast(run_id: str):
+        return {}
+
+    @app.get("/firestore/history/{days}")
+    def history(days: int):
+        return {}
+
+    @app.post("/predict/run")
+    def run():
+        return {}
+    return app
+
+def test_route_templates_resolve_before_routing(app):
+    routes = app.router.routes
+    assert match_route_template(routes, "/hindcast/abc123") == "/hindcast/{run_id}"
+    assert match_route_template(routes, "/hindcast/{run_id}") == "/hindcast/{run_id}"
+    assert match_route_template(routes, "/firestore/history/{days}") == "/firestore/history/{days}"
+    assert match_route_template(routes, "/firestore/history/7") == "/firestore/history/{days}"
+    assert match_route_template(routes, "/predict/run", "POST") == "/predict/run"
+    assert match_route_template(routes, "/nope") is None
+
+def test_cprofile_is_refused_for_routes():
+    with pytest.raises(ValueError):
+        ProfilingService().arm(route_target("/predict/run"), mode="cprofile")
+
+def test_cprofile_captures_same_thread_targets():
+    service = ProfilingService()
+    session = service.arm(RUN_PREDICTIONS_TARGET, count=1, fmt="collapsed", mode="cprofile")
+    with service.profile(RUN_PREDICTIONS_TARGET, same_thread=True):
+        busy(0.01)
+    assert session.status == "done" and session.truncated == 0
+    assert b"busy" in session.render()
+
+def test_cprofile_stops_at_the_capture_cap(monkeypatch):
+    monkeypatch.setattr(profiling_service, "MAX_CAPTURE_SECONDS", 0.02)
+    service = ProfilingService()
+    session = service.arm(RUN_PREDICTIONS_TARGET, count=1, fmt="collapsed", mode="cprofile")
+    with service.profile(RUN_PREDICTIONS_TARGET, same_thread=True):
+        busy(0.05)
+        time.sleep(0.001)   # after the cap: must not show up in the profile
+    assert session.truncated == 1
+    assert b"sleep" not in session.render()
+
+    # The profiler is released - the next capture starts cleanly
+    again = service.arm(RUN_PREDICTIONS_TARGET, count=1, mode="cprofile")
+    with service.profile(RUN_PREDICTIONS_TARGET, same_thread=True):
+        busy(0.001)
+    assert again.status == "done" and again.stacks
+
+def test_concurrent_cprofile_captures_fall_back_to_sampling():
+    service = ProfilingService()
+    session = service.arm(RUN_PREDICTIONS_TARGET, count=2, mode="cprofile", interval_ms=5)
+    entered, release = threading.Event(), threading.Event()
+
+    def first():
+        with service.profile(RUN_PREDICTIONS_TARGET, same_thread=True):
+            entered.set()
+            release.wait(1.0)
+
+    worker = threading.Thread(target=first)
+    worker.start()
+    entered.wait(1.0)
+    with service.profile(RUN_PREDICTIONS_TARGET, same_thread=True):   # must not raise on 3.12+
+        busy(0.03)
+    release.set()
+    worker.join()
+    assert session.status == "done" and session.samples > 0
@@ -0,0 +1,86 @@
+import os
+import sys
+import types
+import pickle
+
+import numpy as np
+import pytest
+
+from scaler_artifact import (WindowScaler, load_scaler, save_scaler, scale_windows_inplace,
+                             convert_pickled_scaler, WINDOW_EPS)
+
+def legacy_scale(window, mean, scale):
+    """The pre-artifact path: StandardScaler.transform, then per-window standardization"""
+    scaled = (window.astype(np.float64) - mean) / scale
+    return (scaled - scaled.mean()) / (scaled.std() + WINDOW_EPS)
+
+@pytest.fixture
+def scaler():
+    rng = np.random.default_rng(0)
+    return WindowScaler(rng.normal(20, 5, 11), rng.uniform(0.5, 10, 11))
+
+def test_inplace_scaling_matches_the_legacy_path(scaler):
+    rng = np.random.default_rng(1)
+    X = rng.normal(25, 8, (32, 21, 11)).astype(np.float32)
+    expected = np.stack([legacy_scale(w, scaler.mean.astype(np.float64), scaler.scale.astype(np.float64))
+                         for w in X])
+    out = scale_windows_inplace(X, scaler)
+    assert out is X   # no copy
+    np.testing.assert_allclose(out, expected, atol=1e-5)
+
+def test_inplace_scaling_requires_contiguous_float32(scaler):
+    with pytest.raises(ValueError):
+        scale_windows_inplace(np.zeros((2, 21, 11)), scaler)
+    with pytest.raises(ValueError):
+        scale_windows_inplace(np.zeros((2, 11, 21), np.float32).transpose(0, 2, 1), scaler)
+
+def test_json_round_trip(scaler, tmp_path):
+    path = str(tmp_path / "scaler.json")
+    save_scaler(scaler, path)
+    loaded = load_scaler(path)
+    np.testing.assert_array_equal(loaded.mean, scaler.mean)
+    np.testing.assert_array_equal(loaded.scale, scaler.scale)
+    np.testing.assert_allclose(loaded.transform(np.ones((3, 11))), scaler.transform(np.ones((3, 11))))
+
+def test_mismatched_shapes_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        WindowScaler([0.0, 1.0], [1.0])
+    path = tmp_path / "bad.json"
+    path.write_text('{"n_features": 3, "mean": [0, 0], "scale": [1, 1]}')
+    with pytest.raises(ValueError):
+        load_scaler(str(path))
+
+def _pickle_fake_sklearn_scaler(monkeypatch, mean, scale):
+    module = types.ModuleType("sklearn.preprocessing._data")
+
+    class StandardScaler:
+        pass
+    StandardScaler.__module__ = module.__name__
+    StandardScaler.__qualname__ = "StandardScaler"
+    module.StandardScaler = StandardScaler
+    for name in ("sklearn", "sklearn.preprocessing", "sklearn.preprocessing._data"):
+        monkeypatch.setitem(sys.modules, name, sys.modules.get(name) or types.ModuleType(name))
+    monkeypatch.setitem(sys.modules, module.__name__, module)
+
+    fitted = StandardScaler()
+    fitted.__dict__.update(with_mean=True, with_std=True, n_features_in_=len(mean),
+                           mean_=np.asarray(mean), scale_=np.asarray(scale), var_=np.asarray(scale) ** 2)
+    return pickle.dumps(fitted)
+
+def test_pickled_scaler_converts_without_sklearn(monkeypatch, tmp_path):
+    payload = _pickle_fake_sklearn_scaler(monkeypatch, [1.0, 2.0, 3.0], [2.0, 4.0, 8.0])
+    monkeypatch.undo()   # sklearn is gone again while converting
+    pkl, out = tmp_path / "scaler.pkl", tmp_path / "scaler.json"
+    pkl.write_bytes(payload)
+    converted = convert_pickled_scaler(str(pkl), str(out))
+    np.testing.assert_allclose(converted.mean, [1, 2, 3])
+    np.testing.assert_allclose(load_scaler(str(out)).inv_scale, [0.5, 0.25, 0.125])
+
+def test_pickled_code_is_refused(tmp_path):
+    class Exploit:
+        def __reduce__(self):
+            return (os.system, ("echo pwned",))
+    pkl = tmp_path / "evil.pkl"
+    pkl.write_bytes(pickle.dumps(Exploit()))
+    with pytest.raises(pickle.UnpicklingError):
+        convert_pickled_scaler(str(pkl), str(tmp_path / "out.json"))
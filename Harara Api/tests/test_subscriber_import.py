@@ -0,0 +1,34 @@
+import pandas as pd
+
+from subscriber_import import parse_upload, normalize_phones, validate
+
+TOWNS = ["Juba", "Wau", "Bor"]
+
+def errors_by_row(result):
+    return {int(r["row"]): r["error"] for _, r in result["errors"].iterrows()}
+
+def test_normalize_phones_matches_e164_rules():
+    phones = pd.Series(["0788 123 456", "+211 788 123456", "00211788123456", "788123456", "12", ""])
+    out = normalize_phones(phones, country_code="+211").tolist()
+    assert out[:4] == ["+211788123456"] * 4
+    assert out[4:] == [None, None]
+
+def test_validate_reports_each_row_once():
+    df = parse_upload(b"phone_number,town\n0788123456,Juba\nnope,Juba\n0788123457,Atlantis\n"
+                      b"+250788123456,wau\n", "csv")
+    result = validate(df, TOWNS)
+    assert result["valid"]["row"].tolist() == [1]
+    assert errors_by_row(result) == {2: "invalid phone number", 3: "unknown town",
+                                     4: "duplicate phone in upload"}
+
+def test_rejected_town_row_does_not_shadow_a_later_valid_row():
+    df = parse_upload(b"phone_number,town\n0788123456,Nowhere\n0788123456,Juba\n", "csv")
+    result = validate(df, TOWNS)
+    assert result["valid"]["row"].tolist() == [2]
+    assert result["valid"]["town"].tolist() == ["Juba"]
+    assert errors_by_row(result) == {1: "unknown town"}
+
+def test_ndjson_rows_may_use_different_phone_keys():
+    body = b'{"phone": "0788123456", "town": "Bor"}\n{"msisdn": "0788123458", "town": "Juba", "name": "A"}\n'
+    result = validate(parse_upload(body, "ndjson"), TOWNS)
+    assert len(result["valid"]) == 2 and result["errors"].empty
@@ -0,0 +1,106 @@
+import types
+
+import pytest
+
+import subscriber_index
+from subscriber_index import SubscriberIndex
+
+class FakeDoc:
+    def __init__(self, doc_id, data):
+        self.id, self._data = doc_id, data
+
+    def to_dict(self):
+        if isinstance(self._data, Exception):
+            raise self._data
+        return dict(self._data)
+
+def change(kind, doc_id, data=None):
+    return types.SimpleNamespace(type=types.SimpleNamespace(name=kind), document=FakeDoc(doc_id, data or {}))
+
+class FakeWatch:
+    def __init__(self, callback):
+        self.callback = callback
+        self._closed = False
+
+    def unsubscribe(self):
+        self._closed = True
+
+class FakeDB:
+    """Collection/where chain whose on_snapshot hands back the listener"""
+
+    def __init__(self):
+        self.watches = []
+
+    def collection(self, name):
+        return self
+
+    def where(self, *args):
+        return self
+
+    def on_snapshot(self, callback):
+        self.watches.append(FakeWatch(callback))
+        return self.watches[-1]
+
+USERS = {"u1": {"phone_number": "0788123456", "town": "Juba", "fcm_token": "t1"},
+         "u2": {"phone_number": "+250788123457", "town": "Wau"}}
+
+def load(index, db, users=USERS):
+    index.start(db, wait=False)
+    docs = [FakeDoc(k, v) for k, v in users.items()]
+    db.watches[-1].callback(docs, [change("ADDED", d.id, d.to_dict()) for d in docs], None)
+
+@pytest.fixture
+def loaded():
+    index, db = SubscriberIndex(), FakeDB()
+    load(index, db)
+    return index, db
+
+def test_initial_snapshot_loads_and_changes_apply(loaded):
+    index, db = loaded
+    assert index.ready and index.version == 1 and index.last_snapshot_at is not None
+    assert index.recipients("Juba") == {"phones": ["+250788123456"], "tokens": ["t1"]}
+
+    moved = dict(USERS["u1"], town="Wau")
+    db.watches[-1].callback([], [change("MODIFIED", "u1", moved), change("REMOVED", "u2")], None)
+    assert index.count("Juba") == 0
+    assert index.recipients("Wau") == {"phones": ["+250788123456"], "tokens": ["t1"]}
+    assert index.users("Wau") == [{"name": None, "phone_number": "0788123456", "town": "Wau", "active": None}]
+
+def test_failed_snapshot_applies_nothing_and_resubscribes(loaded, monkeypatch):
+    index, db = loaded
+    before = index._towns
+    broken = [change("REMOVED", "u2"), change("MODIFIED", "u1")]
+    broken[1].document._data = RuntimeError("bad doc")
+    db.watches[-1].callback([], broken, None)
+    assert index._towns is before and index.count("Wau") == 1   # the removal was not half-applied
+    assert index.last_error == "bad doc"
+
+    monkeypatch.setattr(subscriber_index, "INDEX_RESTART_INTERVAL", 0.0)
+    assert not index.ready
+    assert len(db.watches) == 2 and db.watches[0]._closed
+
+def test_closed_listener_restarts_with_a_full_reload(loaded, monkeypatch):
+    index, db = loaded
+    monkeypatch.setattr(subscriber_index, "INDEX_RESTART_INTERVAL", 0.0)
+    db.watches[-1]._closed = True   # e.g. the RPC died
+    assert not index.ready and index.restarts == 1 and len(db.watches) == 2
+
+    # u2 was removed while the listener was down - the fresh snapshot drops it
+    db.watches[-1].callback([FakeDoc("u1", USERS["u1"])], [], None)
+    assert index.ready and index.count() == 1 and index.count("Wau") == 0
+
+    # The replaced listener can no longer write into the index
+    db.watches[0].callback([], [change("ADDED", "u9", {"town": "Bor", "phone_number": "0788000000"})], None)
+    assert index.count("Bor") == 0
+
+def test_silent_listener_is_treated_as_stale(loaded, monkeypatch):
+    index, db = loaded
+    monkeypatch.setattr(subscriber_index, "INDEX_MAX_AGE_SECONDS", 0.0)
+    assert not index.ready and len(db.watches) == 2
+    assert not index.ready and len(db.watches) == 2   # restarts are rate limited
+
+def test_stopped_index_stays_down():
+    index, db = SubscriberIndex(), FakeDB()
+    load(index, db)
+    index.stop()
+    assert not index.ready and len(db.watches) == 1